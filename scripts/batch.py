@@ -0,0 +1,183 @@
+"""
+batch.py downloads many courses in one run,
+sharing one pool of workers and one bandwidth between them.
+
+batch_entry:
+    One course of a job file: its course id, its static path,
+    its video types and its downloader id, as the arguments of main.py.
+
+read_job_file:
+    Reads the entries of a job file, one per line:
+        # course_id  static_path  video_types  downloader
+        18.065-2018  /data/18.065/static  Lecture  300k
+        6.034-2010   "/data/6.034 fall/static"  Lecture,Recitation  yt-dlp-api
+    A relative static path is relative to the job file.
+
+fair_jobs:
+    Interleaves the jobs of every course, one of each course in turn,
+    so that every course gets its share of the workers,
+    and the next courses are found while the first ones download.
+
+start_batch:
+    Runs the jobs of every course through one scheduler.run_jobs,
+    and summarizes them course by course.
+
+"""
+
+from __future__ import annotations
+
+import pathlib
+import shlex
+
+
+class batch_entry:
+
+    def __init__(
+        self, line: int, course_id: str, static_root: pathlib.Path,
+        vid_types: list, dl_id: str
+    ):
+        # Line number in the job file, to tell which entry is wrong.
+        self.line = line
+        self.course_id = course_id
+        self.static_root = static_root
+        self.vid_types = vid_types
+        self.dl_id = dl_id
+        # Same as main.py: next to the static directory.
+        self.videos_root:pathlib.Path = static_root.parent
+
+    def __str__(self) -> str:
+        return f"{self.course_id} ({self.static_root})"
+
+
+def read_job_file(path: pathlib.Path) -> list:
+    """
+    Returns
+    -------
+    list of batch_entry, in the order of the file.
+    Empty lines and lines starting with # are ignored.
+
+    Raises
+    ------
+    ValueError
+        if a line does not have exactly 4 fields.
+    OSError
+        if the file can not be read.
+    """
+    ret:list = []
+    for (i, line) in enumerate(path.read_text(encoding="utf-8").splitlines(), 1):
+        if line.strip() == "" or line.lstrip().startswith("#"):
+            continue
+        fields:list = shlex.split(line, comments=True)
+        if len(fields) != 4:
+            raise ValueError(
+                f"line {i}: expected course_id static_path video_types downloader, got {line!r}"
+            )
+        static_root = pathlib.Path(fields[1])
+        if not static_root.is_absolute():
+            static_root = path.parent / static_root
+        ret.append(batch_entry(i, fields[0], static_root, fields[2].split(','), fields[3]))
+    return ret
+
+
+def fair_jobs(streams: list):
+    """
+    Parameters
+    ----------
+    streams: list
+        of iterables of jobs, one per course.
+
+    Yields
+    ------
+    The first job of each stream, then the second of each, and so on.
+    A stream is left out once it has no more jobs.
+    """
+    iters:list = [iter(s) for s in streams]
+    while len(iters) != 0:
+        for it in list(iters):
+            try:
+                yield next(it)
+            except StopIteration:
+                iters.remove(it)
+
+
+def start_batch(
+    courses: list,
+    downloader: video_downloader.video_downloader,
+    verbose: bool = False,
+    num_workers: int = 1,
+    use_state: bool = False,
+    estimate: bool = False,
+    progress: progress.progress_view|None = None,
+    order: str = "course"
+) -> list:
+    """
+    Like main.start_download, but for several courses at once.
+
+    Parameters
+    ----------
+    courses: list
+        of (batch_entry, videos, downloader), where videos is an iterable
+        of (type, num, title, url), e.g. the course's iter_videos(),
+        and downloader downloads the videos of that course.
+        Courses may share a downloader, e.g. to share its connections.
+    downloader: video_downloader
+        the downloader that runs the queue, one of those of the courses.
+        If it is asynchronous, the courses with another downloader are run on threads.
+    num_workers: int
+        maximum number of videos downloaded at the same time, of all the courses.
+    Others: see main.start_download.
+
+    Returns
+    -------
+    The list of (job, result) returned by scheduler.run_jobs.
+    """
+    import download_state
+    import scheduler
+
+    if len(courses) == 0:
+        raise ValueError("The batch is empty.")
+
+    # { videos root : its download_state }, as courses may share a videos root.
+    states:dict = dict()
+    # { job : its batch_entry }, to summarize course by course.
+    entry_of:dict = dict()
+
+    def jobs_of(entry: batch_entry, videos, downloader):
+        root:pathlib.Path = entry.videos_root
+        if use_state and root not in states:
+            states[root] = download_state.download_state(root, verbose)
+        for job in scheduler.iter_jobs(videos, root):
+            job.downloader = downloader
+            job.state = states.get(root)
+            entry_of[job] = entry
+            yield job
+
+    jobs = fair_jobs([jobs_of(e, v, d) for (e, v, d) in courses])
+    if (progress is not None):
+        jobs = progress.count_jobs(jobs)
+    if (estimate or order != scheduler.ORDER_COURSE):
+        # The largest of all the courses first, whatever their courses.
+        jobs = scheduler.preflight(jobs, downloader, num_workers, order)
+        print(scheduler.summarize_sizes(jobs))
+    if (verbose):
+        print(f"Downloading {len(courses)} courses with {num_workers} workers")
+
+    if (progress is not None):
+        with progress:
+            results:list = scheduler.run_jobs(
+                jobs, downloader, num_workers, verbose, on_result=progress.on_result
+            )
+    else:
+        results:list = scheduler.run_jobs(jobs, downloader, num_workers, verbose)
+
+    for (entry, _, _) in courses:
+        print(f"{entry}: " + scheduler.summarize(
+            [(j, r) for (j, r) in results if entry_of[j] is entry]
+        ).split("\n")[0])
+    print(scheduler.summarize(results))
+    # Each downloader once, however many courses it has downloaded.
+    for d in { id(d) : d for (_, _, d) in courses }.values():
+        report = d.report()
+        if (report is not None):
+            print(report)
+    return results
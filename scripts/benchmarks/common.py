@@ -0,0 +1,91 @@
+"""
+common.py has what the benchmarks and the checks next to them share.
+
+parse_options:
+    Parses the options of the command line, in the form of --name=value,
+    as main.py does.
+
+parse_size:
+    Parses a number of bytes, e.g. 64K.
+
+results_header:
+    The fields every JSON of results starts with.
+
+write_results:
+    Writes a JSON of results to a file or to stdout.
+
+"""
+
+import json
+import pathlib
+import platform
+import sys
+
+
+def parse_options(options: set) -> dict:
+    """
+    Parameters
+    ----------
+    options: set
+        the names of the options taken.
+
+    Returns
+    -------
+    { name : value } of the options given. An option without a value is "True".
+    Exits if one is not taken.
+    """
+    cmd_opts:dict = dict(
+        a[2:].split('=', 1) if '=' in a else (a[2:], "True")
+        for a in sys.argv[1:] if a.startswith("--")
+    )
+    for o in cmd_opts:
+        if (not o in options):
+            print(f"Invalid option --{o}. Supported: {options}")
+            exit(-1)
+    return cmd_opts
+
+
+def parse_size(text: str) -> int:
+    """
+    Parameters
+    ----------
+    text: str
+        a number of bytes, with an optional K, M or G suffix, e.g. 64K.
+    """
+    import rate_limiter
+    # Sizes are written like rates.
+    size = rate_limiter.parse_rate(text)
+    if size is None:
+        raise ValueError("A size can not be unlimited.")
+    return int(size)
+
+
+def results_header(version: int) -> dict:
+    """
+    Parameters
+    ----------
+    version: int
+        of the results of a benchmark, which it bumps whenever
+        the meaning of its results changes, so that results
+        are only compared with those of the same version.
+
+    Returns
+    -------
+    dict of the version, and of the Python and the platform measured on.
+    """
+    return {
+        "version": version,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+
+
+def write_results(results: dict, out: str|None) -> None:
+    """
+    Writes results as JSON to the file out, or to stdout if None.
+    """
+    text:str = json.dumps(results, indent=2)
+    if out is not None:
+        pathlib.Path(out).write_text(text + "\n")
+    else:
+        print(text)
@@ -0,0 +1,303 @@
+"""
+fault_server.py serves fake videos over HTTP on this machine,
+standing in for archive.org, with the faults of a real server made on purpose,
+so that the downloads can be measured without the Internet.
+
+fault_server:
+    A threaded HTTP/1.1 server of files of any size,
+    whose urls are made by url(): GET /<name>-<size>.mp4 serves size bytes.
+    It can add latency before each response, cap the bandwidth of each connection,
+    reset a connection in the middle of a body, refuse Range requests,
+    and answer 429 (with Retry-After) or 503 instead.
+
+    python -m benchmarks.fault_server --port=8767 --latency=0.05 --reset-rate=0.1
+
+"""
+
+import http.server
+import random
+import re
+import socket
+import threading
+import time
+
+# The bytes of every file are this block over and over,
+# starting at a different place for each file.
+BLOCK:bytes = random.Random(0).randbytes(64*1024)
+# Bytes written at once, and between two checks of the bandwidth.
+WRITE_SIZE:int = 16*1024
+
+PATH_RE = re.compile(r"^/(?P<name>[^/]*)-(?P<size>[0-9]+)\.mp4$")
+
+
+def content_of(name: str, start: int, end: int) -> bytes:
+    """
+    Returns
+    -------
+    Bytes [start, end) of the file named name.
+    """
+    offset:int = sum(name.encode()) % len(BLOCK)
+    ret = bytearray()
+    pos:int = start
+    while pos < end:
+        i = (pos + offset) % len(BLOCK)
+        piece = BLOCK[i:i + min(end - pos, len(BLOCK) - i)]
+        ret += piece
+        pos += len(piece)
+    return bytes(ret)
+
+
+class fault_server:
+    """
+    Thread-safe. Each fault is drawn for each request,
+    from one random generator seeded with seed,
+    so that a run faces about the same faults as the last.
+
+    Invariant:
+        A file always has the same bytes, whatever the faults,
+        so a download that succeeds has exactly content_of(name, 0, size).
+    """
+
+    def __init__(
+        self,
+        port: int = 0,
+        latency: float = 0.0,
+        bandwidth: float|None = None,
+        reset_rate: float = 0.0,
+        ranges: bool = True,
+        rate_429: float = 0.0,
+        rate_5xx: float = 0.0,
+        retry_after: int = 1,
+        seed: int = 0
+    ):
+        """
+        Parameters
+        ----------
+        port: int
+            on 127.0.0.1. 0 picks a free one.
+        latency: float
+            seconds before each response.
+        bandwidth: float
+            bytes per second of each connection, or None for no cap.
+        reset_rate: float
+            probability that a body is cut after a random part of it,
+            by resetting the connection.
+        ranges: bool
+            whether Range requests are served,
+            or the whole file is sent instead, without Accept-Ranges.
+        rate_429, rate_5xx: float
+            probabilities of answering 429 with Retry-After: retry_after,
+            and 503, instead of the file.
+        seed: int
+            of the faults.
+        """
+        if min(latency, reset_rate, rate_429, rate_5xx) < 0 or \
+            (bandwidth is not None and bandwidth <= 0) or \
+            reset_rate > 1 or rate_429 + rate_5xx > 1:
+            raise ValueError("Invalid latency, bandwidth or rates of the faults.")
+
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.reset_rate = reset_rate
+        self.ranges = ranges
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.retry_after = retry_after
+
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        # { fault : number of times }, see stats().
+        self._stats:dict = { "requests": 0, "resets": 0, "429": 0, "5xx": 0, "bytes": 0 }
+
+        self._server = http.server.ThreadingHTTPServer(
+            ("127.0.0.1", port), fault_server.__handler_class(self)
+        )
+        self._server.daemon_threads = True
+        self.port:int = self._server.server_address[1]
+        self._thread:threading.Thread|None = None
+
+    def url(self, name: str, size: int) -> str:
+        """
+        Returns
+        -------
+        The url of a file of size bytes, different for each name.
+        """
+        return f"http://127.0.0.1:{self.port}/{name}-{size}.mp4"
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def start(self) -> None:
+        """
+        Serves in a thread of its own until stop().
+        """
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        # shutdown() waits for serve_forever(), which may never have run.
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+        self._server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def stats(self) -> dict:
+        """
+        Returns
+        -------
+        dict of the number of requests, of each fault made
+        (resets, 429, 5xx), and of bytes sent, so far.
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    # Not private, as the handler calls them.
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self._stats[key] += n
+
+    def _draw(self) -> tuple:
+        """
+        Returns
+        -------
+        (the status to answer instead of the file, or None,
+         the part of the body after which to reset, or None).
+        """
+        with self._lock:
+            r = self._random.random()
+            status = 429 if r < self.rate_429 else \
+                503 if r < self.rate_429 + self.rate_5xx else None
+            cut = self._random.uniform(0.1, 0.9) \
+                if self._random.random() < self.reset_rate else None
+        return (status, cut)
+
+    def __handler_class(self):
+        server = self
+
+        class handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args) -> None:
+                pass
+
+            def send_error_status(self, status: int) -> None:
+                self.send_response(status)
+                if status == 429:
+                    self.send_header("Retry-After", str(server.retry_after))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def respond(self, with_body: bool) -> None:
+                server._count("requests")
+                m = PATH_RE.match(self.path)
+                if m is None:
+                    self.send_error_status(404)
+                    return
+                (name, size) = (m["name"], int(m["size"]))
+
+                if server.latency > 0:
+                    time.sleep(server.latency)
+                (status, cut) = server._draw()
+                if status is not None:
+                    server._count("429" if status == 429 else "5xx")
+                    self.send_error_status(status)
+                    return
+
+                (start, end) = (0, size)
+                range_header = self.headers.get("Range")
+                if server.ranges and range_header is not None:
+                    m = re.fullmatch(r"bytes=([0-9]+)-([0-9]*)", range_header.strip())
+                    if m is None or int(m[1]) >= size:
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{size}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    start = int(m[1])
+                    end = min(int(m[2]) + 1, size) if m[2] != "" else size
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end - 1}/{size}")
+                else:
+                    self.send_response(200)
+                if server.ranges:
+                    self.send_header("Accept-Ranges", "bytes")
+                self.send_header("Content-Type", "video/mp4")
+                self.send_header("Content-Length", str(end - start))
+                self.send_header("ETag", f'"{name}-{size}"')
+                self.end_headers()
+                if not with_body:
+                    return
+
+                cut_at:int|None = start + int((end - start) * cut) if cut is not None else None
+                began = time.monotonic()
+                pos:int = start
+                while pos < end:
+                    n:int = min(WRITE_SIZE, end - pos)
+                    if cut_at is not None and pos + n > cut_at:
+                        # Whatever has been sent arrives, then the connection is reset.
+                        self.wfile.write(content_of(name, pos, cut_at))
+                        self.wfile.flush()
+                        server._count("bytes", cut_at - pos)
+                        server._count("resets")
+                        self.close_connection = True
+                        self.connection.shutdown(socket.SHUT_RDWR)
+                        return
+                    self.wfile.write(content_of(name, pos, pos + n))
+                    server._count("bytes", n)
+                    pos += n
+                    if server.bandwidth is not None:
+                        ahead:float = began + (pos - start) / server.bandwidth - time.monotonic()
+                        if ahead > 0:
+                            time.sleep(ahead)
+
+            def do_HEAD(self) -> None:
+                self.respond(False)
+
+            def do_GET(self) -> None:
+                self.respond(True)
+
+        return handler
+
+
+def main() -> None:
+    # Options, in the form of --name=value:
+    # --port=N (default 8767), --latency=SECONDS, --bandwidth=BYTES_PER_SECOND,
+    # --reset-rate=P, --ranges=BOOL, --rate-429=P, --rate-5xx=P,
+    # --retry-after=SECONDS, --seed=N
+    from benchmarks import common
+    OPTIONS:set = {
+        "port", "latency", "bandwidth", "reset-rate", "ranges",
+        "rate-429", "rate-5xx", "retry-after", "seed"
+    }
+    cmd_opts:dict = common.parse_options(OPTIONS)
+    try:
+        server = fault_server(
+            int(cmd_opts.get("port", "8767")),
+            float(cmd_opts.get("latency", "0")),
+            float(cmd_opts["bandwidth"]) if "bandwidth" in cmd_opts else None,
+            float(cmd_opts.get("reset-rate", "0")),
+            cmd_opts.get("ranges", "True") == "True",
+            float(cmd_opts.get("rate-429", "0")),
+            float(cmd_opts.get("rate-5xx", "0")),
+            int(cmd_opts.get("retry-after", "1")),
+            int(cmd_opts.get("seed", "0"))
+        )
+    except ValueError as e:
+        print(f"Invalid option. {e}")
+        exit(-1)
+    print(f"Serving on {server.url('<name>', 0).replace('-0.mp4', '-<size>.mp4')}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+lease_check.py runs many worker processes on the leases of one manifest,
+as nodes sharing a directory would, and checks that every video
+is claimed by exactly one of them. Exits with 1 if not.
+
+    cd scripts
+    python -m benchmarks.lease_check --workers=32 --videos=200 --expired=100
+
+worker:
+    Claims the videos in order until every one is finished,
+    holds each for a moment, marks it done, and logs each claim.
+    All the workers go in the same order, so that they contend for each video.
+
+run:
+    Starts the workers at once on a new lease directory,
+    where the first videos have leases left by a crashed node,
+    so that the workers race to take them over.
+
+"""
+
+import multiprocessing
+import os
+import pathlib
+import tempfile
+import time
+
+from benchmarks import common
+
+DEF_NUM_WORKERS:int = 32
+DEF_NUM_VIDEOS:int = 200
+DEF_NUM_EXPIRED:int = 100
+DEF_REPEAT:int = 3
+# Long enough that no lease expires while held, as nothing renews them here.
+LEASE_SECONDS:float = 5.0
+HOLD_SECONDS:float = 0.002
+
+
+def worker(manifest_path: str, log_path: str, num_videos: int, start, node: str) -> None:
+    import shard
+    board = shard.lease_board(pathlib.Path(manifest_path), node, LEASE_SECONDS)
+    start.wait()
+    with open(log_path, 'a') as log:
+        while not all(board.is_finished(i) for i in range(num_videos)):
+            for i in range(num_videos):
+                if board.claim(i):
+                    # One write per line, so that the lines of the processes do not mix.
+                    log.write(f"{i} {node}\n")
+                    log.flush()
+                    time.sleep(HOLD_SECONDS)
+                    board.release(i, True)
+
+
+def run(directory: pathlib.Path, num_workers: int, num_videos: int, num_expired: int) -> dict:
+    """
+    Returns
+    -------
+    dict of
+        claims: number of claims in total,
+        twice: indices claimed more than once,
+        never: indices never claimed.
+    """
+    import shard
+    manifest_path = directory / "manifest.json"
+    log_path = directory / "claims.log"
+    board = shard.lease_board(manifest_path, "crashed", LEASE_SECONDS)
+    old:float = time.time() - 10 * LEASE_SECONDS
+    for i in range(num_expired):
+        lease = board.dir / f"{i}.lease"
+        lease.write_text('{"node": "crashed"}')
+        os.utime(lease, (old, old))
+
+    start = multiprocessing.Event()
+    workers:list = [
+        multiprocessing.Process(
+            target=worker,
+            args=(str(manifest_path), str(log_path), num_videos, start, f"w{n}")
+        )
+        for n in range(num_workers)
+    ]
+    for w in workers:
+        w.start()
+    start.set()
+    for w in workers:
+        w.join()
+
+    counts:dict = dict()
+    for line in log_path.read_text().splitlines():
+        i = int(line.split()[0])
+        counts[i] = counts.get(i, 0) + 1
+    return {
+        "claims": sum(counts.values()),
+        "twice": sorted(i for (i, n) in counts.items() if n > 1),
+        "never": sorted(set(range(num_videos)) - set(counts)),
+    }
+
+
+def main() -> None:
+    # Options, in the form of --name=value:
+    # --workers=N   processes claiming at the same time
+    # --videos=N   in the manifest
+    # --expired=N   of them with a lease left by a crashed node
+    # --repeat=N   runs, each on a new directory
+    OPTIONS:set = { "workers", "videos", "expired", "repeat" }
+    cmd_opts:dict = common.parse_options(OPTIONS)
+    try:
+        num_workers:int = int(cmd_opts.get("workers", str(DEF_NUM_WORKERS)))
+        num_videos:int = int(cmd_opts.get("videos", str(DEF_NUM_VIDEOS)))
+        num_expired:int = int(cmd_opts.get("expired", str(DEF_NUM_EXPIRED)))
+        repeat:int = int(cmd_opts.get("repeat", str(DEF_REPEAT)))
+    except ValueError as e:
+        print(f"Invalid option. {e}")
+        exit(-1)
+    if (min(num_workers, num_videos, repeat) < 1 or not 0 <= num_expired <= num_videos):
+        print("The numbers must be positive, with at most as many expired as videos.")
+        exit(-1)
+
+    ok:bool = True
+    for r in range(repeat):
+        with tempfile.TemporaryDirectory(prefix="mitocw_lv_dl_leases_") as tmp:
+            result:dict = run(pathlib.Path(tmp), num_workers, num_videos, num_expired)
+        print(
+            f"Run {r + 1}: {result['claims']} claims of {num_videos} videos, " + \
+            f"claimed twice: {result['twice']}, never: {result['never']}"
+        )
+        ok = ok and not result["twice"] and not result["never"]
+    exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""
+parse_bench.py measures how fast the videos of a course are found,
+on synthetic bundles (see synthetic_ocw.py) of 10 to 10,000 videos,
+and writes the results as JSON, so that a change can be compared with the last.
+
+    cd scripts
+    python -m benchmarks.parse_bench --sizes=10,100,1000 --out=parse.json
+    python -m benchmarks.parse_bench --baseline=parse.json
+
+CASES:
+    What is measured, by name:
+        three_100k_course, video_gallery_course, c6004_yt
+            a course finding all its Lectures, as main does.
+        extract_300k_index, extract_galleries_index, extract_youtube_pages
+            give_me_bs and the helpers' grab_* function alone,
+            on each page, in this process.
+
+run_case:
+    Runs one case in a new process and measures its wall time,
+    pages parsed per second and peak memory.
+
+compare:
+    Compares the results with those of an earlier run.
+
+"""
+
+import json
+import pathlib
+import sys
+import tempfile
+import time
+
+from benchmarks import common
+from benchmarks import synthetic_ocw
+
+DEF_SIZES:tuple = (10, 100, 1000, 10000)
+DEF_REPEAT:int = 3
+# A case this much slower than in the baseline is a regression,
+DEF_MAX_SLOWDOWN:float = 1.25
+# unless it is slower by less than this many seconds, which is only noise.
+MIN_REGRESSION_SECONDS:float = 0.01
+RESULTS_VERSION:int = 1
+
+
+def _three_100k_course(root: pathlib.Path, num_videos: int) -> tuple:
+    from courses import course
+    way = course.three_100k_course(root, "300k")
+    return (len(list(way.iter_videos(["Lecture"], False))), 1)
+
+
+def _video_gallery_course(root: pathlib.Path, num_videos: int) -> tuple:
+    from courses import course
+    way = course.video_gallery_course(root, "yt-dlp")
+    return (len(list(way.iter_videos(["Lecture"], False))), 1 + num_videos)
+
+
+def _c6004_yt(root: pathlib.Path, num_videos: int) -> tuple:
+    from courses import c6004y2017
+    way = c6004y2017.c6004_yt(root, "yt-dlp")
+    video_maps = way.populate_video_maps_lists({ "Lecture" }, False)
+    return (sum(len(m) for (_, m) in video_maps["Lecture"]), num_videos)
+
+
+def _extract_300k_index(root: pathlib.Path, num_videos: int) -> tuple:
+    from courses import helpers
+    bs = helpers.give_me_bs(
+        root / "resources" / synthetic_ocw.DIRS["Lecture"] / "index.html",
+        helpers.get_strainer("RESOURCES_INDEX_STRAINER")
+    )
+    return (len(helpers.grab_title_url_from_300k_resources_index_html(bs, "Lecture", False)), 1)
+
+
+def _extract_galleries_index(root: pathlib.Path, num_videos: int) -> tuple:
+    from courses import helpers
+    ind_path = root / "video_galleries" / synthetic_ocw.DIRS["Lecture"] / "index.html"
+    bs = helpers.give_me_bs(ind_path, helpers.get_strainer("GALLERIES_INDEX_STRAINER"))
+    return (len(helpers.grab_html_from_galleries_index_html(bs, ind_path.parent, False)), 1)
+
+
+def _extract_youtube_pages(root: pathlib.Path, num_videos: int) -> tuple:
+    from courses import helpers
+    slug:str = synthetic_ocw.DIRS["Lecture"][:-len("-videos")]
+    num_found:int = 0
+    for i in range(1, num_videos + 1):
+        bs = helpers.give_me_bs(
+            root / "resources" / f"{slug}-{i}" / "index.html",
+            helpers.get_strainer("YOUTUBE_PAGE_STRAINER")
+        )
+        num_found += len(helpers.grab_title_url_from_youtube_html_page(bs, "Lecture", False))
+    return (num_found, num_videos)
+
+
+# { name : function(root, num_videos) -> (number of videos found, number of pages parsed) }
+CASES:dict = {
+    "three_100k_course"         : _three_100k_course,
+    "video_gallery_course"      : _video_gallery_course,
+    "c6004_yt"                  : _c6004_yt,
+    "extract_300k_index"        : _extract_300k_index,
+    "extract_galleries_index"   : _extract_galleries_index,
+    "extract_youtube_pages"     : _extract_youtube_pages,
+}
+
+
+def _peak_rss_kib() -> tuple:
+    """
+    Returns
+    -------
+    (of this process, of the largest of its children that have exited),
+    in KiB, or (None, None) where it can not be told (e.g. on Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return (None, None)
+    # ru_maxrss is in bytes on macOS and in KiB elsewhere.
+    unit:int = 1024 if sys.platform == "darwin" else 1
+    return (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // unit,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // unit
+    )
+
+
+def _run_case_here(args: tuple) -> dict:
+    """
+    Runs in the new process of run_case.
+    """
+    (name, root, num_videos, parser, strain, num_parse_workers) = args
+    # Importing the courses, bs4 and the parser
+    # would otherwise be most of a small case.
+    from courses import c6004y2017
+    from courses import course
+    from courses import helpers
+    helpers.use_parser(parser, strain)
+    helpers.use_parse_workers(num_parse_workers)
+    helpers.get_strainer("YOUTUBE_PAGE_STRAINER")
+
+    start = time.perf_counter()
+    (num_found, num_pages) = CASES[name](root, num_videos)
+    wall:float = time.perf_counter() - start
+
+    if num_found != num_videos:
+        raise AssertionError(f"{name} found {num_found} of the {num_videos} videos.")
+    (rss, workers_rss) = _peak_rss_kib()
+    return {
+        "wall_seconds": wall,
+        "pages": num_pages,
+        "pages_per_second": num_pages / wall if wall > 0 else None,
+        "videos_per_second": num_videos / wall if wall > 0 else None,
+        "peak_rss_kib": rss,
+        "peak_worker_rss_kib": workers_rss if workers_rss else None,
+    }
+
+
+def run_case(
+    name: str,
+    root: pathlib.Path,
+    num_videos: int,
+    parser: str|None = None,
+    strain: bool = True,
+    num_parse_workers: int|None = None
+) -> dict:
+    """
+    Runs CASES[name] on the bundle at root, which has num_videos Lectures,
+    in a new process, so that its peak memory is its own
+    and nothing but the modules is cached yet, as in a run of main.
+
+    Returns
+    -------
+    dict of
+        wall_seconds, pages, pages_per_second, videos_per_second,
+        peak_rss_kib: of the process,
+        peak_worker_rss_kib: of the largest parse worker, if any.
+
+    Raises
+    ------
+    AssertionError
+        if the case did not find every video.
+    """
+    import concurrent.futures
+    import multiprocessing
+    with concurrent.futures.ProcessPoolExecutor(
+        1, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        return executor.submit(
+            _run_case_here, (name, root, num_videos, parser, strain, num_parse_workers)
+        ).result()
+
+
+def compare(results: dict, baseline: dict, max_slowdown: float = DEF_MAX_SLOWDOWN) -> list:
+    """
+    Parameters
+    ----------
+    results, baseline: dict
+        written by main, the baseline earlier.
+
+    Returns
+    -------
+    list of (case, videos, slowdown, regressed) for every case of results
+    that is also in baseline, where slowdown is the ratio of the wall times,
+    and regressed is whether it is above max_slowdown
+    by more than MIN_REGRESSION_SECONDS.
+    """
+    old:dict = {
+        (r["case"], r["videos"]) : r["wall_seconds"] for r in baseline["results"]
+    }
+    ret:list = []
+    for r in results["results"]:
+        key = (r["case"], r["videos"])
+        if key in old and old[key] > 0:
+            slowdown:float = r["wall_seconds"] / old[key]
+            regressed:bool = slowdown > max_slowdown and \
+                r["wall_seconds"] - old[key] > MIN_REGRESSION_SECONDS
+            ret.append((r["case"], r["videos"], slowdown, regressed))
+    return ret
+
+
+def main() -> None:
+    # Options, in the form of --name=value:
+    # --sizes=LIST   numbers of videos of the bundles, separated by comma
+    # --cases=LIST   names in CASES, separated by comma (default all)
+    # --repeat=N   runs of each case; the fastest is kept
+    # --page-kib=N   about how big each page is
+    # --parser=NAME, --strain=BOOL, --parse-workers=N   as in main.py
+    # --root=DIR   where the bundles are made and kept (default a temporary directory)
+    # --out=FILE   where the JSON is written (default stdout)
+    # --baseline=FILE   JSON of an earlier run to compare with
+    # --max-slowdown=RATIO   exits with 1 if a case is slower than this against the baseline
+    OPTIONS:set = {
+        "sizes", "cases", "repeat", "page-kib", "parser", "strain", "parse-workers",
+        "root", "out", "baseline", "max-slowdown"
+    }
+    cmd_opts:dict = common.parse_options(OPTIONS)
+
+    try:
+        sizes:list = [int(s) for s in cmd_opts.get("sizes", ",".join(map(str, DEF_SIZES))).split(',')]
+        repeat:int = int(cmd_opts.get("repeat", str(DEF_REPEAT)))
+        page_kib:int = int(cmd_opts.get("page-kib", str(synthetic_ocw.DEF_PAGE_KIB)))
+        num_parse_workers:int|None = int(cmd_opts["parse-workers"]) \
+            if "parse-workers" in cmd_opts else None
+        max_slowdown:float = float(cmd_opts.get("max-slowdown", str(DEF_MAX_SLOWDOWN)))
+    except ValueError:
+        print("Invalid --sizes, --repeat, --page-kib, --parse-workers or --max-slowdown.")
+        exit(-1)
+    if (min(sizes) < 1 or repeat < 1 or page_kib < 1):
+        print("The sizes, --repeat and --page-kib must be positive.")
+        exit(-1)
+    cases:list = cmd_opts["cases"].split(',') if "cases" in cmd_opts else list(CASES)
+    for c in cases:
+        if (not c in CASES):
+            print(f"Invalid case {c}. Supported: {list(CASES)}")
+            exit(-1)
+    parser:str|None = cmd_opts.get("parser")
+    strain:bool = cmd_opts.get("strain", "True") == "True"
+
+    from courses import helpers
+    try:
+        helpers.use_parser(parser, strain)
+    except ValueError as e:
+        print(f"Invalid --parser. {e}")
+        exit(-1)
+    import bs4
+
+    results:dict = {
+        **common.results_header(RESULTS_VERSION),
+        "bs4": bs4.__version__,
+        "parser": helpers.current_parser(),
+        "strain": strain,
+        "parse_workers": num_parse_workers,
+        "page_kib": page_kib,
+        "repeat": repeat,
+        "results": [],
+    }
+
+    with tempfile.TemporaryDirectory(prefix="mitocw_lv_dl_bench_") as tmp:
+        bundles_root = pathlib.Path(cmd_opts.get("root", tmp))
+        for n in sizes:
+            root = bundles_root / f"videos_{n}_kib_{page_kib}" / "static"
+            if not root.exists():
+                print(f"Making a bundle of {n} videos in {root}", file=sys.stderr)
+                synthetic_ocw.make_bundle(root, n, ("Lecture",), page_kib)
+
+            for c in cases:
+                runs:list = [
+                    run_case(c, root, n, parser, strain, num_parse_workers) for _ in range(repeat)
+                ]
+                # The fastest is the least disturbed by the rest of the machine.
+                r:dict = min(runs, key=lambda r: r["wall_seconds"])
+                r["peak_rss_kib"] = max((x["peak_rss_kib"] or 0) for x in runs) or None
+                results["results"].append({ "case": c, "videos": n, **r })
+                print(
+                    f"{c:24} {n:6} videos {r['wall_seconds']:9.4f}s " + \
+                    f"{r['pages_per_second'] or 0:10.1f} pages/s " + \
+                    f"{(r['peak_rss_kib'] or 0) / 1024:7.1f}MiB",
+                    file=sys.stderr
+                )
+
+    common.write_results(results, cmd_opts.get("out"))
+
+    if ("baseline" in cmd_opts):
+        baseline:dict = json.loads(pathlib.Path(cmd_opts["baseline"]).read_text())
+        num_regressions:int = 0
+        for (c, n, slowdown, regressed) in compare(results, baseline, max_slowdown):
+            num_regressions += regressed
+            print(
+                f"{c:24} {n:6} videos {slowdown:6.2f}x" + (" REGRESSION" if regressed else ""),
+                file=sys.stderr
+            )
+        if (num_regressions != 0):
+            exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+strain_check.py checks that the courses find the same videos
+with every parser, strained or not (see helpers.use_parser),
+as they did parsing whole pages with html.parser. Exits with 1 if not.
+
+    cd scripts
+    python -m benchmarks.strain_check --videos=50
+    python -m benchmarks.strain_check --course=18.065-2018 --static=<path> --types=Lecture
+
+synthetic_ways:
+    The ways of retrieving information of parse_bench,
+    on a synthetic bundle (see synthetic_ocw.py).
+
+course_ways:
+    The ways of retrieving information of a course, on its static bundle.
+
+check:
+    Finds the videos of each way with each parser, strained or not,
+    and tells which differ from those found on whole pages by html.parser.
+
+"""
+
+import pathlib
+import tempfile
+
+from benchmarks import common
+from benchmarks import synthetic_ocw
+
+DEF_NUM_VIDEOS:int = 50
+# What the courses did before strainers and lxml.
+REFERENCE:tuple = ("html.parser", False)
+
+
+def synthetic_ways(root: pathlib.Path, num_videos: int) -> list:
+    """
+    Returns
+    -------
+    list of (name, way) on a new bundle at root of num_videos Lectures.
+    """
+    from courses import c6004y2017
+    from courses import course
+    synthetic_ocw.make_bundle(root, num_videos)
+    return [
+        ("three_100k_course", course.three_100k_course(root, "300k")),
+        ("video_gallery_course", course.video_gallery_course(root, "yt-dlp")),
+        ("c6004_yt", c6004y2017.c6004_yt(root, "yt-dlp")),
+    ]
+
+
+def course_ways(course_id: str, static_root: pathlib.Path) -> list:
+    """
+    Returns
+    -------
+    list of (name, way), one for each way of retrieving information of the course.
+    """
+    import registry
+    info = registry.COURSES[course_id]
+    ways:list = []
+    for (dld, way_cls) in sorted(info.map_dld_ways.items()):
+        if all(type(w) is not way_cls for (_, w) in ways):
+            ways.append((way_cls.__name__, way_cls(static_root, dld)))
+    return ways
+
+
+def check(ways: list, types: list) -> bool:
+    """
+    Returns
+    -------
+    Whether every way found the same video maps with every parser, strained or not.
+    """
+    from courses import helpers
+    ok:bool = True
+    for (name, way) in ways:
+        helpers.use_parser(*REFERENCE)
+        try:
+            reference:dict = way.populate_video_maps_lists(types, False)
+        # The type is not supported, or the bundle lacks what this way looks at.
+        except (ValueError, OSError, AssertionError) as e:
+            print(f"{name}: skipped. {e!r}")
+            continue
+        for parser in helpers.available_parsers():
+            for strain in (True, False):
+                helpers.use_parser(parser, strain)
+                try:
+                    same:bool = way.populate_video_maps_lists(types, False) == reference
+                    error:str = ""
+                except (ValueError, AssertionError) as e:
+                    # e.g. the strainer dropped what a page is parsed for.
+                    same = False
+                    error = f" {e!r}"
+                print(f"{name}, {parser}, strain={strain}: {'same' if same else 'DIFFERENT'}{error}")
+                ok = ok and same
+    helpers.use_parser()
+    return ok
+
+
+def main() -> None:
+    # Options, in the form of --name=value:
+    # --videos=N   of the synthetic bundle, if no --course
+    # --course=ID   to check on its static bundle instead, e.g. 18.065-2018
+    # --static=PATH   of the course's static bundle
+    # --types=A,B   video types to find, Lecture by default
+    OPTIONS:set = { "videos", "course", "static", "types" }
+    cmd_opts:dict = common.parse_options(OPTIONS)
+    types:list = cmd_opts.get("types", "Lecture").split(',')
+
+    if "course" in cmd_opts:
+        if not "static" in cmd_opts:
+            print("--course needs --static.")
+            exit(-1)
+        ok:bool = check(course_ways(cmd_opts["course"], pathlib.Path(cmd_opts["static"])), types)
+    else:
+        try:
+            num_videos:int = int(cmd_opts.get("videos", str(DEF_NUM_VIDEOS)))
+        except ValueError as e:
+            print(f"Invalid option. {e}")
+            exit(-1)
+        if num_videos < 1:
+            print("The number of videos must be positive.")
+            exit(-1)
+        with tempfile.TemporaryDirectory(prefix="mitocw_lv_dl_strain_") as tmp:
+            ok = check(synthetic_ways(pathlib.Path(tmp) / "static", num_videos), types)
+    exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
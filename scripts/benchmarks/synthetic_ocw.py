@@ -0,0 +1,143 @@
+"""
+synthetic_ocw.py makes fake static OCW bundles to measure the parsing on,
+laid out like the real ones, in the places the courses look at.
+
+make_bundle:
+    Makes a bundle of any number of videos, with
+        resources/<type>/index.html
+            listing the 300k videos in d-inline-flex containers,
+            for three_100k_course.
+        video_galleries/<type>/index.html
+            linking (a.video-link) to one page per video,
+            whose video[data-setup] has the YouTube url,
+            for video_gallery_course.
+        pages/cN/cNs2/cNs2vJ/index.html
+            the same pages for c6004_yt, spread over its 21 lectures.
+    Every page is padded with the kind of html around the videos
+    in a real bundle, so that parsing a page costs about what it really does.
+
+"""
+
+import html
+import json
+import pathlib
+
+# { vtype : directory name }, as in course.three_100k_course
+# and course.video_gallery_course.
+DIRS:dict = {
+    "Lecture"       : "lecture-videos",
+    "Recitation"    : "recitation-videos",
+}
+
+# course.c6004y2017.c6004_yt always looks at this many lectures.
+NUM_6004_LECTURES:int = 21
+
+# A real page is about this big, mostly navigation and scripts.
+DEF_PAGE_KIB:int = 16
+
+
+def padding(num_kib: int) -> str:
+    """
+    Returns
+    -------
+    About num_kib KiB of html that no course looks at:
+    navigation, a sidebar of links and inline scripts.
+    """
+    item = '<li class="nav-item"><a class="nav-link" href="../../pages/syllabus/index.html">' + \
+        '<span class="nav-title">Syllabus</span></a></li>'
+    script = '<script type="text/javascript">window.__CONFIG__ = ' + \
+        json.dumps({ "theme": "ocw", "items": list(range(32)) }) + ';</script>'
+    block = f'<nav class="course-nav"><ul>{item * 8}</ul></nav>{script}'
+    return block * max(num_kib * 1024 // len(block), 1)
+
+
+def page(body: str, page_kib: int) -> str:
+    return '<!doctype html><html lang="en"><head><meta charset="utf-8">' + \
+        f'<title>Course</title></head><body>{padding(page_kib // 2)}' + \
+        f'<main id="course-content-section">{body}</main>' + \
+        f'{padding(page_kib - page_kib // 2)}</body></html>'
+
+
+def video_page(title: str, youtube_url: str, page_kib: int) -> str:
+    data_setup = json.dumps({
+        "techOrder": ["youtube"],
+        "sources": [{ "type": "video/youtube", "src": youtube_url }]
+    })
+    return page(
+        '<div class="course-section-title-container">' + \
+        f'<h2 class="pb-1">{html.escape(title)}</h2></div>' + \
+        '<div class="video-container"><video class="video-js" ' + \
+        f'data-setup="{html.escape(data_setup)}"></video></div>',
+        page_kib
+    )
+
+
+def make_bundle(
+    root: pathlib.Path,
+    num_videos: int,
+    types: tuple = ("Lecture",),
+    page_kib: int = DEF_PAGE_KIB
+) -> int:
+    """
+    Parameters
+    ----------
+    root: Path
+        the static directory to make, which must not exist yet.
+    num_videos: int
+        of each of types.
+    types: tuple
+        video types, among DIRS.
+        The pages/ tree of c6004_yt only has the Lectures.
+    page_kib: int
+        about how big each page is.
+
+    Returns
+    -------
+    The number of html files written.
+    """
+    root.mkdir(parents=True)
+    num_files:int = 0
+
+    def write(path: pathlib.Path, text: str) -> None:
+        nonlocal num_files
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+        num_files += 1
+
+    for t in types:
+        containers:str = ""
+        links:str = ""
+        for i in range(1, num_videos + 1):
+            title = f"{t} {i}: Topic {i}"
+            slug = f"{DIRS[t][:-len('-videos')]}-{i}"
+            containers += '<div class="d-inline-flex">' + \
+                '<a class="resource-thumbnail" ' + \
+                f'href="https://archive.org/download/{slug}/{slug}_300k.mp4">' + \
+                '<img src="../../static_shared/images/resource_thumbnail.png"></a>' + \
+                f'<a class="resource-list-title" href="../{slug}/index.html">{html.escape(title)}</a>' + \
+                '</div>'
+            links += f'<a class="video-link" href="../../resources/{slug}/index.html">' + \
+                f'<h5>{html.escape(title)}</h5></a>'
+            write(
+                root / "resources" / slug / "index.html",
+                video_page(title, f"https://www.youtube.com/watch?v={slug}", page_kib)
+            )
+        write(root / "resources" / DIRS[t] / "index.html", page(containers, page_kib))
+        write(root / "video_galleries" / DIRS[t] / "index.html", page(links, page_kib))
+
+    if "Lecture" in types:
+        for i in range(1, NUM_6004_LECTURES + 1):
+            (root / "pages" / f"c{i}" / f"c{i}s2").mkdir(parents=True)
+        for j in range(num_videos):
+            # Round robin, so that every lecture has about as many.
+            i = j % NUM_6004_LECTURES + 1
+            v = j // NUM_6004_LECTURES + 1
+            write(
+                root / "pages" / f"c{i}" / f"c{i}s2" / f"c{i}s2v{v}" / "index.html",
+                video_page(
+                    f"L{i:02d}.{v}: Topic {i}.{v}",
+                    f"https://www.youtube.com/watch?v=c{i}v{v}", page_kib
+                )
+            )
+
+    return num_files
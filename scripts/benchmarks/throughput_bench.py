@@ -0,0 +1,228 @@
+"""
+throughput_bench.py measures the 300k downloaders end to end,
+through main.start_download, against a fault_server on this machine,
+over every combination of chunk sizes (fixed, or adapted by the
+downloader's chunk_policy), workers and connections per file,
+and writes the results as JSON.
+
+    cd scripts
+    python -m benchmarks.throughput_bench --chunk-sizes=16K,256K --workers=1,4 \\
+        --bandwidth=4M --reset-rate=0.05 --rate-5xx=0.05 --out=throughput.json
+
+run:
+    Downloads the files of one combination from a new fault_server
+    and measures the time to complete, the throughput, the retries
+    and whether every file arrived intact.
+
+"""
+
+import contextlib
+import io
+import itertools
+import pathlib
+import sys
+import tempfile
+import time
+import urllib.parse
+
+from benchmarks import common
+from benchmarks import fault_server
+
+DEF_NUM_FILES:int = 8
+DEF_FILE_SIZE:int = 4*1024*1024
+DEF_SEGMENT_SIZE:int = 1024*1024
+# Short, so that the faults cost retries rather than waiting.
+DEF_RETRY_DELAY:float = 0.05
+RESULTS_VERSION:int = 2
+
+
+def run(
+    server_args: dict,
+    downloader_id: str,
+    num_files: int,
+    file_size: int,
+    chunk_size: int|None,
+    num_workers: int,
+    num_connections: int,
+    segment_size: int = DEF_SEGMENT_SIZE,
+    num_tries: int = 8,
+    retry_delay: float = DEF_RETRY_DELAY
+) -> dict:
+    """
+    Parameters
+    ----------
+    server_args: dict
+        keyword arguments of the fault_server, but the port.
+    downloader_id: str
+        "300k" or "300k-async".
+    chunk_size: int
+        of every read, or None for the sizes of the downloader's default chunk_policy.
+
+    Returns
+    -------
+    dict of
+        wall_seconds: to complete every download,
+        bytes, mib_per_second: of the files downloaded,
+        ok, skipped, failed: numbers of videos as scheduler.summarize,
+        corrupt: number of files downloaded with the wrong bytes,
+        failed_requests, retries: see retry_policy.stats,
+        connections_opened, http_requests: see default_300k_downloader.stats,
+        server: see fault_server.stats.
+    """
+    import chunk_policy
+    import main
+    import registry
+    import retry_policy
+    import scheduler
+
+    downloader = registry.DOWNLOADERS[downloader_id]()
+    if chunk_size is not None:
+        downloader.chunk_size = chunk_size
+        downloader.chunk_policy = chunk_policy.chunk_policy(chunk_size, chunk_size, chunk_size)
+    downloader.num_connections = num_connections
+    downloader.segment_size = segment_size
+    downloader.retry_policy = retry_policy.retry_policy(num_tries, retry_delay)
+
+    with fault_server.fault_server(**server_args) as server, \
+        tempfile.TemporaryDirectory(prefix="mitocw_lv_dl_bench_") as tmp:
+        videos_root = pathlib.Path(tmp)
+        names:list = [f"lecture{i}" for i in range(1, num_files + 1)]
+        video_maps:dict = { "Lecture": [
+            (i, { f"Lecture {i}" : server.url(names[i-1], file_size) })
+            for i in range(1, num_files + 1)
+        ] }
+
+        # start_download prints its summary, which is in the results instead.
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            results:list = main.start_download(
+                video_maps, videos_root, downloader, False, num_workers, False
+            )
+            wall:float = time.perf_counter() - start
+
+        num_bytes:int = 0
+        num_corrupt:int = 0
+        for (job, r) in results:
+            if r != scheduler.RESULT_OK:
+                continue
+            path = job.target_dir / f"{job.title}.mp4"
+            data = path.read_bytes() if path.exists() else b""
+            num_bytes += len(data)
+            name:str = fault_server.PATH_RE.match(urllib.parse.urlsplit(job.url).path)["name"]
+            if data != fault_server.content_of(name, 0, file_size):
+                num_corrupt += 1
+        server_stats:dict = server.stats()
+
+    (num_failed_requests, num_retries) = downloader.retry_policy.stats()
+    (num_connections_opened, num_requests) = downloader.stats()
+    return {
+        "wall_seconds": wall,
+        "bytes": num_bytes,
+        "mib_per_second": num_bytes / 1024**2 / wall if wall > 0 else None,
+        **{ k : sum(1 for (_, r) in results if r == k) for k in scheduler.RESULTS },
+        "corrupt": num_corrupt,
+        "failed_requests": num_failed_requests,
+        "retries": num_retries,
+        "connections_opened": num_connections_opened,
+        "http_requests": num_requests,
+        "server": server_stats,
+    }
+
+
+def main() -> None:
+    # Options, in the form of --name=value. Those named by a plural
+    # take a list separated by comma, and every combination is run:
+    # --downloaders=LIST   of 300k, 300k-async (default both)
+    # --chunk-sizes=LIST   bytes of each read, e.g. 16K,256K, or auto for the adaptive sizes
+    # --workers=LIST   numbers of files downloaded at the same time
+    # --connections=LIST   numbers of connections per file (300k only)
+    # --files=N, --file-size=BYTES, --segment-size=BYTES
+    # --retries=N, --retry-delay=SECONDS   of the downloaders' retry policy
+    # --latency=SECONDS, --bandwidth=BYTES, --reset-rate=P, --ranges=BOOL,
+    # --rate-429=P, --rate-5xx=P, --retry-after=SECONDS, --seed=N   of the fault_server
+    # --repeat=N   runs of each combination; the fastest is kept
+    # --out=FILE   where the JSON is written (default stdout)
+    OPTIONS:set = {
+        "downloaders", "chunk-sizes", "workers", "connections",
+        "files", "file-size", "segment-size", "retries", "retry-delay",
+        "latency", "bandwidth", "reset-rate", "ranges", "rate-429", "rate-5xx",
+        "retry-after", "seed", "repeat", "out"
+    }
+    cmd_opts:dict = common.parse_options(OPTIONS)
+
+    downloaders:list = cmd_opts.get("downloaders", "300k,300k-async").split(',')
+    for d in downloaders:
+        if (d not in ("300k", "300k-async")):
+            print("Invalid --downloaders. Only 300k and 300k-async download over HTTP.")
+            exit(-1)
+    try:
+        chunk_sizes:list = [
+            None if s == "auto" else common.parse_size(s)
+            for s in cmd_opts.get("chunk-sizes", "16K,64K,256K,auto").split(',')
+        ]
+        workers:list = [int(s) for s in cmd_opts.get("workers", "1,4").split(',')]
+        connections:list = [int(s) for s in cmd_opts.get("connections", "1,4").split(',')]
+        num_files:int = int(cmd_opts.get("files", str(DEF_NUM_FILES)))
+        file_size:int = common.parse_size(cmd_opts.get("file-size", str(DEF_FILE_SIZE)))
+        segment_size:int = common.parse_size(cmd_opts.get("segment-size", str(DEF_SEGMENT_SIZE)))
+        num_tries:int = int(cmd_opts.get("retries", "8"))
+        retry_delay:float = float(cmd_opts.get("retry-delay", str(DEF_RETRY_DELAY)))
+        repeat:int = int(cmd_opts.get("repeat", "1"))
+        server_args:dict = {
+            "latency": float(cmd_opts.get("latency", "0")),
+            "bandwidth": common.parse_size(cmd_opts["bandwidth"]) if "bandwidth" in cmd_opts else None,
+            "reset_rate": float(cmd_opts.get("reset-rate", "0")),
+            "ranges": cmd_opts.get("ranges", "True") == "True",
+            "rate_429": float(cmd_opts.get("rate-429", "0")),
+            "rate_5xx": float(cmd_opts.get("rate-5xx", "0")),
+            "retry_after": int(cmd_opts.get("retry-after", "0")),
+            "seed": int(cmd_opts.get("seed", "0")),
+        }
+        # Fail before any run.
+        fault_server.fault_server(**server_args).stop()
+    except ValueError as e:
+        print(f"Invalid option. {e}")
+        exit(-1)
+    if (min([c for c in chunk_sizes if c is not None] + workers + connections + [num_files, file_size, segment_size, num_tries, repeat]) < 1):
+        print("The sizes and numbers must be positive.")
+        exit(-1)
+
+    results:dict = {
+        **common.results_header(RESULTS_VERSION),
+        "files": num_files,
+        "file_size": file_size,
+        "segment_size": segment_size,
+        "retries": num_tries,
+        "retry_delay": retry_delay,
+        "server": server_args,
+        "repeat": repeat,
+        "results": [],
+    }
+
+    for (d, c, w, n) in itertools.product(downloaders, chunk_sizes, workers, connections):
+        # The async downloader never splits a file.
+        if d == "300k-async" and n != connections[0]:
+            continue
+        if d == "300k-async":
+            n = 1
+        runs:list = [
+            run(server_args, d, num_files, file_size, c, w, n, segment_size, num_tries, retry_delay)
+            for _ in range(repeat)
+        ]
+        r:dict = min(runs, key=lambda r: r["wall_seconds"])
+        results["results"].append({
+            "downloader": d, "chunk_size": c if c is not None else "auto",
+            "workers": w, "connections": n, **r
+        })
+        print(
+            f"{d:10} chunk {c if c is not None else 'auto':>8} workers {w:3} connections {n:3} " + \
+            f"{r['wall_seconds']:8.3f}s {r['mib_per_second'] or 0:8.2f}MiB/s " + \
+            f"{r['retries']:4} retries {r['failed']:3} failed {r['corrupt']:3} corrupt",
+            file=sys.stderr
+        )
+
+    common.write_results(results, cmd_opts.get("out"))
+
+
+if __name__ == "__main__":
+    main()
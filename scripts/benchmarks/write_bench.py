@@ -0,0 +1,189 @@
+"""
+write_bench.py measures the loop that copies a response to its file,
+the one of helpers.download_file_over_http against the one it replaced,
+on files served by a fault_server on this machine, one at a time,
+and writes the results as JSON.
+
+    cd scripts
+    python -m benchmarks.write_bench --chunk-sizes=16K,64K,256K --file-size=64M --out=write.json
+
+PATHS:
+    The loops, by name:
+        chunks
+            The loop before helpers.block_writer: iter_content makes a new bytes
+            for every chunk, and each is written to a buffered file at once.
+        blocks
+            helpers.copy_body: the socket is read into the buffer of a
+            block_writer, which writes whole blocks of WRITE_BLOCK_SIZE
+            to an unbuffered file.
+
+run:
+    Downloads the files once through a loop, and measures the wall time,
+    the CPU time of the thread running the loop (the server runs on others),
+    and the number of writes to the file.
+
+"""
+
+import pathlib
+import sys
+import tempfile
+import time
+
+from benchmarks import common
+from benchmarks import fault_server
+
+PATHS:tuple = ("chunks", "blocks")
+DEF_NUM_FILES:int = 4
+DEF_FILE_SIZE:int = 64*1024*1024
+DEF_REPEAT:int = 3
+RESULTS_VERSION:int = 1
+
+
+class _counting_file:
+    """
+    Stands for a file, counting the writes to it.
+    Only used in a run of its own, so that counting costs nothing to the timed runs.
+    """
+
+    def __init__(self, file):
+        self._file = file
+        self.num_writes:int = 0
+
+    def write(self, data) -> int:
+        self.num_writes += 1
+        return self._file.write(data)
+
+    def __getattr__(self, name: str):
+        return getattr(self._file, name)
+
+
+def _copy_chunks(response, file, chunk_size: int) -> None:
+    # As download_file_over_http did, without the metrics and the limiter.
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        file.write(chunk)
+
+
+def _copy_blocks(response, file, chunk_size: int) -> None:
+    from courses import helpers
+    writer = helpers.block_writer(file, 0)
+    try:
+        helpers.copy_body(response, writer, chunk_size)
+    finally:
+        writer.close()
+
+
+def run(
+    path: str,
+    urls: list,
+    directory: pathlib.Path,
+    chunk_size: int,
+    count_writes: bool = False
+) -> dict:
+    """
+    Parameters
+    ----------
+    path: str
+        one of PATHS.
+    urls: list
+        of the files, each downloaded once.
+
+    Returns
+    -------
+    dict of
+        wall_seconds, cpu_seconds: of downloading all the files,
+        writes: number of writes to the files, if count_writes.
+    """
+    import requests
+    from courses import helpers
+
+    copy = _copy_chunks if path == "chunks" else _copy_blocks
+    num_writes:int = 0
+    wall:float = 0.0
+    cpu:float = 0.0
+    with requests.Session() as session:
+        for (i, url) in enumerate(urls):
+            file_path = directory / f"{i}.mp4"
+            with session.get(url, stream=True, headers=helpers.range_headers(0)) as response:
+                response.raise_for_status()
+                start = (time.perf_counter(), time.thread_time())
+                with open(file_path, 'wb', buffering=-1 if path == "chunks" else 0) as file:
+                    counted = _counting_file(file) if count_writes else file
+                    copy(response, counted, chunk_size)
+                wall += time.perf_counter() - start[0]
+                cpu += time.thread_time() - start[1]
+                if count_writes:
+                    num_writes += counted.num_writes
+            file_path.unlink()
+    return {
+        "wall_seconds": wall,
+        "cpu_seconds": cpu,
+        **({ "writes": num_writes } if count_writes else {}),
+    }
+
+
+def main() -> None:
+    # Options, in the form of --name=value:
+    # --paths=LIST   of PATHS, separated by comma (default all)
+    # --chunk-sizes=LIST   bytes of each read, e.g. 16K,256K
+    # --files=N, --file-size=BYTES   downloaded by each run
+    # --repeat=N   runs of each combination; the fastest is kept
+    # --root=DIR   where the files are written (default a temporary directory)
+    # --out=FILE   where the JSON is written (default stdout)
+    OPTIONS:set = { "paths", "chunk-sizes", "files", "file-size", "repeat", "root", "out" }
+    cmd_opts:dict = common.parse_options(OPTIONS)
+
+    paths:list = cmd_opts.get("paths", ",".join(PATHS)).split(',')
+    if (any(p not in PATHS for p in paths)):
+        print(f"Invalid --paths. They are of {PATHS}.")
+        exit(-1)
+    try:
+        chunk_sizes:list = [
+            common.parse_size(s) for s in cmd_opts.get("chunk-sizes", "16K,64K,256K").split(',')
+        ]
+        num_files:int = int(cmd_opts.get("files", str(DEF_NUM_FILES)))
+        file_size:int = common.parse_size(cmd_opts.get("file-size", str(DEF_FILE_SIZE)))
+        repeat:int = int(cmd_opts.get("repeat", str(DEF_REPEAT)))
+    except ValueError as e:
+        print(f"Invalid option. {e}")
+        exit(-1)
+    if (min(chunk_sizes + [num_files, file_size, repeat]) < 1):
+        print("The sizes and numbers must be positive.")
+        exit(-1)
+
+    results:dict = {
+        **common.results_header(RESULTS_VERSION),
+        "files": num_files,
+        "file_size": file_size,
+        "repeat": repeat,
+        "results": [],
+    }
+
+    with fault_server.fault_server() as server, \
+        tempfile.TemporaryDirectory(prefix="mitocw_lv_dl_bench_", dir=cmd_opts.get("root")) as tmp:
+        urls:list = [server.url(f"lecture{i}", file_size) for i in range(1, num_files + 1)]
+        for chunk_size in chunk_sizes:
+            for path in paths:
+                counted:dict = run(path, urls, pathlib.Path(tmp), chunk_size, True)
+                runs:list = [
+                    run(path, urls, pathlib.Path(tmp), chunk_size) for _ in range(repeat)
+                ]
+                r:dict = min(runs, key=lambda r: r["wall_seconds"])
+                num_bytes:int = num_files * file_size
+                results["results"].append({
+                    "path": path, "chunk_size": chunk_size, **r,
+                    "writes": counted["writes"],
+                    "mib_per_second": num_bytes / 1024**2 / r["wall_seconds"],
+                    "cpu_seconds_per_gib": r["cpu_seconds"] / (num_bytes / 1024**3),
+                })
+                print(
+                    f"{path:6} chunk {chunk_size:8} {r['wall_seconds']:8.3f}s " + \
+                    f"{num_bytes / 1024**2 / r['wall_seconds']:8.2f}MiB/s " + \
+                    f"cpu {r['cpu_seconds']:7.3f}s {counted['writes']:8} writes",
+                    file=sys.stderr
+                )
+
+    common.write_results(results, cmd_opts.get("out"))
+
+
+if __name__ == "__main__":
+    main()
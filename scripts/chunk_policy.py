@@ -0,0 +1,212 @@
+"""
+chunk_policy.py decides how many bytes each read of a download asks for,
+instead of a fixed size for every file and every link.
+
+chunk_policy:
+    Shared by all the downloads of a downloader. Keeps the sizes within
+    bounds, and caps them when many transfers run at the same time
+    (so that their chunks together stay within a budget of memory)
+    or when the system is short of memory.
+
+chunk_sizer:
+    One reader's sizes: doubles its size while the throughput it measures
+    keeps improving, halves it back when a larger size has made it worse,
+    and tries to grow again after a while, as the link may have changed.
+    A reader of a small file never asks for more than the file.
+
+"""
+
+import contextlib
+import threading
+import time
+
+DEF_MIN_SIZE:int = 4*1024
+# What the 300k downloaders always read before.
+DEF_START_SIZE:int = 16*1024
+# As large as a write block of helpers.block_writer, which a read never goes past.
+DEF_MAX_SIZE:int = 256*1024
+# The chunks of all the readers at the same time take at most this much memory.
+DEF_MAX_BUFFERED:int = 64*1024*1024
+# Below this much available memory, every reader reads DEF_MIN_SIZE.
+LOW_MEMORY:int = 256*1024*1024
+# The available memory is looked at most this often.
+MEMORY_INTERVAL:float = 1.0
+
+# A reader measures its throughput over windows of at least this many seconds
+# and this many reads, and compares each window with the last.
+WINDOW_SECONDS:float = 0.5
+WINDOW_READS:int = 8
+# Changes of the throughput smaller than this are only noise.
+GAIN:float = 0.05
+# Windows a reader holds a size it has stepped back to before growing again.
+HOLD_WINDOWS:int = 20
+
+
+def available_memory() -> int|None:
+    """
+    Returns
+    -------
+    The bytes of memory available, i.e. MemAvailable of /proc/meminfo,
+    or None if the system does not tell.
+    Not the free memory (e.g. sysconf's SC_AVPHYS_PAGES),
+    as a long download soon fills the free memory with the page cache,
+    which is given back whenever it is needed.
+    """
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                # MemAvailable:    5618368 kB
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class chunk_policy:
+    """
+    Thread-safe.
+    """
+
+    def __init__(
+        self,
+        min_size: int = DEF_MIN_SIZE,
+        max_size: int = DEF_MAX_SIZE,
+        start_size: int = DEF_START_SIZE,
+        max_buffered: int = DEF_MAX_BUFFERED
+    ):
+        """
+        Parameters
+        ----------
+        min_size, max_size: int
+            bounds of the size of a read, in bytes.
+            If they are the same, every read is that size.
+        start_size: int
+            size of the first read of a reader, within the bounds.
+        max_buffered: int
+            bytes the chunks of all the readers at the same time may take.
+        """
+        if min_size < 1 or max_size < min_size:
+            raise ValueError("The sizes must be positive, and the minimum not above the maximum.")
+        if max_buffered < 1:
+            raise ValueError("The memory for the chunks must be positive.")
+        self.min_size = min_size
+        self.max_size = max_size
+        self.start_size:int = min(max(start_size, min_size), max_size)
+        self.max_buffered = max_buffered
+
+        self._lock = threading.Lock()
+        self._num_readers:int = 0
+        self._low_memory:bool = False
+        self._memory_checked:float = 0.0
+
+    def cap(self) -> int:
+        """
+        Returns
+        -------
+        The largest size a reader may ask for now.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now - self._memory_checked >= MEMORY_INTERVAL:
+                self._memory_checked = now
+                available = available_memory()
+                self._low_memory = available is not None and available < LOW_MEMORY
+            if self._low_memory:
+                return self.min_size
+            share:int = self.max_buffered // max(self._num_readers, 1)
+            return min(max(share, self.min_size), self.max_size)
+
+    @contextlib.contextmanager
+    def sizer(self, expected: int|None = None):
+        """
+        Yields
+        ------
+        A chunk_sizer for one reader, which counts as reading until the context exits.
+
+        Parameters
+        ----------
+        expected: int
+            the bytes the reader will read, if known.
+        """
+        with self._lock:
+            self._num_readers += 1
+        try:
+            yield chunk_sizer(self, expected)
+        finally:
+            with self._lock:
+                self._num_readers -= 1
+
+
+class chunk_sizer:
+    """
+    Not thread-safe: one per reader, e.g. per connection of a file downloaded in segments.
+    """
+
+    def __init__(self, policy: chunk_policy, expected: int|None = None):
+        self.policy = policy
+        self._size:int = policy.start_size
+        if expected is not None and expected > 0:
+            # Whatever the bounds, a small file is read at once.
+            self._size = min(self._size, expected)
+        self._fixed:bool = policy.min_size == policy.max_size
+
+        # The window being measured.
+        self._window_start:float|None = None
+        self._window_bytes:int = 0
+        self._window_reads:int = 0
+        # Throughput of the last window, and whether its size was larger than the one before.
+        self._last_rate:float|None = None
+        self._grown:bool = False
+        self._hold:int = 0
+
+    def size(self) -> int:
+        """
+        Returns
+        -------
+        The number of bytes to ask for in the next read.
+        """
+        return min(self._size, self.policy.cap())
+
+    def on_read(self, num_bytes: int) -> None:
+        """
+        Called after each read, with the bytes it has got.
+        The time between two reads is measured, so that what is done with
+        a chunk (e.g. writing it and waiting for a rate limiter) counts too.
+        """
+        now = time.perf_counter()
+        if self._window_start is None:
+            # The first read also waits for the response.
+            self._window_start = now
+            return
+        self._window_bytes += num_bytes
+        self._window_reads += 1
+        seconds:float = now - self._window_start
+        if self._fixed or seconds < WINDOW_SECONDS or self._window_reads < WINDOW_READS:
+            return
+        self.__adapt(self._window_bytes / seconds)
+        self._window_start = now
+        self._window_bytes = 0
+        self._window_reads = 0
+
+    def __adapt(self, rate: float) -> None:
+        last = self._last_rate
+        self._last_rate = rate
+        if self._hold > 0:
+            self._hold -= 1
+            return
+        if last is not None and self._grown and rate < last * (1 - GAIN):
+            # Larger has been worse. Back to the last size, and stay there a while.
+            self._size = max(self._size // 2, self.policy.min_size)
+            self._grown = False
+            self._hold = HOLD_WINDOWS
+            return
+        if last is None or rate > last * (1 + GAIN) or self._grown is False:
+            # Better, or not tried larger yet since the last step back.
+            grown = min(self._size * 2, self.policy.max_size)
+            self._grown = grown != self._size
+            self._size = grown
+            return
+        # As good as the last window at a smaller size: no need to grow further.
+        self._grown = False
+        self._hold = HOLD_WINDOWS
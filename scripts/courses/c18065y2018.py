@@ -1,5 +1,4 @@
 import pathlib
-import bs4
 import re
 
 from . import helpers
@@ -22,6 +21,8 @@ REC_RE_OBJ = re.compile(r"Recitation ([\d]+)")
 
 def populate_video_maps_list(static_root_path: pathlib.Path, verbose:bool = False) -> list:
 
+    import bs4
+
     if(not static_root_path.exists() or not static_root_path.is_dir()):
         raise ValueError("static_root_path does not exist or is not a directory.")
     
@@ -46,8 +47,8 @@ def populate_video_maps_list(static_root_path: pathlib.Path, verbose:bool = Fals
         videos_map = {}
 
         html_path = lec_html_file_path_list[i]
-        bs:bs4.BeautifulSoup = bs4.BeautifulSoup(open(
-            html_path, 'r'), "html.parser"
+        bs:bs4.BeautifulSoup = helpers.give_me_bs(
+            html_path, helpers.get_strainer("YOUTUBE_PAGE_STRAINER")
         )
 
         tit_url_map = helpers.grab_title_url_from_youtube_html_page(
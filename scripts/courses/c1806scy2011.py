@@ -1,5 +1,4 @@
 import pathlib
-import bs4
 import json
 
 from . import helpers
@@ -12,6 +11,8 @@ my_info = course.course_info(
 """
 def populate_video_maps_list(static_root_path: pathlib.Path, verbose:bool = False) -> list:
 
+    import bs4
+
     if(not static_root_path.exists() or not static_root_path.is_dir()):
         raise ValueError("static_root_path does not exist or is not a directory.")
     
@@ -20,7 +21,9 @@ def populate_video_maps_list(static_root_path: pathlib.Path, verbose:bool = Fals
 
     #################### Lecture Videos ############################
     lec_ind_html_path = res_dir_path / "lecture-videos" / "index.html"
-    lec_ind_bs:bs4.BeautifulSoup = helpers.give_me_bs(lec_ind_html_path)
+    lec_ind_bs:bs4.BeautifulSoup = helpers.give_me_bs(
+        lec_ind_html_path, helpers.get_strainer("RESOURCES_INDEX_STRAINER")
+    )
 
     list_lec_vids = helpers.grab_title_url_from_300k_resources_index_html(
         lec_ind_bs, "Lecture", verbose
@@ -32,7 +35,9 @@ def populate_video_maps_list(static_root_path: pathlib.Path, verbose:bool = Fals
 
     #################### Recitation Videos ############################
     rec_ind_html_path = res_dir_path / "recitation-videos" / "index.html"
-    rec_ind_bs:bs4.BeautifulSoup = helpers.give_me_bs(rec_ind_html_path)
+    rec_ind_bs:bs4.BeautifulSoup = helpers.give_me_bs(
+        rec_ind_html_path, helpers.get_strainer("RESOURCES_INDEX_STRAINER")
+    )
 
     list_rec_vids = helpers.grab_title_url_from_300k_resources_index_html(
         rec_ind_bs, "Recitation", verbose
@@ -50,6 +55,8 @@ def populate_video_maps_list(static_root_path: pathlib.Path, verbose:bool = Fals
 
 def populate_video_maps_list_youtube(static_root_path: pathlib.Path, verbose:bool = False) -> list:
 
+    import bs4
+
     if(not static_root_path.exists() or not static_root_path.is_dir()):
         raise ValueError("static_root_path does not exist or is not a directory.")
     
@@ -58,7 +65,9 @@ def populate_video_maps_list_youtube(static_root_path: pathlib.Path, verbose:boo
 
     #################### Lecture Videos ############################
     lec_ind_html_path = res_dir_path / "lecture-videos" / "index.html"
-    lec_ind_bs:bs4.BeautifulSoup = helpers.give_me_bs(lec_ind_html_path)
+    lec_ind_bs:bs4.BeautifulSoup = helpers.give_me_bs(
+        lec_ind_html_path, helpers.get_strainer("RESOURCES_INDEX_STRAINER")
+    )
 
     # Get the html pages of the lecture videos.
     list_lec_html_paths:list = helpers.grab_html_from_resources_index_html(
@@ -68,7 +77,7 @@ def populate_video_maps_list_youtube(static_root_path: pathlib.Path, verbose:boo
 
     # turn each html page into a map of title -> url
     for hp in list_lec_html_paths:
-        bs = helpers.give_me_bs(hp)
+        bs = helpers.give_me_bs(hp, helpers.get_strainer("YOUTUBE_PAGE_STRAINER"))
         tit_url_map = helpers.grab_title_url_from_youtube_html_page(
             bs, "Lecture", verbose
         )
@@ -81,7 +90,9 @@ def populate_video_maps_list_youtube(static_root_path: pathlib.Path, verbose:boo
 
     #################### Recitation Videos ############################
     rec_ind_html_path = res_dir_path / "recitation-videos" / "index.html"
-    rec_ind_bs:bs4.BeautifulSoup = helpers.give_me_bs(rec_ind_html_path)
+    rec_ind_bs:bs4.BeautifulSoup = helpers.give_me_bs(
+        rec_ind_html_path, helpers.get_strainer("RESOURCES_INDEX_STRAINER")
+    )
 
     # Get the html pages of the recitation videos.
     list_rec_html_paths:list = helpers.grab_html_from_resources_index_html(
@@ -91,7 +102,7 @@ def populate_video_maps_list_youtube(static_root_path: pathlib.Path, verbose:boo
 
     # turn each html page into a map of title -> url
     for hp in list_rec_html_paths:
-        bs = helpers.give_me_bs(hp)
+        bs = helpers.give_me_bs(hp, helpers.get_strainer("YOUTUBE_PAGE_STRAINER"))
         tit_url_map = helpers.grab_title_url_from_youtube_html_page(
             bs, "Recitation", verbose
         )
@@ -1,5 +1,4 @@
 import pathlib
-import bs4
 import json
 
 from . import course
@@ -20,12 +19,13 @@ class c6004_yt(course.course):
         # This course only has youtube videos.
         return { "yt-dlp" }
 
-    def populate_video_maps_lists(self, types: set) -> dict:
+    def populate_video_maps_lists(self, types: set, verbose) -> dict:
     
         # Only lecture videos are available in this course.
-        if types != { "Lecture" }:
-            raise TypeError(
-                "Unsupported video types." + \
+        # types may be any iterable, e.g. the list split from the command line.
+        if set(types) != { "Lecture" }:
+            raise ValueError(
+                "Unsupported video types. " + \
                 "Supported: Lecture"
             )
 
@@ -42,11 +42,11 @@ class c6004_yt(course.course):
             # each video is contained inside path/cis2vj as index.html,
             # where j is the video index
             i = i0+1
-            lecture_videos_path : pathlib.Path = static_root_path / "pages"
+            lecture_videos_path : pathlib.Path = self.res_path / "pages"
             lecture_videos_path /= ('c' + str(i) + '/' + 'c' + str(i) + "s2")
             video_dirs = [
                 dir 
-                for dir in lecture_videos_path.iterdir() 
+                for dir in helpers.list_dir(lecture_videos_path) 
                 if dir.is_dir()
             ]
             temp = []
@@ -57,6 +57,12 @@ class c6004_yt(course.course):
             video_html_file_path_list.append(temp)
 
         # 2. from each .html file find the video title and URL
+        # All the pages of all lectures are parsed at once,
+        # so that the workers are busy even if a lecture has few videos.
+        all_maps:list = helpers.parse_youtube_html_pages(
+            [p for html_paths in video_html_file_path_list for p in html_paths],
+            "Lecture", verbose
+        )
         video_maps_list:list = list()
 
         i0 = 0
@@ -66,16 +72,10 @@ class c6004_yt(course.course):
 
             videos_map = {}
 
-            html_paths:list = video_html_file_path_list[i0]
-            for html_path in html_paths:
-                bs = helper.give_me_bs(html_path)
-
-
-                videos_map.update(
-                    helpers.grab_title_url_from_youtube_html_page(
-                        bs, "Lecture", verbose
-                    )
-                )
+            num_paths:int = len(video_html_file_path_list[i0])
+            for m in all_maps[:num_paths]:
+                videos_map.update(m)
+            all_maps = all_maps[num_paths:]
 
             video_maps_list.append((i, videos_map))
 
@@ -1,5 +1,4 @@
 import pathlib
-import bs4
 import json
 
 from . import helpers
@@ -38,6 +37,8 @@ my_info = course.course_info([course.three_100k_course, c6034_gallery])
 """
 def populate_video_maps_list(static_root_path: pathlib.Path, verbose:bool = False) -> dict:
 
+    import bs4
+
     if(not static_root_path.exists() or not static_root_path.is_dir()):
         raise ValueError("static_root_path does not exist or is not a directory.")
     
@@ -46,7 +47,9 @@ def populate_video_maps_list(static_root_path: pathlib.Path, verbose:bool = Fals
 
     #################### Lecture Videos ############################
     lec_ind_html_path = res_dir_path / "lecture-videos" / "index.html"
-    lec_ind_bs:bs4.BeautifulSoup = helpers.give_me_bs(lec_ind_html_path)
+    lec_ind_bs:bs4.BeautifulSoup = helpers.give_me_bs(
+        lec_ind_html_path, helpers.get_strainer("GALLERIES_INDEX_STRAINER")
+    )
 
     # Get the html pages of the lecture videos.
     list_lec_html_paths:list = helpers.grab_html_from_galleries_index_html(
@@ -56,7 +59,7 @@ def populate_video_maps_list(static_root_path: pathlib.Path, verbose:bool = Fals
 
     # turn each html page into a map of title -> url
     for hp in list_lec_html_paths:
-        bs = helpers.give_me_bs(hp)
+        bs = helpers.give_me_bs(hp, helpers.get_strainer("YOUTUBE_PAGE_STRAINER"))
         tit_url_map = helpers.grab_title_url_from_youtube_html_page(
             bs, "Lecture", verbose
         )
@@ -69,7 +72,9 @@ def populate_video_maps_list(static_root_path: pathlib.Path, verbose:bool = Fals
 
     #################### Recitation Videos ############################
     rec_ind_html_path = res_dir_path / "mega-recitation-videos" / "index.html"
-    rec_ind_bs:bs4.BeautifulSoup = helpers.give_me_bs(rec_ind_html_path)
+    rec_ind_bs:bs4.BeautifulSoup = helpers.give_me_bs(
+        rec_ind_html_path, helpers.get_strainer("GALLERIES_INDEX_STRAINER")
+    )
 
     # Get the html pages of the recitation videos.
     list_rec_html_paths:list = helpers.grab_html_from_galleries_index_html(
@@ -79,7 +84,7 @@ def populate_video_maps_list(static_root_path: pathlib.Path, verbose:bool = Fals
 
     # turn each html page into a map of title -> url
     for hp in list_rec_html_paths:
-        bs = helpers.give_me_bs(hp)
+        bs = helpers.give_me_bs(hp, helpers.get_strainer("YOUTUBE_PAGE_STRAINER"))
         tit_url_map = helpers.grab_title_url_from_youtube_html_page(
             bs, "Mega-Recitation", verbose
         )
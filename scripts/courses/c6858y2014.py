@@ -1,5 +1,4 @@
 import pathlib
-import bs4
 import re
 
 from . import helpers
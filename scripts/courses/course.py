@@ -4,6 +4,9 @@ course.py provides the base classes of all courses.
 course:
     Representing a way to retrieve video information.
     Base class of all.
+    The information is either a dict of video maps (populate_video_maps_lists),
+    or a stream of videos (iter_videos), which yields each video
+    as soon as it is found.
 
 three_100k_course:
     Representing the way that retrieves information
@@ -56,6 +59,35 @@ class course:
         """
         raise NotImplementedError("abstract static method.")
 
+    def videos_of(video_maps: dict):
+        """
+        Turns the dict returned by a populate_video_maps_lists
+        into the stream of videos iter_videos would yield.
+        """
+        for video_type in video_maps:
+            for (vid_num, url_map) in video_maps[video_type]:
+                for (title, url) in url_map.items():
+                    yield (video_type, vid_num, title, url)
+
+    def video_maps_of(videos, types = ()) -> dict:
+        """
+        Turns a stream of videos yielded by iter_videos
+        into the dict populate_video_maps_lists would return.
+        The videos of the same type and number must be yielded one after another.
+
+        Parameters
+        ----------
+        types:
+            the video types that are in the dict, even if they have no video.
+        """
+        ret:dict = { t : [] for t in types }
+        for (video_type, vid_num, title, url) in videos:
+            ls:list = ret.setdefault(video_type, [])
+            if len(ls) == 0 or ls[-1][0] != vid_num:
+                ls.append((vid_num, dict()))
+            ls[-1][1][title] = url
+        return ret
+
     ####################### Instance Methods ########################
 
     def __init__(self, res_path: Path, downloader_type: str):
@@ -112,6 +144,24 @@ class course:
         """
         raise NotImplementedError("abstract method")
 
+    def iter_videos(self, types: set, verbose):
+        """
+        Yields (vtype, video_num, title, url) for every video
+        in populate_video_maps_lists(types, verbose), in the same order.
+
+        This one only yields after everything is populated.
+        A subclass that finds the videos one by one should override it
+        to yield each as soon as it is found,
+        so that the downloads can start while the rest is still being parsed.
+
+        Raises
+        ------
+        ValueError
+            if an element in types is not supported by this course,
+            before anything is yielded.
+        """
+        yield from course.videos_of(self.populate_video_maps_lists(types, verbose))
+
 
 # Can't start with a number, hence this awkward name.
 class three_100k_course(course):
@@ -207,35 +257,38 @@ class three_100k_course(course):
         ValueError
             if an element in types is not supported by this course.
         """
+        return course.video_maps_of(self.iter_videos(types, verbose), types)
+
+    def iter_videos(self, types: set, verbose):
+        """
+        Yields (vtype, video_num, title, url) for every video,
+        as populate_video_maps_lists, type by type.
+        """
 
         res_res_path = self.res_path / "resources"
         # this course has video resources for me to use this base class!
         assert res_res_path.exists() and res_res_path.is_dir()
 
-        ret: dict = {}
-
         for t in types:
-            
             if t not in self.__resources:
                 raise ValueError(
                     "The video type is not supported by this course" + \
                     f"Supported ones: {self.__resources.keys()}"
                 )
 
+        for t in types:
             ind_html_path = res_res_path / self.__resources[t] / "index.html"
-            ind_bs:bs4.BeautifulSoup = helpers.give_me_bs(ind_html_path)
+            ind_bs:bs4.BeautifulSoup = helpers.give_me_bs(
+                ind_html_path, helpers.get_strainer("RESOURCES_INDEX_STRAINER")
+            )
 
             list_vids = helpers.grab_title_url_from_300k_resources_index_html(
                 ind_bs, t, verbose
             )
-            # Add lecture numbers to the list
-            list_vids = [
-                (i+1, list_vids[i]) for i in range(len(list_vids))
-            ]
-
-            ret[t] = list_vids
-
-        return ret
+            # Add lecture numbers, starting from 1.
+            for i in range(len(list_vids)):
+                for (title, url) in list_vids[i].items():
+                    yield (t, i+1, title, url)
 
 
 class video_gallery_course(course):
@@ -341,63 +394,66 @@ class video_gallery_course(course):
         ValueError
             if an element in types is not supported by this course.
         """
+        return course.video_maps_of(self.iter_videos(types, verbose), types)
+
+    def iter_videos(self, types: set, verbose):
+        """
+        Yields (vtype, video_num, title, url) for every video,
+        as populate_video_maps_lists,
+        each as soon as the html page of the video is parsed.
+        """
 
         galleries_path = self.res_path / "video_galleries"
         # this course has video galleries for me to use this base class!
         assert galleries_path.exists() and galleries_path.is_dir()
 
-        ret: dict = {}
-
         for t in types:
-            
             if t not in self.__galleries:
                 raise ValueError(
                     "The video type is not supported by this course" + \
                     f"Supported ones: {self.__galleries.keys()}"
                 )
 
+        for t in types:
             ind_html_path = galleries_path / self.__galleries[t] / "index.html"
-            ind_bs:bs4.BeautifulSoup = helpers.give_me_bs(ind_html_path)
+            ind_bs:bs4.BeautifulSoup = helpers.give_me_bs(
+                ind_html_path, helpers.get_strainer("GALLERIES_INDEX_STRAINER")
+            )
 
             # Get the html pages of the videos.
             list_html_paths:list = helpers.grab_html_from_galleries_index_html(
                 ind_bs, ind_html_path.parent, verbose
             )
-            list_vids:list = []
 
-            # turn each html page into a map of title -> url
-            for hp in list_html_paths:
-                bs = helpers.give_me_bs(hp)
-                tit_url_map = helpers.grab_title_url_from_youtube_html_page(
-                    bs, t, verbose
-                )
-                list_vids.append(tit_url_map)
-
-            # Add numbers to the list, starting from 1.
+            # turn each html page into a map of title -> url,
+            # and add numbers, starting from 1.
             # Limitation: In practice, videos of some number may be missing.
             # For example, we may have Lecture 1,2,3,5,6,...
             # Possible solution: auto detection from title, or manually provide
             # the numbers.
-            list_vids = [
-                (i+1, list_vids[i]) for i in range(len(list_vids))
-            ]
-
-            ret[t] = list_vids
-
-        return ret
+            maps = helpers.iter_youtube_html_pages(list_html_paths, t, verbose)
+            for (i, tit_url_map) in enumerate(maps):
+                for (title, url) in tit_url_map.items():
+                    yield (t, i+1, title, url)
 
 
 class course_info:
 
-    def __init__(self, ls_ways: list):
+    def __init__(self, ls_ways: list, formats: dict = {}):
         """
         Parameters:
         ls_ways: list
             list of possible ways (subclass of course) to retrieve information
             for this course.
+        formats: dict
+            the format policy of the course's yt-dlp videos,
+            as the keyword arguments of a format_policy.format_policy,
+            e.g. { "max_height" : 480 } for a course that only has slides.
+            Options on the command line override it.
         """
         self.ls_ways = ls_ways
         assert len(ls_ways) > 0
+        self.formats = formats
 
         self.downloaders:set = set()
         self.map_dld_ways:dict = dict()
@@ -1,12 +1,246 @@
-import bs4
+# The annotations name modules that are not imported yet.
+from __future__ import annotations
+
+import contextlib
 import json
+import os
 import pathlib
-import requests
+import queue
+import threading
+import time
 
-def give_me_bs(path_to_html)-> bs4.BeautifulSoup:
-    return bs4.BeautifulSoup(open(
-        path_to_html, 'r'), "html.parser"
-    )
+# asyncio, concurrent.futures, bs4 and requests are imported
+# where they are first used, so that a run which needs none of them
+# (e.g. all from the parse cache) does not pay for importing them.
+
+# The reads_record of the recording_reads() going on in this thread, if any.
+_reads = threading.local()
+
+
+class reads_record:
+    """
+    What was read to make something, e.g. the video maps of a course:
+
+    paths: set
+        of the paths of the html files read.
+    listings: dict
+        of the path of each directory listed to its sorted names,
+        as which pages there are may depend on them.
+    """
+
+    def __init__(self):
+        self.paths:set = set()
+        self.listings:dict = dict()
+
+    def update(self, other: reads_record) -> None:
+        self.paths.update(other.paths)
+        self.listings.update(other.listings)
+
+
+@contextlib.contextmanager
+def recording_reads(record: reads_record|None = None):
+    """
+    Records the html files read and the directories listed in this thread
+    until the context exits, e.g. by a populate_video_maps_lists.
+    A recording inside another one also records to the outer one.
+
+    To record what a generator reads, record around each next() of it
+    with the same record, and not across its yields,
+    as the code run between them (e.g. another course's generator) reads too.
+
+    Parameters
+    ----------
+    record: reads_record
+        to add the reads to. A new one if None.
+
+    Yields
+    ------
+    record, which is complete when the context exits.
+    """
+    if record is None:
+        record = reads_record()
+    outer:reads_record|None = getattr(_reads, "record", None)
+    _reads.record = record
+    try:
+        yield record
+    finally:
+        _reads.record = outer
+        if outer is not None:
+            outer.update(record)
+
+
+def record_read(path_to_html) -> None:
+    """
+    Tells the recording_reads() going on in this thread
+    that path_to_html has been read.
+    For the files read elsewhere (e.g. in another process) on behalf of this thread.
+    """
+    record:reads_record|None = getattr(_reads, "record", None)
+    if record is not None:
+        record.paths.add(pathlib.Path(path_to_html))
+
+
+def list_dir(path: pathlib.Path) -> list:
+    """
+    Same as list(path.iterdir()),
+    and tells the recording_reads() going on in this thread
+    which names path has, so that a course which finds its pages
+    by listing directories is parsed again when one is added or removed.
+    """
+    entries:list = list(path.iterdir())
+    record:reads_record|None = getattr(_reads, "record", None)
+    if record is not None:
+        record.listings[pathlib.Path(path).absolute().as_posix()] = \
+            sorted(e.name for e in entries)
+    return entries
+
+
+# The parsers of bs4 that give_me_bs can use, fastest first.
+# lxml is optional; html.parser always works.
+PARSERS:tuple = ("lxml", "html.parser")
+
+# What give_me_bs does. See use_parser.
+_parser:str|None = None
+_strain:bool = True
+# Number of processes that parse pages at the same time. See use_parse_workers.
+_num_parse_workers:int|None = None
+
+
+def available_parsers() -> list:
+    """
+    Returns
+    -------
+    The names in PARSERS that are installed, fastest first.
+    """
+    import bs4
+    return [p for p in PARSERS if bs4.builder.builder_registry.lookup(p) is not None]
+
+
+def use_parser(parser: str|None = None, strain: bool = True) -> None:
+    """
+    Chooses how give_me_bs parses from now on.
+
+    Parameters
+    ----------
+    parser: str
+        one of PARSERS, or None for the fastest installed.
+    strain: bool
+        if False, the strainers given to give_me_bs are ignored,
+        and every page is parsed whole, like it used to be.
+
+    Raises
+    ------
+    ValueError
+        if parser is unknown or not installed.
+    """
+    global _parser, _strain
+    if parser is not None and parser not in available_parsers():
+        raise ValueError(
+            f"The parser {parser} is not available. " + \
+            f"Available: {available_parsers()}"
+        )
+    _parser = parser
+    _strain = strain
+
+
+def use_parse_workers(num_workers: int|None = None) -> None:
+    """
+    Parameters
+    ----------
+    num_workers: int
+        number of processes parse_youtube_html_pages uses.
+        None for one per core, 1 to parse in this process.
+    """
+    global _num_parse_workers
+    if num_workers is not None and num_workers < 1:
+        raise ValueError("The number of parse workers must be positive.")
+    _num_parse_workers = num_workers
+
+
+def current_parser() -> str:
+    if _parser is not None:
+        return _parser
+    return available_parsers()[0]
+
+
+# The strainers get_strainer has made, by name.
+_strainers:dict = dict()
+
+
+def _has_any_class(*names: str):
+    """
+    Returns
+    -------
+    A function telling if the value of a class attribute has any of names,
+    for a SoupStrainer. While parsing, it is given the whole value,
+    e.g. "video-js vjs-default-skin", which class_="video-js" would not match.
+    """
+    def has_any(value) -> bool:
+        if value is None:
+            return False
+        classes = value if isinstance(value, list) else value.split()
+        return any(c in names for c in classes)
+    return has_any
+
+
+def get_strainer(name: str) -> bs4.SoupStrainer:
+    """
+    Parameters
+    ----------
+    name: str
+        of the grab_* function below the strainer is for:
+        "RESOURCES_INDEX_STRAINER", "GALLERIES_INDEX_STRAINER"
+        or "YOUTUBE_PAGE_STRAINER".
+
+    Returns
+    -------
+    A SoupStrainer of only the parts of a page that the function looks at.
+    A tag kept is kept with everything inside it,
+    so the function gives the same result on the strained page as on the whole.
+    Made on first use, so that bs4 is only imported then.
+
+    Raises
+    ------
+    KeyError
+        if name is none of the above.
+    """
+    if name not in _strainers:
+        import bs4
+        if name == "RESOURCES_INDEX_STRAINER":
+            strainer = bs4.SoupStrainer("div", class_=_has_any_class("d-inline-flex"))
+        elif name == "GALLERIES_INDEX_STRAINER":
+            strainer = bs4.SoupStrainer("a", class_=_has_any_class("video-link"))
+        elif name == "YOUTUBE_PAGE_STRAINER":
+            # The title container or the video, which is a video.js player.
+            # A tag is kept if it has any of the classes,
+            # so this also keeps the other such divs and videos, which is harmless.
+            strainer = bs4.SoupStrainer(
+                ["div", "video"],
+                class_=_has_any_class("course-section-title-container", "video-js")
+            )
+        else:
+            raise KeyError(name)
+        _strainers[name] = strainer
+    return _strainers[name]
+
+
+def give_me_bs(path_to_html, strainer: bs4.SoupStrainer|None = None)-> bs4.BeautifulSoup:
+    """
+    Parameters
+    ----------
+    path_to_html:
+        path to the html file.
+    strainer: SoupStrainer
+        if given, only the tags it matches (and their content) are built,
+        which is much faster on big pages.
+        One of get_strainer, for the grab_* function to be called.
+    """
+    import bs4
+    record_read(path_to_html)
+    if not _strain:
+        strainer = None
+    with open(path_to_html, 'r') as f:
+        return bs4.BeautifulSoup(f, current_parser(), parse_only=strainer)
 
 def grab_title_url_from_300k_resources_index_html(
         res_bs:bs4.BeautifulSoup,
@@ -169,17 +403,574 @@ def grab_title_url_from_youtube_html_page(
     return {video_title: youtube_URL}
 
 
+# Below this many pages, starting the processes costs more than it saves.
+MIN_PAGES_PER_PARSE_WORKER:int = 8
+# A worker parses at most this many pages at once.
+MAX_PAGES_PER_CHUNK:int = 16
+
+
+def _parse_youtube_html_page(args: tuple) -> dict:
+    """
+    Runs in a worker process of parse_youtube_html_pages,
+    which may not have inherited the choices of use_parser.
+    """
+    (path, video_type, verbose, parser, strain) = args
+    use_parser(parser, strain)
+    return grab_title_url_from_youtube_html_page(
+        give_me_bs(path, get_strainer("YOUTUBE_PAGE_STRAINER")), video_type, verbose
+    )
+
+
+def iter_youtube_html_pages(
+        html_paths:list,
+        video_type:str,
+        verbose:bool
+):
+    """
+    give_me_bs and grab_title_url_from_youtube_html_page on each of html_paths,
+    over a pool of processes, as parsing is CPU-bound.
+
+        Parameters:
+            html_paths: paths to the html pages of SINGLE youtube videos.
+            video_type: Describes the videos. (e.g. Lecture, Recitation)
+            verbose: verbose.
+
+        Yields:
+            A map of title -> url for each page, in the order of html_paths,
+            as soon as it is parsed.
+
+        Raises:
+            ValueError if a page can not be parsed,
+            naming the page, from the original error.
+    """
+    html_paths = list(html_paths)
+    # The workers read them, but they are read on behalf of this thread.
+    for hp in html_paths:
+        record_read(hp)
+
+    num_workers = _num_parse_workers
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    num_workers = min(num_workers, len(html_paths) // MIN_PAGES_PER_PARSE_WORKER)
+
+    args = [(hp, video_type, verbose, _parser, _strain) for hp in html_paths]
+    if num_workers <= 1:
+        for a in args:
+            try:
+                m = _parse_youtube_html_page(a)
+            except Exception as e:
+                raise ValueError(f"Failed to parse {a[0]}: {e!r}") from e
+            yield m
+        return
+
+    import concurrent.futures
+    with concurrent.futures.ProcessPoolExecutor(num_workers) as executor:
+        # Big chunks, since each page takes little time,
+        # but not so big that the first pages take long to come.
+        chunksize = min(max(len(args) // (num_workers * 4), 1), MAX_PAGES_PER_CHUNK)
+        results = executor.map(_parse_youtube_html_page, args, chunksize=chunksize)
+        try:
+            for hp in html_paths:
+                try:
+                    m = next(results)
+                except Exception as e:
+                    raise ValueError(f"Failed to parse {hp}: {e!r}") from e
+                yield m
+        finally:
+            # Not worth parsing the rest after an error,
+            # or if the caller has stopped.
+            executor.shutdown(cancel_futures=True)
+
+
+def parse_youtube_html_pages(
+        html_paths:list,
+        video_type:str,
+        verbose:bool
+)-> list:
+    """
+    Same as iter_youtube_html_pages, but returns the list of all the maps.
+    """
+    return list(iter_youtube_html_pages(html_paths, video_type, verbose))
+
+
+# Seconds to wait for a connection, and for each read of a response,
+# before the request fails and is retried. A server that stalls would
+# otherwise hold its download forever. There is no total timeout,
+# as a 200MB file may take long on a slow link.
+CONNECT_TIMEOUT:float = 30
+READ_TIMEOUT:float = 60
+TIMEOUT:tuple = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+# A file is downloaded into file_path + PART_SUFFIX first,
+# and is renamed to file_path only when it is complete.
+PART_SUFFIX:str = ".part"
+# A file downloaded in segments is not written from the start to the end,
+# so it can not be resumed like a .part.
+# Hence it has its own suffix, which still ends with PART_SUFFIX.
+SEGMENTED_PART_SUFFIX:str = ".seg" + PART_SUFFIX
+# Next to it, the ranges of it already written, so that it can be resumed.
+SEGMENTS_SUFFIX:str = ".seg.json" + PART_SUFFIX
+
+
+def part_path_of(file_path: pathlib.Path) -> pathlib.Path:
+    """
+    Returns
+    -------
+    The path of the partial file that file_path is downloaded into.
+    """
+    return file_path.with_name(file_path.name + PART_SUFFIX)
+
+
+def range_headers(part_size: int) -> dict:
+    """
+    Returns
+    -------
+    The request headers to resume a partial file of part_size bytes.
+    The content is not to be encoded,
+    so that Content-Length counts the bytes written to the file.
+    """
+    headers:dict = { "Accept-Encoding": "identity" }
+    if part_size > 0:
+        headers["Range"] = f"bytes={part_size}-"
+    return headers
+
+
+def expected_size(status: int, headers, part_size: int) -> int|None:
+    """
+    Given the response to a request made with range_headers(part_size),
+
+    Returns
+    -------
+    The size the complete file will have,
+    or None if the server does not tell.
+    If the response is a 200, then the server has ignored the Range,
+    and the file is fetched from the start.
+    """
+    # Content-Range: bytes <first>-<last>/<total>
+    # or, for a 416, bytes */<total>
+    content_range:str = headers.get("Content-Range")
+    if status in (206, 416) and content_range is not None:
+        total = content_range.rsplit('/', 1)[-1]
+        if total.isdecimal():
+            return int(total)
+    if status == 416:
+        return None
+
+    content_length:str = headers.get("Content-Length")
+    if content_length is None or not content_length.isdecimal():
+        return None
+    if status == 206:
+        return part_size + int(content_length)
+    return int(content_length)
+
+
+def finish_part(
+    part_path: pathlib.Path, file_path: pathlib.Path, expected: int|None
+) -> None:
+    """
+    Renames the complete part_path to file_path atomically.
+
+    Raises
+    ------
+    IOError
+        if the size of part_path is not expected.
+        The part is kept, so that the next try resumes it.
+    """
+    size:int = part_path.stat().st_size
+    if expected is not None and size != expected:
+        raise IOError(
+            f"{part_path} is truncated: {size} of {expected} bytes."
+        )
+    os.replace(part_path, file_path)
+
+
+def finish_unsatisfiable_part(
+    part_path: pathlib.Path, file_path: pathlib.Path, expected: int|None
+) -> None:
+    """
+    Handles a 416 to a Range request, which means that part_path
+    is already complete, or that it is bigger than the file on the server.
+    Renames part_path to file_path in the former case.
+
+    Raises
+    ------
+    IOError
+        in the latter case, or if the server does not tell the size.
+        The part is deleted, so that the next try starts over.
+    """
+    if expected is None or part_path.stat().st_size != expected:
+        part_path.unlink()
+        raise IOError(
+            f"{part_path} does not match the file on the server. Starting over."
+        )
+    os.replace(part_path, file_path)
+
+
+def retry_delay(
+    policy, url: str, error: Exception, num_failures: int, num_retries: int
+) -> float|None:
+    """
+    Returns
+    -------
+    The number of seconds to wait before trying url again,
+    or None if it should not be tried again,
+    as decided by policy (a retry_policy.retry_policy).
+    Without a policy, it is tried again at once,
+    num_retries times in total.
+    """
+    if policy is None:
+        return 0.0 if num_failures < num_retries else None
+    return policy.on_failure(url, error, num_failures)
+
+
+def record_validators(info: dict|None, headers) -> None:
+    """
+    Puts the ETag and Last-Modified of a response into info, if given,
+    so that the caller can tell later whether the file has changed.
+    """
+    if info is None:
+        return
+    info["etag"] = headers.get("ETag")
+    info["last_modified"] = headers.get("Last-Modified")
+
+
+def read_segments(path: pathlib.Path, size: int, validators: dict) -> list:
+    """
+    Returns
+    -------
+    The ranges [first byte, last byte] written so far, as recorded at path
+    by write_segments, sorted and not overlapping.
+    Empty if there is no record, or if it is of another version of the file,
+    i.e. of another size or with other validators (see record_validators).
+    """
+    try:
+        record:dict = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return []
+    if record.get("size") != size or record.get("validators") != validators:
+        return []
+    return [list(r) for r in record.get("done", [])]
+
+
+def write_segments(path: pathlib.Path, size: int, validators: dict, done: list) -> None:
+    """
+    Records the ranges done at path atomically,
+    so that a crash leaves either the old record or the new one.
+    """
+    tmp_path:pathlib.Path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps({ "size": size, "validators": validators, "done": done }))
+    os.replace(tmp_path, path)
+
+
+def add_range(done: list, first: int, last: int) -> None:
+    """
+    Adds [first, last] to the sorted ranges done, merging it with those it touches.
+    """
+    merged:list = []
+    for r in done:
+        if r[1] + 1 < first or last + 1 < r[0]:
+            merged.append(r)
+        else:
+            first = min(first, r[0])
+            last = max(last, r[1])
+    merged.append([first, last])
+    merged.sort()
+    done[:] = merged
+
+
+def missing_ranges(done: list, size: int, segment_size: int) -> list:
+    """
+    Returns
+    -------
+    The (first byte, last byte) of the segments, of segment_size at most,
+    that cover what the sorted ranges done do not of a file of size bytes.
+    """
+    missing:list = []
+    pos:int = 0
+    for (first, last) in done + [[size, size]]:
+        for start in range(pos, min(first, size), segment_size):
+            missing.append((start, min(start + segment_size, first) - 1))
+        pos = max(pos, last + 1)
+    return missing
+
+
+def transfer_of(limiter):
+    """
+    Returns
+    -------
+    limiter.transfer(), or a context that does nothing if there is no limiter.
+    """
+    if limiter is None:
+        return contextlib.nullcontext()
+    return limiter.transfer()
+
+
+def reservation_of(limiter):
+    """
+    Returns
+    -------
+    limiter.reserve(), or a context yielding None if there is no limiter.
+    """
+    if limiter is None:
+        return contextlib.nullcontext()
+    return limiter.reserve()
+
+
+def sizer_of(chunks, expected: int|None = None):
+    """
+    Returns
+    -------
+    chunks.sizer(expected), or a context yielding None if there is no chunk_policy.
+    """
+    if chunks is None:
+        return contextlib.nullcontext()
+    return chunks.sizer(expected)
+
+
+def print_retry(
+    url: str, error: Exception, num_failures: int, delay: float|None
+) -> None:
+    print(f"An error occurred while downloading from {url}:")
+    print(error)
+    if delay is None:
+        print("Giving up.")
+    else:
+        print(f"Retry number {num_failures} in {delay:.1f}s.")
+
+
+# Size of the blocks the downloads write to their files, and of the buffers
+# the network is read into. A multiple of the pages and of the blocks of
+# most filesystems, so that the writes stay aligned.
+WRITE_BLOCK_SIZE:int = 256*1024
+# Buffers kept for the next transfers, at most.
+# More are made when more transfers run at the same time.
+MAX_FREE_BUFFERS:int = 64
+
+# Buffers of WRITE_BLOCK_SIZE no transfer is using.
+_free_buffers:list = []
+_free_buffers_lock = threading.Lock()
+
+
+class block_writer:
+    """
+    Gathers what is read from the network in one reusable buffer,
+    and writes it to a file in blocks, instead of once per chunk read.
+    The blocks end at the offsets of the file that are multiples of
+    WRITE_BLOCK_SIZE, so every write but the first and the last is aligned.
+
+    Not thread-safe: one per transfer.
+    """
+
+    def __init__(self, file, offset: int):
+        """
+        Parameters
+        ----------
+        file:
+            opened for writing at offset, preferably unbuffered (buffering=0),
+            as the blocks are written whole anyway.
+        offset: int
+            where the next byte goes in the file.
+        """
+        with _free_buffers_lock:
+            buffer = _free_buffers.pop() if len(_free_buffers) != 0 else None
+        self._buffer:bytearray = buffer if buffer is not None else bytearray(WRITE_BLOCK_SIZE)
+        self._view = memoryview(self._buffer)
+        self.file = file
+        # The offset in the file of the first byte of the buffer,
+        # the number of bytes in the buffer,
+        # and the number it can take before it must be written.
+        self._start:int = offset
+        self._num_pending:int = 0
+        self._limit:int = WRITE_BLOCK_SIZE - offset % WRITE_BLOCK_SIZE
+
+    def position(self) -> int:
+        """
+        Returns
+        -------
+        The offset in the file after all the bytes given, written or not.
+        """
+        return self._start + self._num_pending
+
+    def free(self) -> memoryview:
+        """
+        Returns
+        -------
+        The free part of the buffer, to be read into, then given to commit().
+        Never empty, unless full().
+        """
+        return self._view[self._num_pending:self._limit]
+
+    def commit(self, num_bytes: int) -> None:
+        self._num_pending += num_bytes
+
+    def put(self, data) -> int:
+        """
+        Copies as much of data as fits before the end of the block.
+
+        Returns
+        -------
+        The number of bytes copied.
+        """
+        free = self.free()
+        n:int = min(len(free), len(data))
+        free[:n] = data[:n]
+        self._num_pending += n
+        return n
+
+    def full(self) -> bool:
+        return self._num_pending == self._limit
+
+    def flush(self) -> float:
+        """
+        Writes the bytes in the buffer.
+
+        Returns
+        -------
+        The seconds it has taken.
+        """
+        if self._num_pending == 0:
+            return 0.0
+        start = time.perf_counter()
+        pending = self._view[:self._num_pending]
+        while len(pending) != 0:
+            # An unbuffered file may write less than it is given.
+            pending = pending[self.file.write(pending):]
+        self._start += self._num_pending
+        self._num_pending = 0
+        self._limit = WRITE_BLOCK_SIZE
+        return time.perf_counter() - start
+
+    def close(self) -> None:
+        """
+        Writes the rest, even after an error, so that what has been read is kept,
+        and gives the buffer to the next transfer.
+        """
+        try:
+            self.flush()
+        finally:
+            with _free_buffers_lock:
+                if len(_free_buffers) < MAX_FREE_BUFFERS:
+                    _free_buffers.append(self._buffer)
+
+
+def preallocate(file, size: int) -> None:
+    """
+    Makes file size bytes long, with its blocks reserved at once where the system
+    can (posix_fallocate), so that a full disk fails before anything is downloaded
+    and the file is not fragmented by the other downloads.
+    Otherwise the file is only extended, sparse.
+    """
+    file.truncate(size)
+    if hasattr(os, "posix_fallocate") and size > 0:
+        import errno
+        try:
+            os.posix_fallocate(file.fileno(), 0, size)
+        except OSError as e:
+            # Some filesystems can not, e.g. older NFS.
+            if e.errno not in (errno.EOPNOTSUPP, errno.EINVAL):
+                raise
+
+
+def copy_body(
+    response,
+    writer: block_writer,
+    chunk_size: int,
+    num_bytes: int|None = None,
+    transfer = None,
+    limiter = None,
+    sizer = None
+) -> None:
+    """
+    Copies the body of response (of requests, with stream=True) into writer,
+    or only its first num_bytes, chunk_size bytes per read,
+    or as many as sizer (a chunk_policy.chunk_sizer) tells if given.
+    Unless the body is encoded, the connection is read straight into
+    the buffer of writer, instead of into a new bytes for each chunk.
+    The full blocks are written as they come; the rest is left in writer.
+
+    Parameters
+    ----------
+    transfer, limiter
+        told each chunk, as in download_file_over_http.
+    """
+    # The http.client response under urllib3's, whose readinto reads
+    # from the socket (through its buffer, and TLS) into any buffer.
+    raw = getattr(response.raw, "_fp", None)
+    encoding:str = response.headers.get("Content-Encoding", "identity").lower()
+    direct:bool = raw is not None and hasattr(raw, "readinto") and encoding == "identity"
+    chunks = None
+    left:int|None = num_bytes
+
+    last = time.perf_counter()
+    while left is None or left > 0:
+        write_seconds:float = 0.0
+        size:int = sizer.size() if sizer is not None else chunk_size
+        if direct:
+            free = writer.free()
+            n:int = raw.readinto(free[:size if left is None else min(size, left)])
+            if n == 0:
+                break
+            writer.commit(n)
+            read = time.perf_counter()
+            if writer.full():
+                write_seconds += writer.flush()
+        else:
+            if chunks is None:
+                # An encoded body (which is rare, as range_headers asks for none)
+                # keeps the size of its first read, as iter_content fixes it.
+                chunks = response.iter_content(chunk_size=size)
+                chunks_size:int = size
+            size = chunks_size
+            chunk = next(chunks, None)
+            if chunk is None:
+                break
+            read = time.perf_counter()
+            # Never more than asked.
+            view = memoryview(chunk)[:left]
+            n:int = len(view)
+            while len(view) != 0:
+                view = view[writer.put(view):]
+                if writer.full():
+                    write_seconds += writer.flush()
+        if left is not None:
+            left -= n
+        if transfer is not None:
+            transfer.on_chunk(n, read - last, write_seconds, size)
+        if limiter is not None:
+            limiter.wait(n)
+        if sizer is not None:
+            sizer.on_read(n)
+        last = time.perf_counter()
+
+    if direct and raw.isclosed():
+        # The whole body has been read, which urllib3 has not seen.
+        # Its connection can be used again.
+        response.raw.release_conn()
+
+
 def download_file_over_http(
     url: str,
     file_path: pathlib.Path,
     chunk_size: int = 16*1024,
     num_retries: int = 8,
-    verbose: bool = False
+    verbose: bool = False,
+    session = None,
+    policy = None,
+    limiter = None,
+    info: dict|None = None,
+    transfer = None,
+    chunks = None
 ) -> bool:
     """
     Downloads a file over HTTP from url,
     to the file pointed to by file_path.
 
+    The file is written to a partial file first (see part_path_of),
+    which a retry, or a later run, resumes with a Range request.
+    It is renamed to file_path only when it has
+    as many bytes as the server says,
+    so that a truncated file is never taken as downloaded.
+
     Parameters
     ----------
     url : str
@@ -192,36 +983,407 @@ def download_file_over_http(
         size of the chunk that is transfered at once
         over the network.
     num_retries : int, optional
-        number of retries before a final failure.
+        number of retries before a final failure,
+        if there is no policy.
     verbose : bool, optional
         Will print the retries iff True.
+    session : requests.Session, optional
+        the session whose connections are used, e.g. http_pool.session.
+        By default, a new connection is opened for each request.
+    policy : retry_policy.retry_policy, optional
+        decides when to retry, and how many times.
+        By default, retries at once.
+    limiter : rate_limiter.rate_limiter, optional
+        the bandwidth shared with the other transfers.
+        By default, unlimited.
+    info : dict, optional
+        if given, filled with the "etag" and "last_modified"
+        the server has told, see record_validators.
+    transfer : metrics.transfer_metrics, optional
+        if given, told the size of the file, every chunk and every failure.
+    chunks : chunk_policy.chunk_policy, optional
+        if given, sizes the reads instead of chunk_size,
+        which is then only the size of an encoded body's.
 
     Returns
     -------
     bool
         True iff the downloading was successful.
     """
-    for i in range(num_retries):
+    if session is None:
+        import requests
+        session = requests
+    part_path:pathlib.Path = part_path_of(file_path)
+    num_failures:int = 0
+
+    while True:
+        if policy is not None:
+            time.sleep(policy.wait_time(url))
         try:
-            response = requests.get(url, stream=True)
-            response.raise_for_status()  # Check for HTTP errors
-
-            with open(file_path, 'wb') as file:
-                for chunk in response.iter_content(
-                    chunk_size=chunk_size
-                ):
-                    file.write(chunk)
-            
+            part_size:int = part_path.stat().st_size if part_path.exists() else 0
+            # Closing the response returns its connection to the pool,
+            # even if the transfer is cut.
+            with transfer_of(limiter), session.get(
+                url, stream=True, headers=range_headers(part_size), timeout=TIMEOUT
+            ) as response:
+
+                if response.status_code == 416:
+                    finish_unsatisfiable_part(part_path, file_path, expected_size(
+                        response.status_code, response.headers, part_size
+                    ))
+                    return True
+
+                response.raise_for_status()  # Check for HTTP errors
+
+                expected = expected_size(response.status_code, response.headers, part_size)
+                record_validators(info, response.headers)
+                if transfer is not None:
+                    transfer.on_response(expected)
+                # Append iff the server has honoured the Range.
+                # The part is not preallocated: its size is what a retry resumes from.
+                (mode, offset) = ('ab', part_size) if response.status_code == 206 else ('wb', 0)
+                with open(part_path, mode, buffering=0) as file:
+                    writer = block_writer(file, offset)
+                    try:
+                        with sizer_of(chunks, None if expected is None else expected - offset) as sizer:
+                            copy_body(response, writer, chunk_size, None, transfer, limiter, sizer)
+                    finally:
+                        writer.close()
+
+            finish_part(part_path, file_path, expected)
             # Success
+            if policy is not None:
+                policy.on_success(url)
             return True
 
+        except Exception as e:
+            num_failures += 1
+            delay = retry_delay(policy, url, e, num_failures, num_retries)
+            if transfer is not None:
+                transfer.on_failure(e, delay is not None)
+            if verbose:
+                print_retry(url, e, num_failures, delay)
+            if delay is None:
+                # all retries have failed
+                return False
+            time.sleep(delay)
+
+
+def download_file_segmented(
+    url: str,
+    file_path: pathlib.Path,
+    num_connections: int = 4,
+    segment_size: int = 8*1024*1024,
+    chunk_size: int = 16*1024,
+    num_retries: int = 8,
+    verbose: bool = False,
+    session = None,
+    policy = None,
+    limiter = None,
+    info: dict|None = None,
+    transfer = None,
+    chunks = None
+) -> bool:
+    """
+    Downloads a file over HTTP from url,
+    to the file pointed to by file_path,
+    by splitting it into segments of segment_size bytes
+    and fetching them over num_connections connections at the same time.
+    This helps when the server throttles each connection.
+
+    Each segment is written at its offset in a file preallocated
+    to the full size. A segment that is cut short is queued again
+    from where it was cut, so that any connection can finish it.
+    The ranges written are recorded next to the file as they finish,
+    so that a download that has failed or crashed fetches only the rest
+    of the file next time, if the file on the server is the same.
+
+    If the server does not advertise Accept-Ranges: bytes
+    or does not tell the size, or if the file is not bigger than
+    one segment, then it falls back to download_file_over_http.
+
+    Parameters
+    ----------
+    url, file_path, chunk_size, verbose, session, policy, limiter, info, transfer, chunks
+        Same as download_file_over_http.
+        Each connection has a reader of its own of chunks.
+    num_connections : int, optional
+        number of connections at the same time.
+    segment_size : int, optional
+        number of bytes requested at once by a connection.
+    num_retries : int, optional
+        number of retries of each segment before a final failure,
+        if there is no policy.
+
+    Returns
+    -------
+    bool
+        True iff the downloading was successful.
+    """
+    if session is None:
+        import requests
+        session = requests
+    size:int|None = None
+    accepts_ranges:bool = False
+    if num_connections > 1:
+        try:
+            response = session.head(
+                url, allow_redirects=True, headers=range_headers(0), timeout=TIMEOUT
+            )
+            response.close()
+            response.raise_for_status()
+            size = expected_size(response.status_code, response.headers, 0)
+            accepts_ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
         except Exception as e:
             if verbose:
-                print(f"An error occurred while downloading from {url}:")
+                print(f"Could not learn if {url} can be downloaded in segments:")
                 print(e)
-                print(f"Retry number {i+1}.")
-            continue
 
-    # all retries have failed
-    return False
+    if not accepts_ranges or size is None or size <= segment_size:
+        return download_file_over_http(
+            url, file_path, chunk_size, num_retries, verbose, session, policy, limiter,
+            info, transfer, chunks
+        )
+
+    record_validators(info, response.headers)
+    if transfer is not None:
+        transfer.on_response(size)
+    seg_path:pathlib.Path = file_path.with_name(file_path.name + SEGMENTED_PART_SUFFIX)
+    segments_path:pathlib.Path = file_path.with_name(file_path.name + SEGMENTS_SUFFIX)
+    validators:dict = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+    done:list = read_segments(segments_path, size, validators) if seg_path.exists() else []
+    with open(seg_path, 'r+b' if done else 'wb') as file:
+        preallocate(file, size)
+    write_segments(segments_path, size, validators, done)
+    done_lock = threading.Lock()
+
+    def on_written(first: int, pos: int) -> None:
+        # Bytes first to pos - 1 are in the file.
+        if pos <= first:
+            return
+        with done_lock:
+            add_range(done, first, pos - 1)
+            write_segments(segments_path, size, validators, done)
+
+    # Queue of (first byte, last byte, failures so far),
+    # and None to tell a connection to stop.
+    segments = queue.Queue()
+    for (first, last) in missing_ranges(done, size, segment_size):
+        segments.put((first, last, 0))
+    failed = threading.Event()
+
+    def fetch_segments() -> None:
+        stopped:bool = False
+        try:
+            with transfer_of(limiter), open(seg_path, 'r+b', buffering=0) as file, \
+                sizer_of(chunks, min(segment_size, size)) as sizer:
+                while True:
+                    seg = segments.get()
+                    if seg is None:
+                        stopped = True
+                        return
+                    (first, last, failures) = seg
+                    pos:int = first
+
+                    try:
+                        if failed.is_set():
+                            continue
+                        if policy is not None:
+                            time.sleep(policy.wait_time(url))
+                        headers:dict = range_headers(0)
+                        headers["Range"] = f"bytes={first}-{last}"
+                        with session.get(
+                            url, stream=True, headers=headers, timeout=TIMEOUT
+                        ) as response:
+                            response.raise_for_status()
+                            if response.status_code != 206:
+                                raise IOError("The server has ignored the Range.")
+
+                            file.seek(first)
+                            writer = block_writer(file, first)
+                            try:
+                                # Never write past the segment.
+                                copy_body(
+                                    response, writer, chunk_size, last + 1 - first,
+                                    transfer, limiter, sizer
+                                )
+                            finally:
+                                writer.close()
+                                pos = writer.position()
+                                on_written(first, pos)
+
+                        if pos <= last:
+                            raise IOError(
+                                f"Short read: {pos - first} of {last + 1 - first} bytes."
+                            )
+                        if policy is not None:
+                            policy.on_success(url)
+
+                    except Exception as e:
+                        delay = retry_delay(policy, url, e, failures + 1, num_retries)
+                        if transfer is not None:
+                            transfer.on_failure(e, delay is not None)
+                        if verbose:
+                            print(f"Bytes {pos}-{last}:")
+                            print_retry(url, e, failures + 1, delay)
+                        if delay is None:
+                            failed.set()
+                        else:
+                            time.sleep(delay)
+                            # Queue the rest of the segment again
+                            # before this one is marked as done.
+                            segments.put((pos, last, failures + 1))
+
+                    finally:
+                        segments.task_done()
+
+        except Exception as e:
+            # E.g. the file could not be opened, or the ranges not recorded.
+            if verbose:
+                print(f"A connection downloading {url} has failed:")
+                print(e)
+            failed.set()
+            # The segments left are given up, but still marked as done,
+            # so that segments.join() returns.
+            while not stopped:
+                seg = segments.get()
+                if seg is None:
+                    stopped = True
+                else:
+                    segments.task_done()
+
+    connections = [
+        threading.Thread(target=fetch_segments, daemon=True)
+        for _ in range(num_connections)
+    ]
+    for c in connections:
+        c.start()
+    segments.join()
+    for c in connections:
+        segments.put(None)
+    for c in connections:
+        c.join()
+
+    if failed.is_set():
+        # Kept with the ranges written, so that the next try resumes it.
+        return False
+
+    os.replace(seg_path, file_path)
+    segments_path.unlink()
+    return True
+
+
+async def download_file_over_http_async(
+    session: aiohttp.ClientSession,
+    url: str,
+    file_path: pathlib.Path,
+    chunk_size: int = 16*1024,
+    num_retries: int = 8,
+    verbose: bool = False,
+    policy = None,
+    limiter = None,
+    info: dict|None = None,
+    transfer = None,
+    chunks = None
+) -> bool:
+    """
+    The asyncio version of download_file_over_http.
+    Many calls can run at once on a single event loop.
+    The network is read on the loop, while the file is written through
+    the default executor, so that a slow disk does not block the loop.
+    Partial files are resumed and checked the same way.
+
+    Parameters
+    ----------
+    session : aiohttp.ClientSession
+        the session whose connector limits the connections per host.
+    url, file_path, chunk_size, num_retries, verbose, policy, limiter, info, transfer, chunks
+        Same as download_file_over_http.
+        The waits of the policy and the limiter do not block the loop.
+
+    Returns
+    -------
+    bool
+        True iff the downloading was successful.
+    """
+    import asyncio
+    loop = asyncio.get_running_loop()
+    part_path:pathlib.Path = part_path_of(file_path)
+    num_failures:int = 0
+
+    # Counted as one transfer, retries included.
+    with transfer_of(limiter):
+        while True:
+            if policy is not None:
+                await asyncio.sleep(policy.wait_time(url))
+            try:
+                part_size:int = part_path.stat().st_size if part_path.exists() else 0
+                async with session.get(
+                    url, headers=range_headers(part_size), auto_decompress=False
+                ) as response:
+                    if response.status == 416:
+                        finish_unsatisfiable_part(part_path, file_path, expected_size(
+                            response.status, response.headers, part_size
+                        ))
+                        return True
+
+                    response.raise_for_status()  # Check for HTTP errors
+
+                    expected = expected_size(response.status, response.headers, part_size)
+                    record_validators(info, response.headers)
+                    if transfer is not None:
+                        transfer.on_response(expected)
+                    # Append iff the server has honoured the Range.
+                    mode:str = 'ab' if response.status == 206 else 'wb'
+                    file = await loop.run_in_executor(None, open, part_path, mode, 0)
+                    offset:int = part_size if response.status == 206 else 0
+                    writer = block_writer(file, offset)
+                    try:
+                        with sizer_of(chunks, None if expected is None else expected - offset) as sizer:
+                            last = time.perf_counter()
+                            while True:
+                                # What iter_chunked does, but with a size for each read.
+                                size:int = sizer.size() if sizer is not None else chunk_size
+                                chunk = await response.content.read(size)
+                                if len(chunk) == 0:
+                                    break
+                                read = time.perf_counter()
+                                # Only the full blocks go through the executor,
+                                # not every chunk.
+                                write_seconds:float = 0.0
+                                view = memoryview(chunk)
+                                while len(view) != 0:
+                                    view = view[writer.put(view):]
+                                    if writer.full():
+                                        write_seconds += await loop.run_in_executor(None, writer.flush)
+                                if transfer is not None:
+                                    transfer.on_chunk(len(chunk), read - last, write_seconds, size)
+                                if limiter is not None:
+                                    await asyncio.sleep(limiter.delay(len(chunk)))
+                                if sizer is not None:
+                                    sizer.on_read(len(chunk))
+                                last = time.perf_counter()
+                    finally:
+                        await loop.run_in_executor(None, writer.close)
+                        await loop.run_in_executor(None, file.close)
+
+                await loop.run_in_executor(None, finish_part, part_path, file_path, expected)
+                # Success
+                if policy is not None:
+                    policy.on_success(url)
+                return True
 
+            except Exception as e:
+                num_failures += 1
+                delay = retry_delay(policy, url, e, num_failures, num_retries)
+                if transfer is not None:
+                    transfer.on_failure(e, delay is not None)
+                if verbose:
+                    print_retry(url, e, num_failures, delay)
+                if delay is None:
+                    # all retries have failed
+                    return False
+                await asyncio.sleep(delay)
@@ -0,0 +1,530 @@
+"""
+daemon.py keeps one run going, to which courses are submitted
+over a local HTTP API, instead of a new process per course.
+What a run warms up is kept between the courses:
+the downloaders with their connections, the loaded courses, the parse cache,
+and one budget of workers and bandwidth.
+
+daemon:
+    Runs the jobs of every course submitted through one scheduler.run_jobs,
+    taking one video of each course in turn, as batch.fair_jobs does,
+    so a course submitted while others are downloading joins the same queue.
+    Serves, on TCP or on a Unix socket:
+        POST /jobs          submits a course, from a JSON object with
+                            course_id, static_path, video_types and downloader
+                            (see entry_to_dict), and answers its job.
+        GET /jobs           every job.
+        GET /jobs/<id>      one job: its status and its numbers of videos.
+        DELETE /jobs/<id>   cancels a job: no more of its videos are started,
+                            but those being downloaded are finished.
+        GET /status         the transfers going on and the totals.
+        POST /shutdown      stops taking videos, and exits once those started are done.
+    There is no authentication, so only listen where only you can connect.
+
+submission:
+    One course submitted, and how far it has got.
+
+request:
+    Sends a request to a daemon and returns its answer, e.g. for main.py --submit.
+
+parse_address:
+    host:port or unix:path.
+
+"""
+
+from __future__ import annotations
+
+import errno
+import http.client
+import http.server
+import json
+import os
+import pathlib
+import socket
+import socketserver
+import stat
+import threading
+import time
+
+import batch
+
+DEF_ADDRESS:str = "127.0.0.1:8770"
+
+# Status of a submission.
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_CANCELLED = "cancelled"
+STATUS_FAILED = "failed"
+
+
+def parse_address(text: str) -> tuple:
+    """
+    Parameters
+    ----------
+    text: str
+        host:port, or unix:path for a Unix socket.
+        "" and "True" (i.e. the option without a value) mean DEF_ADDRESS.
+
+    Returns
+    -------
+    ("tcp", (host, port)) or ("unix", path).
+
+    Raises
+    ------
+    ValueError
+        if text is neither.
+    """
+    if text in ("", "True"):
+        text = DEF_ADDRESS
+    if text.startswith("unix:"):
+        if len(text) == len("unix:"):
+            raise ValueError("A Unix socket needs a path, e.g. unix:/tmp/mitocw_lv_dl.sock")
+        return ("unix", text[len("unix:"):])
+    (host, _, port) = text.rpartition(':')
+    if host == "" or not port.isdecimal():
+        raise ValueError(f"Invalid address {text}. It is host:port or unix:path.")
+    return ("tcp", (host, int(port)))
+
+
+def entry_to_dict(entry: batch.batch_entry) -> dict:
+    return {
+        "course_id": entry.course_id,
+        # The daemon may run in another directory.
+        "static_path": str(entry.static_root.absolute()),
+        "video_types": entry.vid_types,
+        "downloader": entry.dl_id,
+    }
+
+
+def entry_from_dict(d: dict) -> batch.batch_entry:
+    """
+    Raises
+    ------
+    ValueError
+        if d misses a field or has a wrong one.
+    """
+    try:
+        types = d["video_types"]
+        if isinstance(types, str):
+            types = types.split(',')
+        if not all(isinstance(t, str) for t in types):
+            raise ValueError("video_types must be strings.")
+        return batch.batch_entry(
+            0, str(d["course_id"]), pathlib.Path(d["static_path"]), list(types), str(d["downloader"])
+        )
+    except (KeyError, TypeError) as e:
+        raise ValueError(
+            "A job is a JSON object with course_id, static_path, video_types and downloader."
+        ) from e
+
+
+class _unix_connection(http.client.HTTPConnection):
+
+    def __init__(self, path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self._path = path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._path)
+
+
+def request(
+    address: tuple, method: str, path: str, body: dict|None = None, timeout: float = 30
+) -> tuple:
+    """
+    Parameters
+    ----------
+    address: tuple
+        returned by parse_address.
+
+    Returns
+    -------
+    (the HTTP status, the JSON object answered).
+
+    Raises
+    ------
+    OSError
+        if the daemon can not be reached.
+    """
+    (kind, where) = address
+    conn = _unix_connection(where, timeout) if kind == "unix" else \
+        http.client.HTTPConnection(where[0], where[1], timeout=timeout)
+    try:
+        data = json.dumps(body).encode() if body is not None else None
+        conn.request(method, path, data, { "Content-Type": "application/json" })
+        response = conn.getresponse()
+        text = response.read()
+        return (response.status, json.loads(text) if len(text) != 0 else {})
+    finally:
+        conn.close()
+
+
+class submission:
+
+    def __init__(self, id: int, entry: batch.batch_entry):
+        self.id = id
+        self.entry = entry
+        self.submitted:float = time.time()
+        self.cancelled:bool = False
+        # Why its videos could not be found, if they could not.
+        self.error:str|None = None
+        # Number of videos found so far, and whether that is all of them.
+        self.num_found:int = 0
+        self.all_found:bool = False
+        # { result : number of videos }
+        self.counts:dict = dict()
+
+    def status(self) -> str:
+        if self.error is not None:
+            return STATUS_FAILED
+        if self.cancelled:
+            return STATUS_CANCELLED
+        if self.all_found and sum(self.counts.values()) == self.num_found:
+            return STATUS_DONE
+        return STATUS_RUNNING if self.num_found != 0 else STATUS_QUEUED
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            **entry_to_dict(self.entry),
+            "status": self.status(),
+            "submitted": self.submitted,
+            "found": self.num_found,
+            "all_found": self.all_found,
+            **self.counts,
+            "error": self.error,
+        }
+
+
+def _remove_stale_socket(path: str) -> None:
+    """
+    Removes the Unix socket at path if it has been left by a daemon
+    that has not exited cleanly, i.e. if nothing listens on it.
+
+    Raises
+    ------
+    OSError
+        if path is not a socket, or if a daemon listens on it.
+        Either is left as it is.
+    """
+    try:
+        mode:int = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(errno.EEXIST, "It exists and is not a socket", path)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        try:
+            s.connect(path)
+        except ConnectionRefusedError:
+            os.remove(path)
+            return
+    raise OSError(errno.EADDRINUSE, "A daemon is already listening on it", path)
+
+
+class _unix_http_server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class daemon:
+    """
+    Thread-safe: the API is served on a thread per request,
+    while the jobs are fed to the downloads by one thread.
+    """
+
+    def __init__(
+        self,
+        plan,
+        num_workers: int,
+        recorder: metrics.metrics_recorder,
+        use_state: bool = False,
+        verbose: bool = False
+    ):
+        """
+        Parameters
+        ----------
+        plan:
+            called with a batch_entry, returns (its videos, its downloader),
+            as main.videos_of and main.downloader_for,
+            or raises ValueError if the course can not be downloaded.
+            Only called on one thread at a time.
+        num_workers: int
+            maximum number of videos downloaded at the same time, of all the jobs.
+        recorder: metrics_recorder
+            shared by the downloaders, to tell the transfers going on.
+        """
+        import video_downloader
+
+        self.plan = plan
+        self.num_workers = num_workers
+        self.recorder = recorder
+        self.use_state = use_state
+        self.verbose = verbose
+
+        self._lock = threading.Condition()
+        # Held while a course is planned and its state opened, which may take long
+        # (parsing its pages, rebuilding its database), so that only the submissions
+        # wait for it, and not the API nor the downloads.
+        self._plan_lock = threading.Lock()
+        self._closed:bool = False
+        # { id : submission }, in the order submitted.
+        self._submissions:dict = dict()
+        # The submissions whose videos are still being found, in turn,
+        # with the iterator of their jobs.
+        self._streams:list = []
+        # { job : its submission }, until it ends.
+        self._submission_of:dict = dict()
+        # { videos root : its download_state }, kept between the jobs.
+        # Guarded by _plan_lock.
+        self._states:dict = dict()
+        # Every job has its own downloader, so that of the run is never used.
+        # A synchronous one keeps the queue on threads, which any downloader can run on.
+        self._downloader = video_downloader.video_downloader(None)
+        self._server = None
+
+    def submit(self, entry: batch.batch_entry) -> submission:
+        """
+        Raises
+        ------
+        ValueError
+            if the course can not be downloaded, or the daemon is shutting down.
+        """
+        import download_state
+        import scheduler
+
+        with self._lock:
+            if self._closed:
+                raise ValueError("The daemon is shutting down.")
+        root:pathlib.Path = entry.videos_root
+        with self._plan_lock:
+            (videos, downloader) = self.plan(entry)
+            state:download_state.download_state|None = None
+            if self.use_state:
+                if root not in self._states:
+                    self._states[root] = download_state.download_state(root, self.verbose)
+                state = self._states[root]
+
+        with self._lock:
+            # May have been told to shut down meanwhile.
+            if self._closed:
+                raise ValueError("The daemon is shutting down.")
+            sub = submission(len(self._submissions) + 1, entry)
+            sub.counts = { r : 0 for r in scheduler.RESULTS }
+            self._submissions[sub.id] = sub
+
+            def jobs():
+                for job in scheduler.iter_jobs(videos, root):
+                    job.downloader = downloader
+                    job.state = state
+                    # Those already handed to the workers are not started either.
+                    job.cancelled = lambda: sub.cancelled
+                    yield job
+
+            self._streams.append((sub, jobs()))
+            self._lock.notify_all()
+        if self.verbose:
+            print(f"job {sub.id}: {entry}")
+        return sub
+
+    def cancel(self, id: int) -> submission|None:
+        with self._lock:
+            sub = self._submissions.get(id)
+            if sub is not None and sub.status() in (STATUS_QUEUED, STATUS_RUNNING):
+                sub.cancelled = True
+            return sub
+
+    def get(self, id: int|None) -> submission|None:
+        with self._lock:
+            return self._submissions.get(id)
+
+    def submissions(self) -> list:
+        with self._lock:
+            return list(self._submissions.values())
+
+    def status(self) -> dict:
+        (active, num_bytes, _, _) = self.recorder.snapshot()
+        with self._lock:
+            totals:dict = dict()
+            for sub in self._submissions.values():
+                for (r, n) in sub.counts.items():
+                    totals[r] = totals.get(r, 0) + n
+            return {
+                "workers": self.num_workers,
+                "closed": self._closed,
+                "jobs": len(self._submissions),
+                **totals,
+                "bytes": num_bytes + sum(t.num_bytes for t in active),
+                "active": [
+                    { "title": t.title, "url": t.url, "bytes": t.num_bytes,
+                      "expected_bytes": t.expected, "seconds": t.seconds() }
+                    for t in active
+                ],
+            }
+
+    def __jobs(self):
+        """
+        Yields the jobs of every submission, one of each in turn,
+        waiting for a submission when there is none, until shutdown().
+        """
+        while True:
+            with self._lock:
+                while len(self._streams) == 0 and not self._closed:
+                    self._lock.wait()
+                if self._closed:
+                    return
+                (sub, it) = self._streams.pop(0)
+            if sub.cancelled:
+                continue
+            # Parsing may be slow, so it is done outside the lock.
+            try:
+                job = next(it)
+            except StopIteration:
+                with self._lock:
+                    sub.all_found = True
+                continue
+            except Exception as e:
+                with self._lock:
+                    sub.error = f"{type(e).__name__}: {e}"
+                if self.verbose:
+                    print(f"job {sub.id}: {sub.error}")
+                continue
+            with self._lock:
+                sub.num_found += 1
+                self._submission_of[job] = sub
+                self._streams.append((sub, it))
+            yield job
+
+    def __on_result(self, job, result: str) -> None:
+        with self._lock:
+            sub = self._submission_of.pop(job)
+            sub.counts[result] = sub.counts.get(result, 0) + 1
+            if sub.status() == STATUS_DONE and self.verbose:
+                print(f"job {sub.id}: " + ", ".join(f"{n} {r}" for (r, n) in sub.counts.items()))
+
+    def __run(self) -> None:
+        import scheduler
+        # Taking at most one video ahead, so that a cancel or a new job
+        # takes effect at once.
+        results:list = scheduler.run_jobs(
+            self.__jobs(), self._downloader, self.num_workers, self.verbose,
+            queue_size=1, on_result=self.__on_result
+        )
+        if self.verbose:
+            print(scheduler.summarize(results))
+
+    def shutdown(self) -> None:
+        """
+        Stops taking videos. serve() returns once those started are done.
+        """
+        with self._lock:
+            self._closed = True
+            self._lock.notify_all()
+
+    def serve(self, address: tuple) -> None:
+        """
+        Serves the API at address (see parse_address) and runs the jobs,
+        until shutdown() or a KeyboardInterrupt.
+        """
+        (kind, where) = address
+        handler = daemon.__handler_class(self)
+        if kind == "unix":
+            _remove_stale_socket(where)
+            self._server = _unix_http_server(where, handler)
+        else:
+            self._server = http.server.ThreadingHTTPServer(where, handler)
+            self._server.daemon_threads = True
+
+        runner = threading.Thread(target=self.__run)
+        runner.start()
+        server_thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        server_thread.start()
+        print(f"Serving on {kind}:{where[0] + ':' + str(where[1]) if kind == 'tcp' else where}")
+        try:
+            # Waits in short steps, so that Ctrl+C is noticed.
+            while runner.is_alive():
+                runner.join(0.5)
+        except KeyboardInterrupt:
+            print("Finishing the downloads going on...")
+            self.shutdown()
+            runner.join()
+        finally:
+            self._server.shutdown()
+            self._server.server_close()
+            if kind == "unix" and os.path.exists(where):
+                os.remove(where)
+
+    def __handler_class(self):
+        server = self
+
+        class handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args) -> None:
+                pass
+
+            def answer(self, status: int, body: dict) -> None:
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def read_body(self) -> dict:
+                length = int(self.headers.get("Content-Length", "0"))
+                body = json.loads(self.rfile.read(length)) if length != 0 else {}
+                if not isinstance(body, dict):
+                    raise ValueError("The body must be a JSON object.")
+                return body
+
+            def job_id(self) -> int|None:
+                (_, _, id) = self.path.rstrip('/').rpartition('/')
+                return int(id) if id.isdecimal() else None
+
+            def do_GET(self) -> None:
+                if self.path.rstrip('/') == "/jobs":
+                    self.answer(200, { "jobs": [s.to_dict() for s in server.submissions()] })
+                elif self.path.startswith("/jobs/"):
+                    sub = server.get(self.job_id())
+                    if sub is None:
+                        self.answer(404, { "error": "No such job." })
+                    else:
+                        self.answer(200, sub.to_dict())
+                elif self.path.rstrip('/') == "/status":
+                    self.answer(200, server.status())
+                else:
+                    self.answer(404, { "error": "No such path." })
+
+            def do_POST(self) -> None:
+                try:
+                    body = self.read_body()
+                except ValueError as e:
+                    self.answer(400, { "error": f"Invalid JSON. {e}" })
+                    return
+                if self.path.rstrip('/') == "/jobs":
+                    try:
+                        sub = server.submit(entry_from_dict(body))
+                    except ValueError as e:
+                        self.answer(400, { "error": str(e) })
+                        return
+                    self.answer(201, sub.to_dict())
+                elif self.path.rstrip('/') == "/shutdown":
+                    server.shutdown()
+                    self.answer(200, server.status())
+                else:
+                    self.answer(404, { "error": "No such path." })
+
+            def do_DELETE(self) -> None:
+                if not self.path.startswith("/jobs/"):
+                    self.answer(404, { "error": "No such path." })
+                    return
+                sub = server.cancel(self.job_id())
+                if sub is None:
+                    self.answer(404, { "error": "No such job." })
+                else:
+                    self.answer(200, sub.to_dict())
+
+        return handler
@@ -0,0 +1,190 @@
+"""
+download_state.py remembers what has been downloaded into a videos root.
+
+download_state:
+    A SQLite database at the videos root, with one row per video
+    (its url, title, path, size, ETag/Last-Modified, status and times),
+    so that deciding to skip a video is an indexed lookup
+    instead of listing every session directory on every run.
+    If the database is missing, it is rebuilt from the files on disk.
+
+"""
+
+import os.path
+import pathlib
+import sqlite3
+import threading
+import time
+
+from courses import helpers
+
+# Status of a video.
+STATUS_STARTED = "started"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+class download_state:
+    """
+    Safe for concurrent writers: each thread has its own connection,
+    and other processes on the same videos root wait for each other's
+    transactions instead of failing.
+
+    Invariant:
+        A video is identified by its directory relative to the videos root
+        and its title (with the illegal characters already replaced),
+        exactly like the files start_download creates.
+    """
+
+    FILE_NAME:str = ".mitocw_lv_dl.sqlite3"
+    # How long a writer waits for another one, in seconds.
+    BUSY_TIMEOUT:float = 30.0
+
+    def __init__(self, videos_root: pathlib.Path, verbose: bool = False):
+        """
+        Parameters
+        ----------
+        videos_root: Path
+            an existing directory where the videos are downloaded to.
+            The database is stored in it.
+        """
+        if not videos_root.exists() or not videos_root.is_dir():
+            raise ValueError("The root for videos downloaded does not exist or is not a directory.")
+
+        self.videos_root = videos_root
+        self.db_path = videos_root / download_state.FILE_NAME
+        self._local = threading.local()
+
+        is_new:bool = not self.db_path.exists()
+        with self.__conn() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS videos (
+                    dir TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    url TEXT,
+                    path TEXT,
+                    size INTEGER,
+                    etag TEXT,
+                    last_modified TEXT,
+                    status TEXT NOT NULL,
+                    started REAL,
+                    finished REAL,
+                    PRIMARY KEY (dir, title)
+                )
+            """)
+        if is_new:
+            num = self.rebuild()
+            if verbose:
+                print(f"Rebuilt {self.db_path} from {num} files on disk.")
+
+    def __conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=download_state.BUSY_TIMEOUT)
+            # Readers do not block the writer, nor the writer the readers.
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def __key(self, path: pathlib.Path) -> str:
+        # Paths are stored relative to the videos root,
+        # so that the root can be moved.
+        return path.relative_to(self.videos_root).as_posix()
+
+    def rebuild(self) -> int:
+        """
+        Records every file under videos_root/<Type>s/<num>/ as done,
+        the way list_dir_filenames would see it.
+
+        Returns
+        -------
+        The number of files recorded.
+        """
+        rows:list = []
+        for type_dir in self.videos_root.iterdir():
+            if not type_dir.is_dir() or not type_dir.name.endswith('s'):
+                continue
+            for vid_dir in type_dir.iterdir():
+                if not vid_dir.is_dir() or not vid_dir.name.isdecimal():
+                    continue
+                for f in vid_dir.iterdir():
+                    if f.suffix == helpers.PART_SUFFIX or not f.is_file():
+                        continue
+                    # file name without extension
+                    title = os.path.splitext(f.name)[0]
+                    stat = f.stat()
+                    rows.append((
+                        self.__key(vid_dir), title, None, self.__key(f), stat.st_size,
+                        None, None, STATUS_DONE, None, stat.st_mtime
+                    ))
+
+        with self.__conn() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO videos VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+        return len(rows)
+
+    def is_done(self, dir_path: pathlib.Path, title: str) -> bool:
+        """
+        Returns
+        -------
+        True iff title has been downloaded into dir_path
+        and its file is still there.
+        """
+        row = self.__conn().execute(
+            "SELECT path FROM videos WHERE dir = ? AND title = ? AND status = ?",
+            (self.__key(dir_path), title, STATUS_DONE)
+        ).fetchone()
+        return row is not None and row[0] is not None and \
+            (self.videos_root / row[0]).exists()
+
+    def mark_started(self, dir_path: pathlib.Path, title: str, url: str) -> None:
+        with self.__conn() as conn:
+            conn.execute("""
+                INSERT INTO videos (dir, title, url, status, started)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (dir, title) DO UPDATE SET
+                    url = excluded.url, status = excluded.status,
+                    started = excluded.started, finished = NULL
+            """, (self.__key(dir_path), title, url, STATUS_STARTED, time.time()))
+
+    def mark_done(
+        self, dir_path: pathlib.Path, title: str, url: str, info: dict
+    ) -> None:
+        """
+        Parameters
+        ----------
+        info: dict
+            filled by video_downloader.download_to,
+            with the "path" (a Path) of the file downloaded,
+            and, if the server has told, its "etag" and "last_modified".
+        """
+        path = info.get("path")
+        size = None
+        if path is not None and path.exists():
+            size = path.stat().st_size
+            path = self.__key(path)
+
+        with self.__conn() as conn:
+            conn.execute("""
+                INSERT INTO videos
+                    (dir, title, url, path, size, etag, last_modified, status, finished)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (dir, title) DO UPDATE SET
+                    url = excluded.url, path = excluded.path, size = excluded.size,
+                    etag = excluded.etag, last_modified = excluded.last_modified,
+                    status = excluded.status, finished = excluded.finished
+            """, (
+                self.__key(dir_path), title, url, path, size,
+                info.get("etag"), info.get("last_modified"), STATUS_DONE, time.time()
+            ))
+
+    def mark_failed(self, dir_path: pathlib.Path, title: str, url: str) -> None:
+        with self.__conn() as conn:
+            conn.execute("""
+                INSERT INTO videos (dir, title, url, status, finished)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (dir, title) DO UPDATE SET
+                    url = excluded.url, status = excluded.status,
+                    finished = excluded.finished
+            """, (self.__key(dir_path), title, url, STATUS_FAILED, time.time()))
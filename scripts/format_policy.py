@@ -0,0 +1,140 @@
+"""
+format_policy.py decides which format of a video yt-dlp downloads.
+
+format_policy:
+    A cap on the quality of every video of a run
+    (maximum height, maximum bitrate, a single file or separate streams,
+    preferred codecs), turned into yt-dlp's format selection and sorting.
+    Lectures are mostly slides and chalkboards,
+    for which 1080p with separate streams to merge is a waste of bytes.
+
+"""
+
+
+class format_policy:
+    """
+    Invariant:
+        A policy with no cap and no preference leaves yt-dlp's default choice alone.
+    """
+
+    # Names of audio codecs in yt-dlp's format sorting.
+    # Any other codec is taken as a video codec.
+    AUDIO_CODECS:set = {
+        "flac", "alac", "wav", "aiff", "opus", "vorbis", "aac", "mp4a",
+        "mp3", "ac4", "eac3", "ac3", "dts"
+    }
+
+    def __init__(
+        self,
+        max_height: int|None = None,
+        max_bitrate: float|None = None,
+        single_file: bool = False,
+        codecs: list|None = None
+    ):
+        """
+        Parameters
+        ----------
+        max_height: int
+            in pixels, e.g. 720.
+        max_bitrate: float
+            total bitrate in kbit/s.
+        single_file: bool
+            if True, only formats that have both video and audio,
+            which need no merge, are chosen.
+        codecs: list
+            of preferred codecs, first the most preferred, e.g. ["h264", "aac"].
+            See yt-dlp's format sorting for their names.
+
+        If no format satisfies the caps, the one closest to them is chosen instead.
+        """
+        if max_height is not None and max_height < 1:
+            raise ValueError("The maximum height must be positive.")
+        if max_bitrate is not None and max_bitrate <= 0:
+            raise ValueError("The maximum bitrate must be positive.")
+
+        self.max_height = max_height
+        self.max_bitrate = max_bitrate
+        self.single_file = single_file
+        self.codecs = list(codecs) if codecs is not None else []
+
+    def is_default(self) -> bool:
+        return self.max_height is None and self.max_bitrate is None and \
+            not self.single_file and len(self.codecs) == 0
+
+    def format(self) -> str|None:
+        """
+        Returns
+        -------
+        The format selection (yt-dlp -f), or None for yt-dlp's default.
+        """
+        if self.max_height is None and self.max_bitrate is None and not self.single_file:
+            return None
+
+        caps:str = ""
+        if self.max_height is not None:
+            caps += f"[height<={self.max_height}]"
+        if self.max_bitrate is not None:
+            caps += f"[tbr<={self.max_bitrate:g}]"
+
+        # The best under the caps, or else the closest to them,
+        # since the formats are also sorted by them.
+        if self.single_file:
+            return f"b{caps}/b"
+        return f"bv*{caps}+ba/b{caps}/bv*+ba/b"
+
+    def format_sort(self) -> list:
+        """
+        Returns
+        -------
+        The fields to sort the formats by (yt-dlp -S),
+        which is empty for yt-dlp's default.
+        """
+        ret:list = []
+        # Sorting by these too makes the best under the caps
+        # be the highest format within them.
+        if self.max_height is not None:
+            ret.append(f"res:{self.max_height}")
+        if self.max_bitrate is not None:
+            ret.append(f"tbr:{self.max_bitrate:g}")
+
+        for c in self.codecs:
+            if c in format_policy.AUDIO_CODECS:
+                ret.append(f"acodec:{c}")
+            else:
+                ret.append(f"vcodec:{c}")
+        return ret
+
+    def params(self) -> dict:
+        """
+        Returns
+        -------
+        The parameters of a yt_dlp.YoutubeDL for this policy.
+        """
+        ret:dict = dict()
+        f = self.format()
+        if f is not None:
+            ret["format"] = f
+        sort = self.format_sort()
+        if len(sort) != 0:
+            ret["format_sort"] = sort
+        return ret
+
+    def args(self) -> list:
+        """
+        Returns
+        -------
+        The command line arguments of yt-dlp for this policy.
+        """
+        ret:list = []
+        f = self.format()
+        if f is not None:
+            ret += ["-f", f]
+        sort = self.format_sort()
+        if len(sort) != 0:
+            ret += ["-S", ",".join(sort)]
+        return ret
+
+    def __str__(self) -> str:
+        if self.is_default():
+            return "yt-dlp's default format"
+        return " ".join(self.args())
@@ -0,0 +1,144 @@
+"""
+http_pool.py provides the HTTP connections shared by all the downloads of a run.
+
+http_pool:
+    A thread-safe pool of keep-alive connections,
+    which counts how many times a connection is reused,
+    instead of a new TCP connection and TLS handshake per file.
+    Every request through it times out, whether or not its caller says so.
+
+"""
+
+import threading
+
+import requests
+import requests.adapters
+import urllib3
+import urllib3.connection
+
+from courses import helpers
+
+
+class _timeout_adapter(requests.adapters.HTTPAdapter):
+    """
+    Gives the requests sent without a timeout that of the pool.
+    """
+
+    def __init__(self, timeout, **kwargs):
+        super().__init__(**kwargs)
+        self.timeout = timeout
+
+    def send(self, request, timeout=None, **kwargs):
+        if timeout is None:
+            timeout = self.timeout
+        return super().send(request, timeout=timeout, **kwargs)
+
+
+class http_pool:
+    """
+    Owns a requests.Session whose connections are kept alive
+    and shared by every thread that downloads through it.
+
+    Invariant:
+        At most max_conns_per_host connections are open to the same host.
+        A thread that needs one more waits until one is returned.
+    """
+
+    def __init__(
+        self,
+        num_hosts: int = 10,
+        max_conns_per_host: int = 16,
+        keep_alive: bool = True,
+        timeout: tuple = helpers.TIMEOUT
+    ):
+        """
+        Parameters
+        ----------
+        num_hosts: int
+            number of hosts whose connections are kept.
+            A course usually downloads from one or two hosts.
+        max_conns_per_host: int
+            maximum number of connections to the same host.
+            Should be at least the number of downloads at the same time.
+        keep_alive: bool
+            if False, a connection is closed after each request.
+            Only useful to measure what keeping them alive saves.
+        timeout: tuple
+            (seconds to connect, seconds of each read) of the requests
+            sent without a timeout of their own.
+        """
+        if num_hosts < 1 or max_conns_per_host < 1:
+            raise ValueError("The pool sizes must be positive.")
+
+        self.max_conns_per_host = max_conns_per_host
+        self.keep_alive = keep_alive
+
+        self._lock = threading.Lock()
+        self._num_connections = 0
+        self._num_requests = 0
+
+        self._adapter = _timeout_adapter(
+            timeout,
+            pool_connections=num_hosts,
+            pool_maxsize=max_conns_per_host,
+            pool_block=True
+        )
+        # Count every TCP connection that is actually opened,
+        # including when a closed one is opened again.
+        self._adapter.poolmanager.pool_classes_by_scheme = {
+            "http": self.__counting_pool_class(
+                urllib3.HTTPConnectionPool, urllib3.connection.HTTPConnection
+            ),
+            "https": self.__counting_pool_class(
+                urllib3.HTTPSConnectionPool, urllib3.connection.HTTPSConnection
+            ),
+        }
+
+        self.session = requests.Session()
+        self.session.mount("http://", self._adapter)
+        self.session.mount("https://", self._adapter)
+        self.session.hooks["response"].append(self.__count_request)
+        if not keep_alive:
+            self.session.headers["Connection"] = "close"
+
+    def __counting_pool_class(self, pool_cls: type, connection_cls: type) -> type:
+        pool = self
+
+        class counting_connection(connection_cls):
+            def connect(self):
+                super().connect()
+                with pool._lock:
+                    pool._num_connections += 1
+
+        return type(
+            "counting_" + pool_cls.__name__, (pool_cls,),
+            { "ConnectionCls" : counting_connection }
+        )
+
+    def __count_request(self, response, *args, **kwargs) -> None:
+        with self._lock:
+            self._num_requests += 1
+
+    def stats(self) -> tuple:
+        """
+        Returns
+        -------
+        (number of connections opened, number of requests sent)
+        since the pool was created.
+        """
+        with self._lock:
+            return (self._num_connections, self._num_requests)
+
+    def report(self) -> str:
+        """
+        Returns
+        -------
+        A human readable line of how many connections have been reused.
+        """
+        (num_connections, num_requests) = self.stats()
+        num_reused = max(num_requests - num_connections, 0)
+        return f"{num_requests} HTTP requests over {num_connections} connections " + \
+            f"({num_reused} reused)"
+
+    def close(self) -> None:
+        self.session.close()
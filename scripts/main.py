@@ -1,20 +1,28 @@
-import video_downloader
-import pathlib
+from __future__ import annotations
 
-# In case the script is run on Windows, I will replace every illegal character in NTFS with #
-ILLEGAL_NTFS_CHARS = "\\/:*?\"<>|"
-ILLEGAL_CHAR_TRANS_TABLE = str.maketrans({char: '#' for char in ILLEGAL_NTFS_CHARS})
+# Only what every run needs is imported here.
+# The rest is imported once the arguments are checked,
+# so that a wrong argument or --list returns at once.
+import errno
+import pathlib
+import registry
 
 def start_download(
-    video_maps: dict, 
+    video_maps, 
     videos_root: pathlib.Path, 
     downloader: video_downloader.video_downloader,
-    verbose:bool = False
-) -> None:
+    verbose:bool = False,
+    num_workers:int = 1,
+    use_state:bool = False,
+    estimate:bool = False,
+    progress:progress.progress_view|None = None,
+    order:str = "course"
+) -> list:
     """
     Download all videos in video_maps into videos_root,
     creating a subdirectory for each lecture/reitation/etc.
-    The downloading will be done using downloader.
+    The downloading will be done using downloader,
+    by at most num_workers downloads at the same time.
 
         Parameters:
             video_maps (map): map of lists of tuples. 
@@ -23,11 +31,31 @@ def start_download(
                 where num is the video number,
                 and url_map is a map that maps titles to video urls. 
                 Each map is arranged in the order that the videos are given.
+                Or, an iterable of (type, num, title, url),
+                e.g. a course's iter_videos(),
+                whose videos are downloaded while it is still yielding.
             videos_root (pathlib.Path):
                 path to the directory where all the videos downloaded 
                 are to be placed in.
             downloader:
                 The ADT that handles the downloading.
+            num_workers (int):
+                The maximum number of videos downloaded at the same time.
+            use_state (bool):
+                Whether to remember what has been downloaded
+                in a download_state at videos_root,
+                instead of listing each directory.
+            estimate (bool):
+                Whether to print how many bytes the videos will take
+                before downloading them,
+                which waits for all the videos to be found.
+                Fails if they do not fit on the disk of videos_root.
+            progress (progress.progress_view):
+                If not None, shows the progress of the downloads
+                while they run, from the downloader's metrics.
+            order (str):
+                One of scheduler.ORDERS, the order the videos are started in.
+                Any but the course's estimates them too.
 
         Requires:
             The maps is not empty; the video urls are valid.
@@ -40,114 +68,595 @@ def start_download(
             as their filename, with illegal characters in NTFS replaced by #,
             in case the scripts are executed on Windows.
             Will only output extra information if verbose=True
+
+        Returns:
+            The list of (job, result) returned by scheduler.run_jobs.
     """
-    if len(video_maps) == 0:
-        raise ValueError("The list of video maps is empty.")
+    import download_state
+    import scheduler
+    from courses import course
+
+    if isinstance(video_maps, dict):
+        if len(video_maps) == 0:
+            raise ValueError("The list of video maps is empty.")
+        video_maps = course.course.videos_of(video_maps)
     if not videos_root.exists() or not videos_root.is_dir():
         raise ValueError("The root for videos downloaded does not exist or is not a directory.")
     if downloader is None:
         raise ValueError("The downloader is none.")
-    
-    # Type of the video, e.g. "Lecture", "Recitation".
-    video_type:str
-    for video_type in video_maps:
-        # Add 's' to mean plural form.
-        video_type_dir = videos_root / (video_type + 's')
-
-        # list of video maps for the video_type.
-        list_video_maps: list = video_maps[video_type]
-        video_type_dir.mkdir(exist_ok=True)
-
-        for (vid_num, video_map) in list_video_maps:
-
-            str_vn:str = str(vid_num)
-            if (verbose):
-                print(f"downloading videos for {video_type} {str_vn}")
-
-            # Videos for a session will be placed under root/video_type/number/
-            video_dir: pathlib.Path = video_type_dir / str_vn
-            if(not video_dir.exists() or not video_dir.is_dir()):
-                video_dir.mkdir(exist_ok=True)
-
-            downloader.chdir(video_dir)
-
-            title:str
-            for (title, url) in video_map.items():
-                # Replace illegal filename characters with #
-                title = title.translate(ILLEGAL_CHAR_TRANS_TABLE)
-                downloader.download(title, url, verbose)
-
-# Import courses
-import courses.c6004y2017
-import courses.c18065y2018
-import courses.c1806scy2011
-import courses.c6034y2010
-import courses.c6858y2014
-import courses.c6868jy2011
-import courses.fmsd_hehner
-
-# Maps <course-number>-<year> to the course's my_info
-COURSE_MAP:dict = dict()
-COURSE_MAP["6.004-2017"] = courses.c6004y2017.my_info
-COURSE_MAP["18.065-2018"] = courses.c18065y2018.my_info
-COURSE_MAP["18.06sc-2011"] = courses.c1806scy2011.my_info
-COURSE_MAP["6.034-2010"] = courses.c6034y2010.my_info
-COURSE_MAP["6.858-2014"] = courses.c6858y2014.my_info
-COURSE_MAP["6.868j-2011"] = courses.c6868jy2011.my_info
-COURSE_MAP["fmsd_hehner"] = courses.fmsd_hehner.my_info
-
-# Maps name to downloaders
-DLD_MAP:dict = dict()
-DLD_MAP["yt-dlp"] = video_downloader.yt_dlp_downloader()
-DLD_MAP["300k"] = video_downloader.default_300k_downloader()
+
+    state = download_state.download_state(videos_root, verbose) if use_state else None
+    jobs = scheduler.iter_jobs(video_maps, videos_root)
+    if (progress is not None):
+        jobs = progress.count_jobs(jobs)
+    if (estimate or order != scheduler.ORDER_COURSE):
+        jobs = scheduler.preflight(jobs, downloader, num_workers, order, state)
+        print(scheduler.summarize_sizes(jobs))
+    if (verbose):
+        print(f"Downloading with {num_workers} workers")
+    if (progress is not None):
+        with progress:
+            results:list = scheduler.run_jobs(
+                jobs, downloader, num_workers, verbose, state,
+                on_result=progress.on_result
+            )
+    else:
+        results:list = scheduler.run_jobs(jobs, downloader, num_workers, verbose, state)
+    print(scheduler.summarize(results))
+    report = downloader.report()
+    if (report is not None):
+        print(report)
+    return results
+
+def work(
+    board: shard.lease_board,
+    jobs: list,
+    downloader: video_downloader.video_downloader,
+    verbose: bool = False,
+    num_workers: int = 1,
+    progress: progress.progress_view|None = None
+) -> list:
+    """
+    Downloads the videos of a manifest whose leases this worker takes from board,
+    until every video of it is done or given up, by any worker.
+    See start_download for the parameters.
+
+    There is no download_state, as SQLite is not safe over NFS:
+    a video already on disk is found by listing its directory.
+
+    Returns
+    -------
+    The list of (job, result) of the videos this worker has taken.
+    """
+    import scheduler
+
+    def on_result(job: scheduler.download_job, result: str) -> None:
+        board.on_result(job, result)
+        if (progress is not None):
+            progress.on_result(job, result)
+
+    with board:
+        jobs = board.jobs(jobs)
+        if (progress is not None):
+            jobs = progress.count_jobs(jobs)
+        # Taking one video ahead at most, so that a worker does not hold
+        # the leases of videos it will not start soon.
+        if (progress is not None):
+            with progress:
+                results:list = scheduler.run_jobs(
+                    jobs, downloader, num_workers, verbose, queue_size=1, on_result=on_result
+                )
+        else:
+            results:list = scheduler.run_jobs(
+                jobs, downloader, num_workers, verbose, queue_size=1, on_result=on_result
+            )
+    print(scheduler.summarize(results))
+    report = downloader.report()
+    if (report is not None):
+        print(report)
+    return results
+
+def configure_downloader(
+    downloader: video_downloader.video_downloader,
+    course_info: course.course_info,
+    cmd_opts: dict,
+    verbose: bool = False
+) -> None:
+    """
+    Sets the options in cmd_opts that downloader takes,
+    printing and exiting if one is invalid.
+    The options it does not take are ignored.
+    """
+    import format_policy
+    import retry_policy
+    import video_downloader
+
+    # Options of the retry policy, which every downloader has.
+    if ("retries" in cmd_opts or "retry-delay" in cmd_opts):
+        retries_opt:str = cmd_opts.get("retries", str(downloader.retry_policy.num_tries))
+        retry_delay_opt:str = cmd_opts.get("retry-delay", str(downloader.retry_policy.base_delay))
+        try:
+            downloader.retry_policy = retry_policy.retry_policy(
+                int(retries_opt), float(retry_delay_opt)
+            )
+        except ValueError:
+            print("Invalid --retries or --retry-delay. They must be a positive integer and a non-negative number.")
+            exit(-1)
+
+    # Options of the 300k downloader.
+    if (isinstance(downloader, video_downloader.default_300k_downloader)):
+        for (o, attr) in [("connections", "num_connections"), ("segment-size", "segment_size")]:
+            if (o not in cmd_opts):
+                continue
+            if (not cmd_opts[o].isdecimal() or int(cmd_opts[o]) < 1):
+                print(f"Invalid --{o}. It must be a positive integer.")
+                exit(-1)
+            setattr(downloader, attr, int(cmd_opts[o]))
+
+        if ("min-chunk" in cmd_opts or "max-chunk" in cmd_opts):
+            import chunk_policy
+            min_chunk_opt:str = cmd_opts.get("min-chunk", str(chunk_policy.DEF_MIN_SIZE))
+            max_chunk_opt:str = cmd_opts.get("max-chunk", str(chunk_policy.DEF_MAX_SIZE))
+            if (not min_chunk_opt.isdecimal() or not max_chunk_opt.isdecimal() or \
+                int(min_chunk_opt) < 1 or int(max_chunk_opt) < int(min_chunk_opt)):
+                print("Invalid --min-chunk or --max-chunk. They must be positive integers, the minimum not above the maximum.")
+                exit(-1)
+            downloader.chunk_policy = chunk_policy.chunk_policy(
+                int(min_chunk_opt), int(max_chunk_opt), downloader.chunk_size
+            )
+
+        conns_per_host_opt:str = cmd_opts.get(
+            "conns-per-host", str(video_downloader.default_300k_downloader.DEF_MAX_CONNS_PER_HOST)
+        )
+        if (not conns_per_host_opt.isdecimal() or int(conns_per_host_opt) < 1):
+            print("Invalid --conns-per-host. It must be a positive integer.")
+            exit(-1)
+        downloader.set_pool(int(conns_per_host_opt), cmd_opts.get("keep-alive", "True") == "True")
+
+    # Options of the yt-dlp downloaders, over the course's own format policy.
+    if (isinstance(downloader, video_downloader.yt_dlp_downloader)):
+        formats:dict = dict(course_info.formats)
+        try:
+            if ("max-height" in cmd_opts):
+                formats["max_height"] = int(cmd_opts["max-height"])
+            if ("max-bitrate" in cmd_opts):
+                formats["max_bitrate"] = float(cmd_opts["max-bitrate"])
+            if ("single-file" in cmd_opts):
+                formats["single_file"] = cmd_opts["single-file"] == "True"
+            if ("codecs" in cmd_opts):
+                formats["codecs"] = cmd_opts["codecs"].split(',')
+            downloader.set_format_policy(format_policy.format_policy(**formats))
+        except ValueError:
+            print("Invalid --max-height or --max-bitrate. They must be positive numbers.")
+            exit(-1)
+        if (verbose):
+            print(f"Format: {downloader.format_policy}")
+
+def check_entry(entry: batch.batch_entry, need_static: bool = True) -> str|None:
+    """
+    Returns
+    -------
+    Why the course of entry can not be downloaded, or None if it can.
+    The static contents are not looked at unless need_static.
+    """
+    # find the populate_video_maps_list()
+    if (not entry.course_id in COURSE_MAP):
+        return "Invalid course id. It is in the form of <course-number>-year"
+    # find the directory where the extracted static download is stored.
+    if (need_static and (not entry.static_root.exists() or not entry.static_root.is_dir())):
+        return "Invalid directory to the extracted contents."
+    # find the video downloader
+    if (not entry.dl_id in DLD_MAP):
+        return "Invalid downloader ID"
+    return None
+
+
+def downloader_for(
+    entry: batch.batch_entry,
+    downloaders: dict,
+    cmd_opts: dict,
+    verbose: bool = False,
+    limiter: rate_limiter.rate_limiter|None = None,
+    recorder: metrics.metrics_recorder|None = None,
+    quiet: bool = False
+) -> video_downloader.video_downloader:
+    """
+    Returns
+    -------
+    The downloader of the course of entry, from downloaders if it is there,
+    or a new one, configured by cmd_opts, which is added to downloaders.
+
+    The courses share a downloader when they can, and with it its connections,
+    but the yt-dlp downloaders have the format policy of their course.
+    All the downloaders share limiter and recorder.
+    """
+    import video_downloader
+
+    key = entry.dl_id
+    if (issubclass(DLD_MAP[entry.dl_id], video_downloader.yt_dlp_downloader)):
+        key = (entry.dl_id, entry.course_id)
+    if (key not in downloaders):
+        downloader:video_downloader.video_downloader = DLD_MAP[entry.dl_id]()
+        configure_downloader(downloader, COURSE_MAP[entry.course_id], cmd_opts, verbose)
+        downloader.rate_limiter = limiter
+        downloader.metrics = recorder
+        downloader.quiet = quiet
+        downloaders[key] = downloader
+    return downloaders[key]
+
+
+def videos_of(
+    entry: batch.batch_entry,
+    downloader: video_downloader.video_downloader,
+    cache: parse_cache.parse_cache|None = None,
+    verbose: bool = False,
+    recorder: metrics.metrics_recorder|None = None
+):
+    """
+    Returns
+    -------
+    The iter_videos of the course of entry, for the urls downloader takes,
+    through cache and timed by recorder if they are not None.
+    Nothing is parsed until it is iterated.
+    """
+    # Several downloaders may take the same kind of urls (e.g. 300k and 300k-async)
+    url_type:str = downloader.URL_TYPE
+    way_to_get_videos_cls = COURSE_MAP[entry.course_id].get_way_for_downloader(url_type)
+    way_to_get_videos = way_to_get_videos_cls(entry.static_root, url_type)
+    if (cache is not None):
+        videos = cache.iter_videos(way_to_get_videos, entry.vid_types, verbose)
+    else:
+        videos = way_to_get_videos.iter_videos(entry.vid_types, verbose)
+    if (recorder is not None):
+        videos = recorder.timed_parse(videos, entry.course_id, way_to_get_videos_cls.__name__)
+    return videos
+
+
+# Maps <course-number>-<year> to the course's my_info,
+# each imported only when chosen.
+COURSE_MAP:registry.registry = registry.COURSES
+
+# Maps name to downloader classes, each imported only when chosen.
+DLD_MAP:registry.registry = registry.DOWNLOADERS
 
 # handle the command arguements
 import sys
 
-# Arguments:
-# 1. course_id 
-# 2. static resources path
-# 3. video types, separated by comma
-# 4. downloader id 
-# 5. verbose (bool)
-cmd_args:list = sys.argv[1:]
-
-if (len(cmd_args) != 5):
-    print("Invalid number of arguments.")
-    exit(-1)
-
-# find the populate_video_maps_list()
-course_id:str = cmd_args[0]
-if (not course_id in COURSE_MAP):
-    print("Invalid course id. It is in the form of <course-number>-year")
-    exit(-1)
-course_info = COURSE_MAP[course_id]
-
-# find the directory where the extracted static download is stored.
-static_root:pathlib.Path = pathlib.Path(cmd_args[1])
-if (not static_root.exists() or not static_root.is_dir()):
-    print("Invalid directory to the extracted contents.")
-    exit(-1)
-videos_root:pathlib.Path = static_root.parent 
-
-# parse the video types.
-vid_types = cmd_args[2].split(',')
-
-# find the video downloader
-downloader:video_downloader
-dl_id:str = cmd_args[3]
-if (not dl_id in DLD_MAP):
-    print("Invalid downloader ID")
-    exit(-1)
-downloader = DLD_MAP[dl_id]
-
-verbose:bool = str(cmd_args[4])
-
-# Find the video urls after checking the arguments to fail fast.
-way_to_get_videos_cls = course_info.get_way_for_downloader(dl_id)
-way_to_get_videos = way_to_get_videos_cls(static_root, dl_id)
-videos = way_to_get_videos.populate_video_maps_lists(vid_types, verbose)
-
-# Execute the downloading tasks.
-start_download(videos, videos_root, downloader, verbose)
+def main() -> None:
+    # Arguments:
+    # 1. course_id 
+    # 2. static resources path
+    # 3. video types, separated by comma
+    # 4. downloader id 
+    # 5. verbose (bool)
+    # Options, in the form of --name=value, may be put anywhere:
+    # --workers=N   number of videos downloaded at the same time (default 1)
+    # --connections=N   number of connections per file of the 300k downloader
+    # --min-chunk=BYTES, --max-chunk=BYTES   bounds of the size of each read (300k only)
+    # --segment-size=BYTES   size of each of these connections' requests
+    # --conns-per-host=N   maximum number of connections to the same host (300k)
+    # --keep-alive=BOOL   whether to reuse the connections (300k, default True)
+    # --retries=N   number of tries of each download
+    # --retry-delay=SECONDS   base delay of the exponential backoff between tries
+    # --rate-limit=SCHEDULE   total bandwidth of all downloads, see rate_limiter.parse_schedule
+    # --state=BOOL   whether to remember what has been downloaded in a database (default False)
+    # --cache=BOOL   whether to cache the video maps parsed from the static resources (default True)
+    # --parser=NAME   parser of the html files, lxml or html.parser (default the fastest installed)
+    # --strain=BOOL   whether to build only the parts of the html files that are used (default True)
+    # --parse-workers=N   number of processes parsing the html files (default one per core)
+    # --max-height=PIXELS   highest format of the yt-dlp videos (default the course's, or any)
+    # --max-bitrate=KBPS   highest total bitrate of the yt-dlp videos
+    # --single-file=BOOL   whether to only take yt-dlp formats that need no merge
+    # --codecs=LIST   codecs the yt-dlp formats should preferably have, separated by comma
+    # --estimate=BOOL   whether to print the total size of the videos before downloading them,
+    #   failing if they do not fit on the disk
+    # --order=ORDER   the videos are started in: course (default), largest or shortest (first)
+    # --metrics=FILE   appends a JSON line per transfer and per parse to FILE
+    # --prometheus=FILE   writes the totals of the run to FILE for a textfile collector
+    # --progress=BOOL   whether to show the progress of the whole run (default True)
+    # --batch=FILE   downloads every course listed in FILE instead, see batch.read_job_file
+    # --serve=ADDRESS   runs as a daemon at ADDRESS (host:port or unix:path, default 127.0.0.1:8770)
+    #   taking courses from --submit and its HTTP API, see daemon.py
+    # --submit=ADDRESS   hands the course (or the --batch) to the daemon at ADDRESS instead
+    # --plan=FILE   writes the videos of the course to the manifest FILE instead, see shard.py
+    # --work=FILE   downloads the videos of the manifest FILE with the other workers on it
+    # --node=NAME   of this worker in the leases (default host-pid)
+    # --lease=SECONDS   after which the lease of a worker that has stopped renewing it expires
+    # --list   prints the course ids and downloader ids, and does nothing else
+    OPTIONS:set = {
+        "workers", "connections", "segment-size", "min-chunk", "max-chunk", "conns-per-host", "keep-alive",
+        "retries", "retry-delay", "rate-limit", "state", "cache",
+        "parser", "strain", "parse-workers",
+        "max-height", "max-bitrate", "single-file", "codecs", "estimate", "order",
+        "metrics", "prometheus", "progress", "batch", "serve", "submit",
+        "plan", "work", "node", "lease", "list"
+    }
+    cmd_args:list = [a for a in sys.argv[1:] if not a.startswith("--")]
+    cmd_opts:dict = dict(
+        a[2:].split('=', 1) if '=' in a else (a[2:], "True")
+        for a in sys.argv[1:] if a.startswith("--")
+    )
+
+    if ("list" in cmd_opts):
+        print("Courses: " + ", ".join(COURSE_MAP.ids()))
+        print("Downloaders: " + ", ".join(DLD_MAP.ids()))
+        return
+
+    if ("batch" in cmd_opts or "serve" in cmd_opts or "work" in cmd_opts):
+        # Only verbose, if anything.
+        if (len(cmd_args) > 1):
+            print("Invalid number of arguments. With --batch, --serve or --work, only verbose may be given.")
+            exit(-1)
+    elif (len(cmd_args) != 5):
+        print("Invalid number of arguments.")
+        exit(-1)
+    for o in cmd_opts:
+        if (not o in OPTIONS):
+            print(f"Invalid option --{o}. Supported: {OPTIONS}")
+            exit(-1)
+    if ("serve" in cmd_opts and ("batch" in cmd_opts or "submit" in cmd_opts)):
+        print("--serve takes its courses from --submit, not --batch.")
+        exit(-1)
+    if ("submit" in cmd_opts and len(cmd_opts.keys() - { "submit", "batch" }) != 0):
+        print("With --submit, the options are those of the daemon.")
+        exit(-1)
+    if (len({ "plan", "work" } & cmd_opts.keys()) != 0 and \
+        len({ "plan", "work", "batch", "serve", "submit" } & cmd_opts.keys()) != 1):
+        print("--plan and --work take a single course, and neither --batch, --serve nor --submit.")
+        exit(-1)
+
+    # The courses to download, each as the arguments of a single one.
+    import batch
+    entries:list = []
+    verbose:bool
+    if ("batch" in cmd_opts):
+        try:
+            entries = batch.read_job_file(pathlib.Path(cmd_opts["batch"]))
+        except (OSError, ValueError) as e:
+            print(f"Invalid --batch. {e}")
+            exit(-1)
+        if (len(entries) == 0):
+            print("Invalid --batch. It has no course.")
+            exit(-1)
+        verbose = (len(cmd_args) == 1 and cmd_args[0] == "True")
+    elif ("serve" in cmd_opts):
+        verbose = (len(cmd_args) == 1 and cmd_args[0] == "True")
+    elif ("work" in cmd_opts):
+        import shard
+        try:
+            (manifest, work_root, work_jobs) = shard.read_manifest(pathlib.Path(cmd_opts["work"]))
+        except (OSError, ValueError) as e:
+            print(f"Invalid --work. {e}")
+            exit(-1)
+        # The videos are in the manifest. Only its course and downloader are needed,
+        # and the static contents need not be on this node.
+        entries = [batch.batch_entry(
+            0, manifest["course_id"], work_root, [], manifest["downloader"]
+        )]
+        verbose = (len(cmd_args) == 1 and cmd_args[0] == "True")
+    else:
+        entries = [batch.batch_entry(
+            0, cmd_args[0], pathlib.Path(cmd_args[1]), cmd_args[2].split(','), cmd_args[3]
+        )]
+        verbose = (cmd_args[4] == "True")
+
+    for entry in entries:
+        error:str|None = check_entry(entry, "work" not in cmd_opts)
+        if (error is not None):
+            # Tell which entry of a batch is wrong.
+            print((f"line {entry.line}: " if "batch" in cmd_opts else "") + error)
+            exit(-1)
+
+    # Hand the courses to the daemon, which checks them again.
+    if ("submit" in cmd_opts):
+        import daemon
+        for entry in entries:
+            try:
+                (status, answer) = daemon.request(
+                    daemon.parse_address(cmd_opts["submit"]), "POST", "/jobs",
+                    daemon.entry_to_dict(entry)
+                )
+            except (OSError, ValueError) as e:
+                print(f"Could not reach the daemon at {cmd_opts['submit']}. {e}")
+                exit(-1)
+            if (status != 201):
+                print(f"{entry}: {answer.get('error')}")
+                exit(-1)
+            print(f"{entry}: job {answer['id']}")
+        return
+
+    # The arguments are right. Now import what the run needs.
+    import metrics
+    import parse_cache
+    import progress
+    import rate_limiter
+    import video_downloader
+    from courses import helpers
+
+    # Options that no downloader of the run takes are a mistake.
+    # A daemon does not know its downloaders yet.
+    OPTIONS_300K:set = {
+        "connections", "segment-size", "min-chunk", "max-chunk", "conns-per-host", "keep-alive"
+    }
+    if (len(OPTIONS_300K & cmd_opts.keys()) != 0 and "serve" not in cmd_opts and not any(
+        issubclass(DLD_MAP[e.dl_id], video_downloader.default_300k_downloader) for e in entries
+    )):
+        print(f"{OPTIONS_300K} only apply to the 300k downloaders.")
+        exit(-1)
+    OPTIONS_YT_DLP:set = { "max-height", "max-bitrate", "single-file", "codecs" }
+    if (len(OPTIONS_YT_DLP & cmd_opts.keys()) != 0 and "serve" not in cmd_opts and not any(
+        issubclass(DLD_MAP[e.dl_id], video_downloader.yt_dlp_downloader) for e in entries
+    )):
+        print(f"{OPTIONS_YT_DLP} only apply to the yt-dlp downloaders.")
+        exit(-1)
+
+    workers_opt:str = cmd_opts.get("workers", "1")
+    if (not workers_opt.isdecimal() or int(workers_opt) < 1):
+        print("Invalid number of workers. It must be a positive integer.")
+        exit(-1)
+    num_workers:int = int(workers_opt)
+
+    import scheduler
+    order:str = cmd_opts.get("order", scheduler.ORDER_COURSE)
+    if (order not in scheduler.ORDERS):
+        print(f"Invalid --order. It is one of {', '.join(scheduler.ORDERS)}.")
+        exit(-1)
+
+    # One bandwidth for all the downloads, whatever their course or downloader.
+    limiter:rate_limiter.rate_limiter|None = None
+    if ("rate-limit" in cmd_opts):
+        try:
+            limiter = rate_limiter.rate_limiter(
+                rate_limiter.parse_schedule(cmd_opts["rate-limit"]), num_workers
+            )
+        except ValueError:
+            print("Invalid --rate-limit. For example, 09:00-18:00=2M,unlimited")
+            exit(-1)
+
+    # Options of parsing the html files.
+    try:
+        helpers.use_parser(cmd_opts.get("parser"), cmd_opts.get("strain", "True") == "True")
+    except ValueError as e:
+        print(f"Invalid --parser. {e}")
+        exit(-1)
+    if ("parse-workers" in cmd_opts):
+        if (not cmd_opts["parse-workers"].isdecimal() or int(cmd_opts["parse-workers"]) < 1):
+            print("Invalid --parse-workers. It must be a positive integer.")
+            exit(-1)
+        helpers.use_parse_workers(int(cmd_opts["parse-workers"]))
+
+    # Measure the transfers and the parsing, if asked to or for the progress.
+    show_progress:bool = cmd_opts.get("progress", "True") == "True"
+    recorder:metrics.metrics_recorder|None = None
+    if ("metrics" in cmd_opts or "prometheus" in cmd_opts or show_progress):
+        try:
+            recorder = metrics.metrics_recorder(
+                pathlib.Path(cmd_opts["metrics"]) if "metrics" in cmd_opts else None,
+                pathlib.Path(cmd_opts["prometheus"]) if "prometheus" in cmd_opts else None
+            )
+        except OSError as e:
+            print(f"Invalid --metrics. {e}")
+            exit(-1)
+
+    cache:parse_cache.parse_cache|None = None
+    if (cmd_opts.get("cache", "True") == "True"):
+        cache = parse_cache.parse_cache()
+
+    # Serve until told to stop, with the budget and the options of the run.
+    if ("serve" in cmd_opts):
+        import daemon
+        # The daemon tells the progress of its jobs instead.
+        show_progress = False
+        if (recorder is None):
+            recorder = metrics.metrics_recorder()
+        downloaders:dict = dict()
+
+        def plan(entry: batch.batch_entry) -> tuple:
+            error:str|None = check_entry(entry)
+            if (error is not None):
+                raise ValueError(error)
+            downloader = downloader_for(
+                entry, downloaders, cmd_opts, verbose, limiter, recorder, True
+            )
+            return (videos_of(entry, downloader, cache, verbose, recorder), downloader)
+
+        try:
+            daemon.daemon(
+                plan, num_workers, recorder,
+                cmd_opts.get("state", "False") == "True", verbose
+            ).serve(daemon.parse_address(cmd_opts["serve"]))
+        except (OSError, ValueError) as e:
+            print(f"Invalid --serve. {e}")
+            exit(-1)
+        finally:
+            for d in downloaders.values():
+                d.close()
+            recorder.close()
+        return
+
+    downloaders:dict = dict()
+    courses:list = []
+    for entry in entries:
+        # The progress shows what the downloaders would print.
+        downloader = downloader_for(
+            entry, downloaders, cmd_opts, verbose, limiter, recorder, show_progress
+        )
+        if ("work" in cmd_opts):
+            courses.append((entry, work_jobs, downloader))
+            continue
+        # The videos are downloaded as soon as they are found.
+        courses.append((entry, videos_of(entry, downloader, cache, verbose, recorder), downloader))
+
+    view:progress.progress_view|None = None
+    if (show_progress):
+        view = progress.progress_view(recorder)
+
+    # Execute the downloading tasks.
+    try:
+        if ("plan" in cmd_opts):
+            import shard
+            (entry, videos, _) = courses[0]
+            # Same as populate_video_maps_lists, in the order of the course.
+            jobs:list = list(scheduler.iter_jobs(videos, entry.videos_root))
+            try:
+                shard.write_manifest(
+                    pathlib.Path(cmd_opts["plan"]), entry.course_id, entry.dl_id,
+                    entry.videos_root, jobs
+                )
+            except OSError as e:
+                print(f"Invalid --plan. {e}")
+                exit(-1)
+            print(f"{len(jobs)} videos in {cmd_opts['plan']}")
+        elif ("work" in cmd_opts):
+            (_, jobs, downloader) = courses[0]
+            try:
+                lease:float = float(cmd_opts.get("lease", str(shard.DEF_LEASE_SECONDS)))
+                board = shard.lease_board(
+                    pathlib.Path(cmd_opts["work"]), cmd_opts.get("node"), lease, verbose=verbose
+                )
+            except (OSError, ValueError) as e:
+                print(f"Invalid --work or --lease. {e}")
+                exit(-1)
+            work(board, jobs, downloader, verbose, num_workers, view)
+        elif (len(courses) == 1):
+            (entry, videos, downloader) = courses[0]
+            start_download(
+                videos, entry.videos_root, downloader, verbose, num_workers,
+                cmd_opts.get("state", "False") == "True",
+                cmd_opts.get("estimate", "False") == "True",
+                view, order
+            )
+        else:
+            # An asynchronous downloader runs the queue if any course has one,
+            # so that its videos go on its event loop, whatever the order of the courses.
+            # Those of the other courses run on threads.
+            runner = next(
+                (d for (_, _, d) in courses if hasattr(d, "download_to_async")), courses[0][2]
+            )
+            batch.start_batch(
+                courses, runner, verbose, num_workers,
+                cmd_opts.get("state", "False") == "True",
+                cmd_opts.get("estimate", "False") == "True",
+                view, order
+            )
+    except OSError as e:
+        # Only that of preflight reaches here, the downloads print their own.
+        if (e.errno != errno.ENOSPC):
+            raise
+        print(e)
+        exit(-1)
+    except ValueError as e:
+        # e.g. a video type the course does not have,
+        # which is only known once the course is parsed.
+        print(e)
+        exit(-1)
+    finally:
+        for d in downloaders.values():
+            d.close()
+        if (recorder is not None):
+            recorder.close()
 
+# The parse workers may import this module again (e.g. on Windows),
+# which must not start another run.
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,438 @@
+"""
+metrics.py measures every transfer and the parsing of a run,
+and writes what it has measured for later, instead of printing it.
+
+transfer_metrics:
+    What one video's download has done so far: its bytes, the time to its
+    first byte, its average and peak throughput, its failures and their causes,
+    the time spent reading the network versus writing the disk,
+    and the sizes of the reads, as chosen by a chunk_policy.
+    Filled by the downloaders and the helpers' download functions as they go.
+
+metrics_recorder:
+    Hands out a transfer_metrics per download, and, as each finishes,
+    appends it as a JSON line to a file,
+    and keeps the totals per host, which it writes as a Prometheus
+    textfile-collector file (e.g. for node_exporter's --collector.textfile.directory).
+    Also records how long finding the videos took,
+    and tells what is being downloaded right now (e.g. for progress.py).
+
+cause_of:
+    The cause of a failure, as a label: the HTTP status or the error's type.
+
+"""
+
+import json
+import os
+import pathlib
+import threading
+import time
+
+import retry_policy
+
+# The peak throughput is the highest over windows of this many seconds.
+PEAK_WINDOW:float = 1.0
+# The Prometheus file is written at most this often while running,
+# and once more when the recorder is closed.
+PROMETHEUS_INTERVAL:float = 10.0
+PROMETHEUS_PREFIX:str = "mitocw_lv_dl_"
+
+
+def cause_of(error: Exception) -> str:
+    """
+    Returns
+    -------
+    The HTTP status of error, e.g. "503",
+    or the name of its type if it is not about an HTTP response,
+    e.g. "ConnectionError".
+    """
+    (status, _) = retry_policy.status_and_headers(error)
+    if status is not None:
+        return str(status)
+    return type(error).__name__
+
+
+class transfer_metrics:
+    """
+    Thread-safe, as a file downloaded in segments
+    is written by several threads at once.
+
+    Invariant:
+        Times are from time.monotonic(), but read_seconds and write_seconds,
+        which are sums of time.perf_counter() differences.
+    """
+
+    def __init__(self, url: str, title: str):
+        self.url = url
+        self.host:str = retry_policy.host_of(url)
+        self.title = title
+
+        self._lock = threading.Lock()
+        self.started:float = time.monotonic()
+        self.first_byte:float|None = None
+        self.finished:float|None = None
+        self.ok:bool|None = None
+
+        self.num_bytes:int = 0
+        # The size of the file when complete, if known.
+        self.expected:int|None = None
+        self.read_seconds:float = 0.0
+        self.write_seconds:float = 0.0
+        # { size asked for : number of reads }, and the last size asked for.
+        self.chunk_sizes:dict = dict()
+        self.chunk_size:int|None = None
+
+        self.num_failures:int = 0
+        self.num_retries:int = 0
+        # { cause : number of failures }
+        self.causes:dict = dict()
+
+        self._window_start:float = self.started
+        self._window_bytes:int = 0
+        self.peak_rate:float = 0.0
+        # { part : bytes so far } and { part : size } reported by on_progress.
+        self._parts:dict = dict()
+        self._part_sizes:dict = dict()
+
+    def on_response(self, expected: int|None) -> None:
+        """
+        Called when the server has told the size of the complete file,
+        or that it does not tell.
+        """
+        with self._lock:
+            self.expected = expected
+
+    def __add(self, num_bytes: int) -> None:
+        # Must hold the lock.
+        now = time.monotonic()
+        if self.first_byte is None and num_bytes > 0:
+            self.first_byte = now
+        self.num_bytes += num_bytes
+        self._window_bytes += num_bytes
+        if now - self._window_start >= PEAK_WINDOW:
+            self.peak_rate = max(self.peak_rate, self._window_bytes / (now - self._window_start))
+            self._window_start = now
+            self._window_bytes = 0
+
+    def on_chunk(
+        self, num_bytes: int, read_seconds: float, write_seconds: float,
+        chunk_size: int|None = None
+    ) -> None:
+        """
+        Called for each chunk read from the network and written to the disk,
+        with the seconds each took, and the size the read asked for if known.
+        """
+        with self._lock:
+            self.__add(num_bytes)
+            self.read_seconds += read_seconds
+            self.write_seconds += write_seconds
+            if chunk_size is not None:
+                self.chunk_sizes[chunk_size] = self.chunk_sizes.get(chunk_size, 0) + 1
+                self.chunk_size = chunk_size
+
+    def on_progress(self, part: str, num_bytes: int, expected: int|None = None) -> None:
+        """
+        Called by a downloader that only tells how far it has got,
+        e.g. yt-dlp's progress hooks.
+
+        Parameters
+        ----------
+        part: str
+            which file num_bytes is about,
+            as yt-dlp may download the video and the audio separately.
+        num_bytes: int
+            of part so far.
+        expected: int
+            size of part, if known.
+        """
+        with self._lock:
+            self.__add(max(num_bytes - self._parts.get(part, 0), 0))
+            self._parts[part] = max(num_bytes, self._parts.get(part, 0))
+            if expected is not None:
+                self._part_sizes[part] = expected
+                self.expected = sum(self._part_sizes.values())
+
+    def on_failure(self, error: Exception, retried: bool) -> None:
+        with self._lock:
+            self.num_failures += 1
+            self.num_retries += retried
+            cause = cause_of(error)
+            self.causes[cause] = self.causes.get(cause, 0) + 1
+
+    def finish(self, ok: bool) -> None:
+        with self._lock:
+            self.ok = ok
+            self.finished = time.monotonic()
+
+    def seconds(self) -> float:
+        return (self.finished if self.finished is not None else time.monotonic()) - self.started
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            seconds = self.seconds()
+            avg_rate = self.num_bytes / seconds if seconds > 0 else None
+            return {
+                "type": "transfer",
+                "time": time.time(),
+                "url": self.url,
+                "host": self.host,
+                "title": self.title,
+                "ok": self.ok,
+                "bytes": self.num_bytes,
+                "expected_bytes": self.expected,
+                "seconds": seconds,
+                "ttfb_seconds": self.first_byte - self.started \
+                    if self.first_byte is not None else None,
+                "avg_bytes_per_second": avg_rate,
+                # A transfer shorter than a window peaks at its average.
+                "peak_bytes_per_second": max(self.peak_rate, avg_rate or 0.0),
+                "read_seconds": self.read_seconds,
+                "write_seconds": self.write_seconds,
+                # JSON keys are strings.
+                "chunk_sizes": { str(k) : v for (k, v) in sorted(self.chunk_sizes.items()) },
+                "last_chunk_size": self.chunk_size,
+                "failures": self.num_failures,
+                "retries": self.num_retries,
+                "causes": dict(self.causes),
+            }
+
+
+def _labels(**labels) -> str:
+    if len(labels) == 0:
+        return ""
+    escaped = (
+        str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        for v in labels.values()
+    )
+    return "{" + ",".join(f'{k}="{v}"' for (k, v) in zip(labels.keys(), escaped)) + "}"
+
+
+class metrics_recorder:
+    """
+    Thread-safe. Shared by all the downloads of a run,
+    e.g. as video_downloader.metrics.
+    """
+
+    def __init__(
+        self,
+        jsonl_path: pathlib.Path|None = None,
+        prometheus_path: pathlib.Path|None = None
+    ):
+        """
+        Parameters
+        ----------
+        jsonl_path: Path
+            file the JSON lines are appended to, one per transfer or parse.
+        prometheus_path: Path
+            file the totals are written to in Prometheus' text format.
+            It is replaced atomically, as the textfile collector requires.
+        Either may be None, to only measure (e.g. for the progress).
+        """
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+
+        self._lock = threading.Lock()
+        self._jsonl = open(jsonl_path, 'a') if jsonl_path is not None else None
+        self._active:set = set()
+        self._last_prometheus:float = 0.0
+
+        # Totals for Prometheus.
+        # { (host, result) : number of transfers }
+        self._transfers:dict = dict()
+        # { host : [bytes, seconds, ttfb seconds, ttfb count, read seconds,
+        #           write seconds, peak bytes per second] }
+        self._hosts:dict = dict()
+        # { (host, cause) : number of failures }
+        self._causes:dict = dict()
+        # { host : number of failures tried again }
+        self._retries:dict = dict()
+        # { (course, way) : [seconds, seconds to the first video, videos] }
+        self._parses:dict = dict()
+        # Of all the transfers finished: [bytes, sum of the sizes known,
+        # number of the sizes known], see snapshot().
+        self._finished:list = [0, 0, 0]
+
+    def start(self, url: str, title: str) -> transfer_metrics:
+        transfer = transfer_metrics(url, title)
+        with self._lock:
+            self._active.add(transfer)
+        return transfer
+
+    def active(self) -> list:
+        """
+        Returns
+        -------
+        The transfers started and not yet finished.
+        """
+        with self._lock:
+            return list(self._active)
+
+    def snapshot(self) -> tuple:
+        """
+        Returns
+        -------
+        (the transfers started and not yet finished,
+        bytes of the transfers finished,
+        sum of the expected sizes of the transfers finished whose size was known,
+        number of these transfers),
+        all at the same moment, so that no bytes are counted twice or missed.
+        """
+        with self._lock:
+            return (list(self._active), *self._finished)
+
+    def finish(self, transfer: transfer_metrics, ok: bool) -> None:
+        transfer.finish(ok)
+        d:dict = transfer.to_dict()
+        with self._lock:
+            self._active.discard(transfer)
+            self._finished[0] += d["bytes"]
+            if d["expected_bytes"] is not None:
+                self._finished[1] += d["expected_bytes"]
+                self._finished[2] += 1
+
+            key = (d["host"], "ok" if ok else "failed")
+            self._transfers[key] = self._transfers.get(key, 0) + 1
+            h:list = self._hosts.setdefault(d["host"], [0, 0.0, 0.0, 0, 0.0, 0.0, 0.0])
+            h[0] += d["bytes"]
+            h[1] += d["seconds"]
+            if d["ttfb_seconds"] is not None:
+                h[2] += d["ttfb_seconds"]
+                h[3] += 1
+            h[4] += d["read_seconds"]
+            h[5] += d["write_seconds"]
+            h[6] = max(h[6], d["peak_bytes_per_second"])
+            for (cause, n) in d["causes"].items():
+                self._causes[(d["host"], cause)] = self._causes.get((d["host"], cause), 0) + n
+            self._retries[d["host"]] = self._retries.get(d["host"], 0) + d["retries"]
+
+            self.__write_line(d)
+        self.__maybe_write_prometheus()
+
+    def timed_parse(self, videos, course: str, way: str):
+        """
+        Yields the videos of a course's iter_videos,
+        recording how long they took to find, in total and to the first,
+        once all of them have been yielded.
+        """
+        started = time.monotonic()
+        first:float|None = None
+        num_videos:int = 0
+        for v in videos:
+            if first is None:
+                first = time.monotonic()
+            num_videos += 1
+            yield v
+        seconds = time.monotonic() - started
+
+        with self._lock:
+            self._parses[(course, way)] = [
+                seconds, (first - started) if first is not None else None, num_videos
+            ]
+            self.__write_line({
+                "type": "parse",
+                "time": time.time(),
+                "course": course,
+                "way": way,
+                "seconds": seconds,
+                "first_video_seconds": self._parses[(course, way)][1],
+                "videos": num_videos,
+            })
+        self.__maybe_write_prometheus()
+
+    def __write_line(self, d: dict) -> None:
+        # Must hold the lock.
+        if self._jsonl is not None:
+            self._jsonl.write(json.dumps(d) + "\n")
+            self._jsonl.flush()
+
+    def __maybe_write_prometheus(self) -> None:
+        if self.prometheus_path is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_prometheus < PROMETHEUS_INTERVAL:
+                return
+            self._last_prometheus = now
+        self.write_prometheus()
+
+    def prometheus_text(self) -> str:
+        """
+        Returns
+        -------
+        The totals so far in Prometheus' text exposition format.
+        """
+        lines:list = []
+
+        def metric(name: str, kind: str, help: str, samples: list) -> None:
+            # Each sample is (labels, value), or (suffix, labels, value)
+            # for the series of a summary, e.g. _sum and _count.
+            lines.append(f"# HELP {PROMETHEUS_PREFIX}{name} {help}")
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}{name} {kind}")
+            for sample in samples:
+                (suffix, labels, value) = sample if len(sample) == 3 else ("", *sample)
+                lines.append(f"{PROMETHEUS_PREFIX}{name}{suffix}{_labels(**labels)} {value}")
+
+        with self._lock:
+            hosts = sorted(self._hosts.items())
+            metric("transfers_total", "counter", "Transfers finished.", [
+                ({ "host": h, "result": r }, n) for ((h, r), n) in sorted(self._transfers.items())
+            ])
+            metric("transfer_bytes_total", "counter", "Bytes downloaded.", [
+                ({ "host": h }, v[0]) for (h, v) in hosts
+            ])
+            metric("transfer_seconds_total", "counter", "Seconds spent in transfers.", [
+                ({ "host": h }, v[1]) for (h, v) in hosts
+            ])
+            # A summary without quantiles: the total and the number of transfers
+            # that have had a first byte, whose ratio is the average.
+            metric("ttfb_seconds", "summary",
+                "Seconds from the start of transfers to their first byte.", [
+                sample for (h, v) in hosts
+                for sample in (("_sum", { "host": h }, v[2]), ("_count", { "host": h }, v[3]))
+            ])
+            metric("network_read_seconds_total", "counter", "Seconds spent reading the network.", [
+                ({ "host": h }, v[4]) for (h, v) in hosts
+            ])
+            metric("disk_write_seconds_total", "counter", "Seconds spent writing the disk.", [
+                ({ "host": h }, v[5]) for (h, v) in hosts
+            ])
+            metric("peak_bytes_per_second", "gauge", "Highest throughput of a transfer.", [
+                ({ "host": h }, v[6]) for (h, v) in hosts
+            ])
+            metric("failures_total", "counter", "Failed requests, by cause.", [
+                ({ "host": h, "cause": c }, n) for ((h, c), n) in sorted(self._causes.items())
+            ])
+            metric("retries_total", "counter", "Failed requests tried again.", [
+                ({ "host": h }, n) for (h, n) in sorted(self._retries.items())
+            ])
+            parses = sorted(self._parses.items())
+            metric("parse_seconds", "gauge", "Seconds to find all the videos.", [
+                ({ "course": c, "way": w }, v[0]) for ((c, w), v) in parses
+            ])
+            metric("parse_first_video_seconds", "gauge", "Seconds to find the first video.", [
+                ({ "course": c, "way": w }, v[1]) for ((c, w), v) in parses if v[1] is not None
+            ])
+            metric("parse_videos", "gauge", "Videos found.", [
+                ({ "course": c, "way": w }, v[2]) for ((c, w), v) in parses
+            ])
+        metric("last_write_timestamp_seconds", "gauge", "When this file was written.", [
+            ({}, time.time())
+        ])
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self) -> None:
+        if self.prometheus_path is None:
+            return
+        # The collector must never read half a file.
+        tmp_path = self.prometheus_path.with_name(
+            self.prometheus_path.name + f".{os.getpid()}.tmp"
+        )
+        tmp_path.write_text(self.prometheus_text())
+        os.replace(tmp_path, self.prometheus_path)
+
+    def close(self) -> None:
+        self.write_prometheus()
+        with self._lock:
+            if self._jsonl is not None:
+                self._jsonl.close()
+                self._jsonl = None
@@ -0,0 +1,208 @@
+"""
+parse_cache.py keeps the video maps of a course on disk,
+so that a rerun on an unchanged static bundle does not parse it again.
+
+parse_cache:
+    Wraps course.populate_video_maps_lists and course.iter_videos.
+    An entry is keyed by the course class, the video types,
+    the downloader type and the static path,
+    and is valid as long as every html file read to make it is unchanged:
+    same mtime and size, or, failing that, same hash,
+    and every directory listed to make it still has the same names.
+    Entries are evicted by age and by the total size of the cache.
+
+"""
+
+import hashlib
+import json
+import os
+import pathlib
+import time
+
+from courses import course
+from courses import helpers
+
+# Bump it whenever the way of retrieving information changes,
+# so that the old entries are no longer used.
+CACHE_VERSION:int = 2
+
+
+def default_cache_dir() -> pathlib.Path:
+    base = os.environ.get("XDG_CACHE_HOME")
+    if base is None or base == "":
+        base = pathlib.Path.home() / ".cache"
+    return pathlib.Path(base) / "mitocw_lv_dl"
+
+
+def hash_file(path: pathlib.Path) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024*1024), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class parse_cache:
+
+    # Entries not used for this long are evicted.
+    DEF_MAX_AGE:float = 30*24*3600.0
+    # The oldest entries are evicted until the cache is no bigger than this.
+    DEF_MAX_SIZE:int = 64*1024*1024
+
+    def __init__(
+        self,
+        cache_dir: pathlib.Path|None = None,
+        max_age: float = DEF_MAX_AGE,
+        max_size: int = DEF_MAX_SIZE
+    ):
+        """
+        Parameters
+        ----------
+        cache_dir: Path
+            where the entries are stored.
+            By default, $XDG_CACHE_HOME/mitocw_lv_dl.
+        max_age: float
+            in seconds.
+        max_size: int
+            in bytes.
+        """
+        self.cache_dir = cache_dir if cache_dir is not None else default_cache_dir()
+        self.max_age = max_age
+        self.max_size = max_size
+
+    def __entry_path(self, way: course.course, types) -> pathlib.Path:
+        key = json.dumps([
+            CACHE_VERSION,
+            type(way).__module__ + '.' + type(way).__qualname__,
+            sorted(types),
+            way.downloader_type,
+            pathlib.Path(way.res_path).absolute().as_posix()
+        ])
+        return self.cache_dir / (hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+    def __is_valid(self, files: list) -> bool:
+        """
+        Parameters
+        ----------
+        files: list
+            of [path, mtime_ns, size, sha256] of an entry.
+            Updates the mtime and size of a file whose hash is unchanged.
+        """
+        for f in files:
+            (path, mtime_ns, size, sha) = f
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return False
+            if stat.st_mtime_ns == mtime_ns and stat.st_size == size:
+                continue
+            # Touched but maybe not changed, e.g. extracted again.
+            if stat.st_size != size or hash_file(path) != sha:
+                return False
+            f[1] = stat.st_mtime_ns
+        return True
+
+    def __is_listing_valid(self, listings: dict) -> bool:
+        """
+        Parameters
+        ----------
+        listings: dict
+            of the path of each directory listed to its sorted names,
+            of an entry.
+        """
+        for (path, names) in listings.items():
+            try:
+                if sorted(os.listdir(path)) != names:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def populate_video_maps_lists(
+        self, way: course.course, types, verbose: bool = False
+    ) -> dict:
+        """
+        Same as way.populate_video_maps_lists(types, verbose),
+        but from the cache if its entry is valid.
+        """
+        return course.course.video_maps_of(self.iter_videos(way, types, verbose), types)
+
+    def iter_videos(self, way: course.course, types, verbose: bool = False):
+        """
+        Same as way.iter_videos(types, verbose),
+        but from the cache if its entry is valid.
+        The entry is only stored once every video has been yielded.
+        """
+        entry_path = self.__entry_path(way, types)
+
+        video_maps:dict|None = None
+        try:
+            with open(entry_path, 'r') as f:
+                entry:dict = json.load(f)
+            if self.__is_valid(entry["files"]) and self.__is_listing_valid(entry["listings"]):
+                if verbose:
+                    print(f"Using the video maps cached in {entry_path}")
+                self.__store(entry_path, entry)
+                video_maps = entry["video_maps"]
+        except (OSError, ValueError, KeyError):
+            # Missing or corrupt. Just parse again.
+            pass
+        if video_maps is not None:
+            yield from course.course.videos_of(video_maps)
+            return
+
+        videos:list = []
+        record = helpers.reads_record()
+        # Only what the course reads for each video, not what is read
+        # while the video is out (e.g. by the other courses of a batch).
+        it = way.iter_videos(types, verbose)
+        while True:
+            with helpers.recording_reads(record):
+                v = next(it, None)
+            if v is None:
+                break
+            videos.append(v)
+            yield v
+        video_maps = course.course.video_maps_of(videos, types)
+
+        files:list = []
+        for p in sorted(record.paths):
+            stat = os.stat(p)
+            files.append([p.absolute().as_posix(), stat.st_mtime_ns, stat.st_size, hash_file(p)])
+        self.__store(entry_path, {
+            "files": files, "listings": record.listings, "video_maps": video_maps
+        })
+        self.evict()
+
+    def __store(self, entry_path: pathlib.Path, entry: dict) -> None:
+        # Written to a temporary file first,
+        # so that a concurrent run never reads half an entry.
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = entry_path.with_name(entry_path.name + f".{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, entry_path)
+
+    def evict(self) -> None:
+        """
+        Removes the entries older than max_age,
+        then the oldest ones until the cache is no bigger than max_size.
+        An entry gets younger each time it is used.
+        """
+        entries:list = []
+        for p in self.cache_dir.glob("*.json"):
+            try:
+                stat = p.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, p))
+        # Youngest first.
+        entries.sort(reverse=True)
+
+        now = time.time()
+        total:int = 0
+        for (mtime, size, p) in entries:
+            if now - mtime > self.max_age or total + size > self.max_size:
+                p.unlink(missing_ok=True)
+            else:
+                total += size
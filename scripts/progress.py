@@ -0,0 +1,332 @@
+"""
+progress.py shows how a whole run is going in one place,
+instead of a line printed by each download as it goes.
+
+progress_view:
+    On a terminal, redraws at most every TTY_INTERVAL seconds
+    a bar for each file being downloaded, and under them a line with
+    the numbers of videos done, skipped and failed, the total rate
+    and an ETA. Whatever else is printed meanwhile is written above the bars.
+    Otherwise (e.g. into a log), prints that line every LINE_INTERVAL seconds.
+
+format_bytes, format_seconds:
+    Short human readable sizes and durations, e.g. 12.3MiB and 1m05s.
+
+"""
+
+import math
+import shutil
+import sys
+import threading
+import time
+
+import metrics
+import scheduler
+
+# Seconds between two redraws on a terminal,
+# so that drawing never costs more than a little of a core.
+TTY_INTERVAL:float = 0.25
+# Seconds between two lines when the output is not a terminal.
+LINE_INTERVAL:float = 10.0
+# The rate is measured at least this often, whatever the interval.
+SAMPLE_INTERVAL:float = 1.0
+# Seconds the moving average of the rate mostly covers.
+# Long enough not to jump with every chunk, short enough to follow a throttling.
+RATE_WINDOW:float = 5.0
+# At most this many bars are drawn; the other files are only counted.
+MAX_BARS:int = 10
+BAR_WIDTH:int = 20
+
+# ANSI escapes: to the start of the line n lines up, and to clear below the cursor.
+_UP:str = "\x1b[{n}F"
+_CLEAR_BELOW:str = "\x1b[J"
+
+
+def format_bytes(num_bytes: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if num_bytes < 1024:
+            return f"{num_bytes:.0f}{unit}" if unit == "B" else f"{num_bytes:.1f}{unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.2f}GiB"
+
+
+def format_seconds(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+
+
+class progress_view:
+    """
+    Thread-safe. Reads the transfers of a metrics_recorder,
+    and is told the result of each video by scheduler.run_jobs.
+    Draws from a thread of its own between start() and stop(),
+    so the downloads never wait for it.
+    """
+
+    def __init__(
+        self,
+        recorder: metrics.metrics_recorder,
+        out=None,
+        interval: float|None = None
+    ):
+        """
+        Parameters
+        ----------
+        recorder: metrics_recorder
+            shared by the downloads, as their downloader.metrics.
+        out:
+            the stream drawn on, by default sys.stdout.
+            It is taken as a terminal iff out.isatty().
+        interval: float
+            seconds between two redraws or lines,
+            by default TTY_INTERVAL on a terminal and LINE_INTERVAL otherwise.
+        """
+        self.recorder = recorder
+        self.out = out if out is not None else sys.stdout
+        self.is_tty:bool = hasattr(self.out, "isatty") and self.out.isatty()
+        self.interval:float = interval if interval is not None else \
+            TTY_INTERVAL if self.is_tty else LINE_INTERVAL
+
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread:threading.Thread|None = None
+        self._started:float = time.monotonic()
+
+        # { result : number of videos }
+        self._counts:dict = { r : 0 for r in scheduler.RESULTS }
+        # Number of videos found so far, and whether that is all of them.
+        self._num_found:int = 0
+        self._all_found:bool = False
+
+        # The moving average of the total rate, and when and at how many bytes
+        # it was last measured.
+        self._rate:float|None = None
+        self._last_sample:tuple = (self._started, 0)
+        self._last_draw:float = 0.0
+        # Lines of the bars on the terminal now, and the part of a line
+        # printed by someone else whose end has not been printed yet.
+        self._num_drawn:int = 0
+        self._pending:str = ""
+        self._stdout = None
+
+    def count_jobs(self, jobs):
+        """
+        Yields the jobs, counting them, so that the ETA
+        can include the videos not yet started.
+        """
+        for j in jobs:
+            with self._lock:
+                self._num_found += 1
+            yield j
+        with self._lock:
+            self._all_found = True
+
+    def on_result(self, job: scheduler.download_job, result: str) -> None:
+        """
+        To be given to scheduler.run_jobs.
+        """
+        with self._lock:
+            self._counts[result] = self._counts.get(result, 0) + 1
+
+    def start(self) -> None:
+        """
+        Starts drawing. On a terminal, sys.stdout is replaced until stop(),
+        so that what is printed goes above the bars.
+        """
+        self._started = time.monotonic()
+        self._last_sample = (self._started, 0)
+        if self.is_tty and self.out is sys.stdout:
+            self._stdout = sys.stdout
+            sys.stdout = _above(self)
+        self._thread = threading.Thread(target=self.__run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops drawing, erases the bars and prints the line a last time.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            if self._stdout is not None:
+                sys.stdout = self._stdout
+                self._stdout = None
+            self.__sample(time.monotonic())
+            self.__erase()
+            self.__flush_pending()
+            self.out.write(self.__status_line(final=True) + "\n")
+            self.out.flush()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def __run(self) -> None:
+        tick:float = min(self.interval, SAMPLE_INTERVAL)
+        while not self._stop.wait(tick):
+            now = time.monotonic()
+            with self._lock:
+                self.__sample(now)
+                if now - self._last_draw < self.interval:
+                    continue
+                self._last_draw = now
+                if self.is_tty:
+                    self.__draw()
+                else:
+                    self.out.write(self.__status_line() + "\n")
+                self.out.flush()
+
+    def __bytes_so_far(self) -> tuple:
+        """
+        Returns
+        -------
+        (the transfers active, total bytes downloaded, sum of the sizes known
+        of the transfers finished, number of these sizes)
+        """
+        (active, num_bytes, sizes, num_sizes) = self.recorder.snapshot()
+        return (active, num_bytes + sum(t.num_bytes for t in active), sizes, num_sizes)
+
+    def __sample(self, now: float) -> None:
+        # Must hold the lock.
+        (_, num_bytes, _, _) = self.__bytes_so_far()
+        (last_time, last_bytes) = self._last_sample
+        seconds = now - last_time
+        if seconds <= 0:
+            return
+        rate = max(num_bytes - last_bytes, 0) / seconds
+        # Weighted by the time since the last sample,
+        # so that the average is the same however often it is measured.
+        alpha = 1 - math.exp(-seconds / RATE_WINDOW)
+        self._rate = rate if self._rate is None else self._rate + alpha * (rate - self._rate)
+        self._last_sample = (now, num_bytes)
+
+    def eta(self) -> tuple:
+        """
+        Returns
+        -------
+        (seconds left, or None if they can not be told yet,
+        whether that is only a lower bound, as some sizes are not known yet).
+
+        The bytes left are those of the files being downloaded whose size is known,
+        and, for the videos found but not started,
+        the average size of the files whose size is known.
+        They are divided by the moving average of the total rate.
+        """
+        with self._lock:
+            (active, _, sizes, num_sizes) = self.__bytes_so_far()
+            left:float = 0
+            partial:bool = not self._all_found
+            for t in active:
+                if t.expected is None:
+                    partial = True
+                    continue
+                left += max(t.expected - t.num_bytes, 0)
+                sizes += t.expected
+                num_sizes += 1
+            num_waiting:int = self._num_found - sum(self._counts.values()) - len(active)
+            if num_waiting > 0:
+                if num_sizes == 0:
+                    return (None, True)
+                left += num_waiting * sizes / num_sizes
+            if left == 0:
+                return (0.0, partial)
+            if self._rate is None or self._rate <= 0:
+                return (None, partial)
+            return (left / self._rate, partial)
+
+    def __status_line(self, final: bool = False) -> str:
+        # Must hold the lock.
+        (active, num_bytes, _, _) = self.__bytes_so_far()
+        elapsed = time.monotonic() - self._started
+        # Short enough for a terminal of 80 columns.
+        counts = " ".join(f"{n} {r}" for (r, n) in self._counts.items())
+        found = f"{self._num_found}" + ("" if self._all_found else "+")
+        if final:
+            rate = num_bytes / elapsed if elapsed > 0 else 0
+            return f"[{format_seconds(elapsed)}] {counts} of {found} | " + \
+                f"{format_bytes(num_bytes)} at {format_bytes(rate)}/s"
+        (eta, partial) = self.eta()
+        return f"[{format_seconds(elapsed)}] {counts} {len(active)} active of {found} | " + \
+            f"{format_bytes(num_bytes)} {format_bytes(self._rate or 0)}/s ETA " + \
+            ("?" if eta is None else format_seconds(eta) + ("+" if partial else ""))
+
+    def __bar_line(self, t: metrics.transfer_metrics, width: int) -> str:
+        if t.expected:
+            done = min(t.num_bytes / t.expected, 1.0)
+            filled = int(done * BAR_WIDTH)
+            head = f"[{'#' * filled}{'.' * (BAR_WIDTH - filled)}] {done * 100:3.0f}% " + \
+                f"{format_bytes(t.num_bytes)}/{format_bytes(t.expected)}"
+        else:
+            head = f"[{'?' * BAR_WIDTH}]      {format_bytes(t.num_bytes)}"
+        seconds = t.seconds()
+        head += f" {format_bytes(t.num_bytes / seconds if seconds > 0 else 0)}/s "
+        return (head + t.title)[:width]
+
+    def __draw(self) -> None:
+        # Must hold the lock.
+        width:int = shutil.get_terminal_size().columns - 1
+        active = sorted(self.recorder.active(), key=lambda t: t.started)
+        lines:list = [self.__bar_line(t, width) for t in active[:MAX_BARS]]
+        if len(active) > MAX_BARS:
+            lines.append(f"... and {len(active) - MAX_BARS} more")
+        lines.append(self.__status_line()[:width])
+        self.__erase()
+        self.out.write("".join(l + "\n" for l in lines))
+        self._num_drawn = len(lines)
+
+    def __erase(self) -> None:
+        # Must hold the lock.
+        if self.is_tty and self._num_drawn > 0:
+            self.out.write(_UP.format(n=self._num_drawn) + _CLEAR_BELOW)
+        self._num_drawn = 0
+
+    def __flush_pending(self) -> None:
+        # Must hold the lock.
+        if self._pending != "":
+            self.out.write(self._pending + "\n")
+            self._pending = ""
+
+    def _write_above(self, text: str) -> None:
+        """
+        Writes the complete lines of text above the bars,
+        and keeps the rest until its line is complete,
+        so that a bar is never drawn in the middle of a line.
+        """
+        with self._lock:
+            (lines, _, self._pending) = (self._pending + text).rpartition("\n")
+            if lines == "" and not text.endswith("\n"):
+                return
+            self.__erase()
+            self.out.write(lines + "\n")
+            self.out.flush()
+
+
+class _above:
+    """
+    Stands for sys.stdout while a progress_view draws on a terminal.
+    """
+
+    def __init__(self, view: progress_view):
+        self._view = view
+        self._out = view.out
+
+    def write(self, text: str) -> int:
+        self._view._write_above(text)
+        return len(text)
+
+    def flush(self) -> None:
+        self._out.flush()
+
+    def isatty(self) -> bool:
+        return True
+
+    def __getattr__(self, name: str):
+        return getattr(self._out, name)
@@ -0,0 +1,228 @@
+"""
+rate_limiter.py caps the total bandwidth of all the downloads of a run.
+
+rate_limiter:
+    A token bucket shared by every transfer at the same time,
+    whose rate follows a schedule over the time of day,
+    e.g. 2MiB/s during business hours and unlimited at night.
+    A transfer that can not take from the bucket (e.g. a yt-dlp process)
+    reserves the share of one worker instead.
+
+parse_schedule:
+    Parses such a schedule from the command line.
+
+"""
+
+import contextlib
+import datetime
+import threading
+import time
+
+# Suffixes of rates, in bytes per second.
+RATE_UNITS = { "K": 1024, "M": 1024**2, "G": 1024**3 }
+UNLIMITED:str = "unlimited"
+
+
+def parse_rate(text: str) -> float|None:
+    """
+    Parameters
+    ----------
+    text: str
+        a rate in bytes per second, e.g. 1048576, 500K, 2M, 1.5G,
+        or "unlimited".
+
+    Returns
+    -------
+    The rate in bytes per second, or None if unlimited.
+
+    Raises
+    ------
+    ValueError
+        if text is not a rate.
+    """
+    text = text.strip()
+    if text == UNLIMITED:
+        return None
+    factor:int = 1
+    if len(text) > 0 and text[-1].upper() in RATE_UNITS:
+        factor = RATE_UNITS[text[-1].upper()]
+        text = text[:-1]
+    rate:float = float(text) * factor
+    if rate <= 0:
+        raise ValueError("A rate must be positive.")
+    return rate
+
+
+def parse_time(text: str) -> datetime.time:
+    (h, m) = text.strip().split(':')
+    return datetime.time(int(h), int(m))
+
+
+def parse_schedule(text: str) -> list:
+    """
+    Parameters
+    ----------
+    text: str
+        entries separated by comma. Each entry is either
+            HH:MM-HH:MM=RATE
+        which applies RATE from the first time until the second,
+        possibly over midnight, or
+            RATE
+        which applies whenever no other entry does.
+        See parse_rate for RATE.
+        For example, "09:00-18:00=2M,unlimited".
+
+    Returns
+    -------
+    list of (start, end, rate), where start and end are datetime.time,
+    or are None for the default entry,
+    and rate is as returned by parse_rate.
+    The default entry, if any, is the last.
+
+    Raises
+    ------
+    ValueError
+        if text is not a schedule.
+    """
+    ret:list = []
+    default:tuple|None = None
+
+    for entry in text.split(','):
+        if '=' in entry:
+            (span, rate) = entry.split('=', 1)
+            (start, end) = span.split('-', 1)
+            ret.append((parse_time(start), parse_time(end), parse_rate(rate)))
+        else:
+            if default is not None:
+                raise ValueError("A schedule can have only one default rate.")
+            default = (None, None, parse_rate(entry))
+
+    if default is not None:
+        ret.append(default)
+    return ret
+
+
+class rate_limiter:
+    """
+    Thread-safe. A transfer asks delay() for each chunk it reads,
+    and sleeps that long, with either time.sleep or asyncio.sleep.
+    One that can only be given a fixed cap runs within reserve() instead.
+
+    Invariant:
+        Over any second, the transfers get at most about
+        the current rate of bytes in total, plus a burst of one second:
+        those of the bucket get what the reservations leave.
+    """
+
+    def __init__(self, schedule: list, num_workers: int = 1):
+        """
+        Parameters
+        ----------
+        schedule: list
+            returned by parse_schedule.
+            A time not covered by any entry is unlimited.
+        num_workers: int
+            number of videos downloaded at the same time,
+            each of which may reserve 1 / num_workers of the rate.
+        """
+        if num_workers < 1:
+            raise ValueError("The number of workers must be positive.")
+        self.schedule = schedule
+        self.num_workers = num_workers
+
+        self._lock = threading.Lock()
+        # Tokens are bytes. They may go negative,
+        # which is the debt the next transfers wait for.
+        self._tokens:float = 0.0
+        self._last:float = time.monotonic()
+        # Number of transfers going on, and of those within reserve().
+        self._num_transfers:int = 0
+        self._num_reserved:int = 0
+
+    def rate_now(self) -> float|None:
+        """
+        Returns
+        -------
+        The rate in bytes per second at this time of the day,
+        or None if unlimited.
+        """
+        now = datetime.datetime.now().time()
+        for (start, end, rate) in self.schedule:
+            if start is None:
+                return rate
+            if start <= end:
+                if start <= now < end:
+                    return rate
+            elif now >= start or now < end:
+                # Over midnight.
+                return rate
+        return None
+
+    def delay(self, num_bytes: int) -> float:
+        """
+        Takes num_bytes from the bucket.
+
+        Returns
+        -------
+        The number of seconds to wait before using them.
+        """
+        rate = self.rate_now()
+        with self._lock:
+            now = time.monotonic()
+            if rate is None:
+                self._tokens = 0.0
+                self._last = now
+                return 0.0
+
+            # What the reservations leave, so that they add up to the rate.
+            left:float = rate * max(self.num_workers - self._num_reserved, 0) / self.num_workers
+            # Refill, up to a burst of one second.
+            self._tokens = min(self._tokens + (now - self._last) * left, left)
+            self._last = now
+            self._tokens -= num_bytes
+            if self._tokens >= 0:
+                return 0.0
+            # With every worker reserved, nothing refills the bucket
+            # until a reservation ends, which leaves at least one share.
+            # The debt grows meanwhile, and so do the next delays.
+            return -self._tokens / max(left, rate / self.num_workers)
+
+    def wait(self, num_bytes: int) -> None:
+        time.sleep(self.delay(num_bytes))
+
+    @contextlib.contextmanager
+    def transfer(self):
+        """
+        Counts a transfer as going on until the context exits.
+        """
+        with self._lock:
+            self._num_transfers += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._num_transfers -= 1
+
+    @contextlib.contextmanager
+    def reserve(self):
+        """
+        Takes the share of one worker out of the bucket until the context exits,
+        for a transfer that can only be given a fixed cap
+        (e.g. yt-dlp's --limit-rate) and can not take from the bucket.
+        Counts as a transfer going on, too.
+
+        Yields
+        ------
+        The cap: the current rate / num_workers, or None if unlimited.
+        The cap does not follow the schedule after that,
+        so a transfer that starts unlimited stays so.
+        """
+        rate = self.rate_now()
+        with self.transfer():
+            with self._lock:
+                self._num_reserved += 1
+            try:
+                yield None if rate is None else rate / self.num_workers
+            finally:
+                with self._lock:
+                    self._num_reserved -= 1
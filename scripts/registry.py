@@ -0,0 +1,117 @@
+"""
+registry.py finds the courses and the downloaders by their ids,
+and imports only the ones that are used,
+so that starting up does not grow with the number of courses.
+
+registry:
+    Maps ids to "module:attribute" import paths, imported on first use.
+    More ids come from the entry points of installed packages,
+    which are only looked up for an id that is not built in, or to list all ids.
+
+COURSES:
+    The registry of course ids, e.g. "18.065-2018", to the courses' my_info.
+    Third-party courses register in the entry point group COURSES_GROUP.
+
+DOWNLOADERS:
+    The registry of downloader ids, e.g. "300k", to the downloader classes.
+    Third-party downloaders register in the entry point group DOWNLOADERS_GROUP.
+
+"""
+
+import importlib
+
+COURSES_GROUP:str = "mitocw_lv_dl.courses"
+DOWNLOADERS_GROUP:str = "mitocw_lv_dl.downloaders"
+
+
+def load(path: str):
+    """
+    Parameters
+    ----------
+    path: str
+        "module:attribute", e.g. "courses.c18065y2018:my_info".
+
+    Returns
+    -------
+    The attribute, after importing the module.
+    """
+    (module_name, attr) = path.split(':', 1)
+    return getattr(importlib.import_module(module_name), attr)
+
+
+class registry:
+    """
+    Behaves like a read-only dict of id to the object,
+    which is imported when it is first got.
+    """
+
+    def __init__(self, group: str, builtins: dict):
+        """
+        Parameters
+        ----------
+        group: str
+            the group of the entry points of the ids not built in.
+        builtins: dict
+            of { id : "module:attribute" }.
+            They take precedence over the entry points.
+        """
+        self.group = group
+        self.builtins = builtins
+        # { id : object } of those already loaded.
+        self._loaded:dict = dict()
+        # { id : entry point }, looked up once.
+        self._entry_points:dict|None = None
+
+    def __entry_points(self) -> dict:
+        if self._entry_points is None:
+            # Scanning the installed packages takes a while.
+            import importlib.metadata
+            self._entry_points = {
+                ep.name : ep for ep in importlib.metadata.entry_points(group=self.group)
+            }
+        return self._entry_points
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.builtins or name in self.__entry_points()
+
+    def __getitem__(self, name: str):
+        """
+        Raises
+        ------
+        KeyError
+            if there is no such name.
+        """
+        if name not in self._loaded:
+            if name in self.builtins:
+                self._loaded[name] = load(self.builtins[name])
+            else:
+                self._loaded[name] = self.__entry_points()[name].load()
+        return self._loaded[name]
+
+    def ids(self) -> list:
+        """
+        Returns
+        -------
+        All the ids, built in or not, sorted.
+        """
+        return sorted(self.builtins.keys() | self.__entry_points().keys())
+
+
+# Maps <course-number>-<year> to the course's my_info
+COURSES = registry(COURSES_GROUP, {
+    "6.004-2017"    : "courses.c6004y2017:my_info",
+    "18.065-2018"   : "courses.c18065y2018:my_info",
+    "18.06sc-2011"  : "courses.c1806scy2011:my_info",
+    "6.034-2010"    : "courses.c6034y2010:my_info",
+    "6.858-2014"    : "courses.c6858y2014:my_info",
+    "6.868j-2011"   : "courses.c6868jy2011:my_info",
+    "fmsd_hehner"   : "courses.fmsd_hehner:my_info",
+})
+
+# Maps name to downloader classes
+DOWNLOADERS = registry(DOWNLOADERS_GROUP, {
+    "yt-dlp"        : "video_downloader:yt_dlp_downloader",
+    "yt-dlp-api"    : "video_downloader:yt_dlp_api_downloader",
+    "300k"          : "video_downloader:default_300k_downloader",
+    "300k-async"    : "video_downloader:async_300k_downloader",
+})
@@ -0,0 +1,200 @@
+"""
+retry_policy.py decides whether, and when, a failed download is tried again.
+
+retry_policy:
+    Exponential backoff with jitter, which tells apart
+    errors that will never succeed (most 4xx),
+    a server asking to slow down (429 with Retry-After),
+    and errors that may go away (5xx, network errors).
+    It also has a circuit breaker per host:
+    once a host has failed too many times in a row,
+    every download from it is parked for a while,
+    while the downloads from other hosts go on.
+
+"""
+
+import email.utils
+import random
+import threading
+import time
+import urllib.parse
+
+
+def host_of(url: str) -> str:
+    return urllib.parse.urlsplit(url).hostname or ""
+
+
+def status_and_headers(error: Exception) -> tuple:
+    """
+    Returns
+    -------
+    (HTTP status, response headers) of error,
+    or (None, None) if error is not about an HTTP response
+    (e.g. the connection was refused or cut).
+    Works for both requests and aiohttp errors.
+    """
+    # requests.HTTPError
+    response = getattr(error, "response", None)
+    if response is not None and hasattr(response, "status_code"):
+        return (response.status_code, response.headers)
+    # aiohttp.ClientResponseError
+    status = getattr(error, "status", None)
+    if isinstance(status, int):
+        return (status, getattr(error, "headers", None) or {})
+    return (None, None)
+
+
+def parse_retry_after(value: str|None) -> float|None:
+    """
+    Parameters
+    ----------
+    value: str
+        a Retry-After header, either in seconds or an HTTP date.
+
+    Returns
+    -------
+    The number of seconds to wait, or None if value can not be parsed.
+    """
+    if value is None:
+        return None
+    value = value.strip()
+    if value.isdecimal():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(when.timestamp() - time.time(), 0.0)
+
+
+class retry_policy:
+    """
+    Thread-safe, so that one policy is shared by all the downloads of a downloader.
+
+    A download asks wait_time() before each request and sleeps that long,
+    then reports the outcome to on_success() or on_failure().
+    The policy only decides; the caller does the sleeping,
+    either with time.sleep or with asyncio.sleep.
+    """
+
+    # Never wait longer than this for a Retry-After.
+    MAX_RETRY_AFTER:float = 15*60.0
+
+    def __init__(
+        self,
+        num_tries: int = 8,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        breaker_threshold: int = 5,
+        breaker_cooldown: float = 60.0
+    ):
+        """
+        Parameters
+        ----------
+        num_tries: int
+            number of tries of a download before a final failure.
+            1 means never to retry.
+        base_delay, max_delay: float
+            the n-th retry waits a random time in
+            [0, min(max_delay, base_delay * 2^n)) seconds.
+        breaker_threshold: int
+            number of failures in a row of a host
+            after which all downloads from it are parked.
+        breaker_cooldown: float
+            number of seconds they are parked for.
+        """
+        if num_tries < 1:
+            raise ValueError("The number of tries must be at least 1.")
+        if base_delay < 0 or max_delay < 0 or breaker_cooldown < 0:
+            raise ValueError("The delays must not be negative.")
+
+        self.num_tries = num_tries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+
+        self._lock = threading.Lock()
+        # { host : failures in a row }
+        self._failures:dict = dict()
+        # { host : time.monotonic() until which it is parked }
+        self._parked_until:dict = dict()
+        # Totals over all the downloads, see stats().
+        self._num_failures:int = 0
+        self._num_retries:int = 0
+
+    def wait_time(self, url: str) -> float:
+        """
+        Returns
+        -------
+        The number of seconds to wait before requesting url,
+        which is positive iff its host is parked.
+        """
+        with self._lock:
+            until = self._parked_until.get(host_of(url), 0.0)
+        return max(until - time.monotonic(), 0.0)
+
+    def on_success(self, url: str) -> None:
+        with self._lock:
+            self._failures.pop(host_of(url), None)
+
+    def on_failure(self, url: str, error: Exception, num_failures: int) -> float|None:
+        """
+        Parameters
+        ----------
+        url: str
+            the url whose request has failed.
+        error: Exception
+            why it failed.
+        num_failures: int
+            number of failures of this download so far, including this one.
+
+        Returns
+        -------
+        The number of seconds to wait before trying again,
+        or None if the download should not be tried again.
+        """
+        (status, headers) = status_and_headers(error)
+        host:str = host_of(url)
+
+        with self._lock:
+            self._num_failures += 1
+
+        # The request itself is wrong (e.g. 404). It will never succeed.
+        if status is not None and 400 <= status < 500 and status not in (408, 429):
+            return None
+
+        with self._lock:
+            if status == 429:
+                # The host asks everyone to slow down.
+                retry_after = parse_retry_after(headers.get("Retry-After"))
+                if retry_after is not None:
+                    retry_after = min(retry_after, retry_policy.MAX_RETRY_AFTER)
+                    self._parked_until[host] = max(
+                        self._parked_until.get(host, 0.0),
+                        time.monotonic() + retry_after
+                    )
+            else:
+                # 5xx, 408 or a network error. The host may be failing.
+                failures = self._failures.get(host, 0) + 1
+                self._failures[host] = failures
+                if failures >= self.breaker_threshold:
+                    self._parked_until[host] = time.monotonic() + self.breaker_cooldown
+
+        if num_failures >= self.num_tries:
+            return None
+        with self._lock:
+            self._num_retries += 1
+        return random.uniform(
+            0.0, min(self.max_delay, self.base_delay * 2 ** (num_failures - 1))
+        )
+
+    def stats(self) -> tuple:
+        """
+        Returns
+        -------
+        (number of failed requests, number of them tried again)
+        over all the downloads so far.
+        """
+        with self._lock:
+            return (self._num_failures, self._num_retries)
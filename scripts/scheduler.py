@@ -0,0 +1,515 @@
+"""
+scheduler.py runs the downloading jobs of a course concurrently.
+
+download_job:
+    One video to download: its type, its number, its title, its url,
+    and the directory it is to be downloaded into.
+
+iter_jobs:
+    Turns the videos yielded by a course.iter_videos
+    into download_jobs, one by one.
+
+make_jobs:
+    Turns the video maps returned by a course.populate_video_maps_lists
+    into a list of download_jobs.
+
+run_jobs:
+    Runs the jobs on a bounded pool of threads,
+    or on one event loop if the downloader is asynchronous,
+    and collects the result of each job.
+    The jobs may be a stream, which is consumed through a bounded queue,
+    so that the first downloads start while the rest are still being found.
+
+preflight:
+    Before downloading, asks the downloaders the size of every job,
+    and whether its server accepts ranges, many at the same time,
+    checks that they fit on the disks they go to,
+    and orders them, e.g. the largest first, so that the run does not
+    end with one long download left.
+
+summarize_sizes:
+    A human readable summary of the sizes found by preflight.
+
+"""
+
+import asyncio
+import concurrent.futures
+import errno
+import os
+import pathlib
+import shutil
+import queue
+import threading
+
+import download_state
+import video_downloader
+from courses import course
+
+# In case the script is run on Windows, I will replace every illegal character in NTFS with #
+ILLEGAL_NTFS_CHARS = "\\/:*?\"<>|"
+ILLEGAL_CHAR_TRANS_TABLE = str.maketrans({char: '#' for char in ILLEGAL_NTFS_CHARS})
+
+# Results of a job.
+RESULT_OK = "ok"
+RESULT_SKIPPED = "skipped"
+RESULT_FAILED = "failed"
+RESULTS = [ RESULT_OK, RESULT_SKIPPED, RESULT_FAILED ]
+# Not one of RESULTS, as only a job that can be cancelled ends so.
+# See download_job.cancelled.
+RESULT_CANCELLED = "cancelled"
+
+# Number of jobs found but not yet started that run_jobs holds.
+# Finding the jobs waits when it is that far ahead of the downloads.
+DEF_QUEUE_SIZE:int = 64
+
+# Orders preflight can put the jobs in.
+ORDER_COURSE = "course"
+ORDER_LARGEST = "largest"
+ORDER_SHORTEST = "shortest"
+ORDERS = [ ORDER_COURSE, ORDER_LARGEST, ORDER_SHORTEST ]
+
+# Number of jobs preflight probes at the same time, at least.
+# A HEAD costs the server far less than a download, so there are more of them.
+DEF_NUM_PROBES:int = 8
+# Part of the free space of a disk preflight keeps out of the jobs,
+# as the sizes are estimates and other programs write too.
+FREE_SPACE_MARGIN:float = 0.05
+
+
+class download_job:
+    """
+    A single video to download.
+
+    Each job carries its own target directory,
+    so that jobs do not rely on the shared state of downloader.chdir()
+    and can be run in any order by any thread.
+
+    A job may also carry its own downloader and download_state,
+    e.g. in a batch of courses, whose courses use different ones.
+    Otherwise, it is run by those given to run_jobs.
+    """
+
+    def __init__(
+        self, video_type: str, vid_num, title: str, url: str,
+        target_dir: pathlib.Path
+    ):
+        self.video_type = video_type
+        self.vid_num = vid_num
+        # Already has the illegal characters replaced.
+        self.title = title
+        self.url = url
+        self.target_dir = target_dir
+        self.downloader:video_downloader.video_downloader|None = None
+        self.state:download_state.download_state|None = None
+        # If not None, called just before the job would start,
+        # which it does not if that returns True, e.g. in a daemon.
+        self.cancelled = None
+        # Found by preflight: the number of bytes the job will download
+        # (0 if it is already done), and whether its server accepts ranges.
+        # None if not known.
+        self.size:int|None = None
+        self.accepts_ranges:bool|None = None
+
+    def __str__(self) -> str:
+        return f"{self.video_type} {self.vid_num}: {self.title}"
+
+
+def iter_jobs(videos, videos_root: pathlib.Path):
+    """
+    Creates the directory for each session and the jobs to download into them.
+
+    Parameters
+    ----------
+    videos:
+        iterable of (video_type, vid_num, title, url),
+        e.g. yielded by a course.iter_videos.
+    videos_root: Path
+        the directory where all the videos downloaded are to be placed in.
+
+    Yields
+    ------
+    A download_job for each video, in the order of videos.
+    A directory is created just before its first job is yielded.
+    """
+    # Directories already created.
+    dirs:set = set()
+
+    # Type of the video, e.g. "Lecture", "Recitation".
+    video_type:str
+    title:str
+    for (video_type, vid_num, title, url) in videos:
+        # Videos for a session will be placed under root/video_type/number/
+        # Add 's' to mean plural form.
+        video_dir: pathlib.Path = videos_root / (video_type + 's') / str(vid_num)
+        if video_dir not in dirs:
+            video_dir.mkdir(parents=True, exist_ok=True)
+            dirs.add(video_dir)
+
+        # Replace illegal filename characters with #
+        title = title.translate(ILLEGAL_CHAR_TRANS_TABLE)
+        yield download_job(video_type, vid_num, title, url, video_dir)
+
+
+def make_jobs(video_maps: dict, videos_root: pathlib.Path) -> list:
+    """
+    Same as iter_jobs, but from the dict returned by a
+    course.populate_video_maps_lists, and returns the list of all the jobs.
+    """
+    return list(iter_jobs(course.course.videos_of(video_maps), videos_root))
+
+
+def run_jobs(
+    jobs,
+    downloader: video_downloader.video_downloader,
+    num_workers: int = 1,
+    verbose: bool = False,
+    state: download_state.download_state|None = None,
+    queue_size: int = DEF_QUEUE_SIZE,
+    on_result = None
+) -> list:
+    """
+    Runs every job on a pool of at most num_workers threads.
+    If the downloader has download_to_async(), then the jobs are instead
+    run as at most num_workers tasks on one event loop.
+
+    The jobs are taken from jobs one by one, and handed to the workers
+    through a queue of at most queue_size jobs,
+    so jobs may be a generator that is slow to yield (e.g. parsing),
+    and downloading overlaps with it.
+    If the downloader is asynchronous, the generator runs on another thread,
+    and the jobs with a downloader of their own run on a pool of threads.
+
+    A job whose title is already in its target directory is skipped.
+    If there is a state, then that is looked up in it,
+    and the outcome of each job is recorded in it
+    (on the default executor, if the jobs run on an event loop).
+    Otherwise, each directory is listed once, when its first job is taken.
+
+    Parameters
+    ----------
+    jobs:
+        iterable of download_jobs.
+    downloader: video_downloader
+        downloads each job through download_to().
+    num_workers: int
+        maximum number of downloads at the same time.
+    state: download_state
+        of the videos root of the jobs.
+    queue_size: int
+        maximum number of jobs taken but not yet started.
+    on_result:
+        if not None, called with (job, result) as each job ends,
+        from the thread that ran it (e.g. progress.progress_view.on_result).
+
+    Returns
+    -------
+    A list of (job, result) in the order of jobs,
+    where result is one of RESULTS, or RESULT_CANCELLED.
+
+    Raises
+    ------
+    Whatever iterating jobs raises,
+    once the jobs taken before have been run.
+    """
+    if num_workers < 1:
+        raise ValueError("The number of workers must be at least 1.")
+    if queue_size < 1:
+        raise ValueError("The size of the queue must be at least 1.")
+
+    # { target_dir : set of downloaded titles }
+    dir_filenames:dict = dict()
+    # Jobs in the order they are taken, and { index : result }.
+    taken:list = []
+    results:dict = dict()
+
+    def downloader_of(job: download_job) -> video_downloader.video_downloader:
+        return job.downloader if job.downloader is not None else downloader
+
+    def state_of(job: download_job) -> download_state.download_state|None:
+        return job.state if job.state is not None else state
+
+    def take(job: download_job) -> tuple:
+        # Listed before any job in that directory can have started.
+        if state_of(job) is None and job.target_dir not in dir_filenames:
+            dir_filenames[job.target_dir] = \
+                video_downloader.video_downloader.list_dir_filenames(job.target_dir)
+        taken.append(job)
+        return (len(taken) - 1, job)
+
+    # Only used to keep the printed lines from interleaving.
+    print_lock = threading.Lock()
+
+    # Guards dir_filenames, which the workers update.
+    dir_lock = threading.Lock()
+
+    def is_downloaded(job: download_job) -> bool:
+        state = state_of(job)
+        done:bool
+        if state is not None:
+            done = state.is_done(job.target_dir, job.title)
+        else:
+            with dir_lock:
+                titles:set = dir_filenames[job.target_dir]
+                done = job.title in titles
+                # Taken by this job from now on, so that another video
+                # of the same title in the directory is skipped,
+                # as a single run did, instead of being written over it.
+                titles.add(job.title)
+        if done:
+            if verbose:
+                with print_lock:
+                    print(job.title + " has already been downloaded. Skipping...")
+            return True
+
+        if verbose:
+            with print_lock:
+                print(f"downloading {job}")
+        if state is not None:
+            state.mark_started(job.target_dir, job.title, job.url)
+        return False
+
+    def record(job: download_job, ok: bool, info: dict) -> str:
+        state = state_of(job)
+        if state is not None:
+            if ok:
+                state.mark_done(job.target_dir, job.title, job.url, info)
+            else:
+                state.mark_failed(job.target_dir, job.title, job.url)
+        elif not ok:
+            # Free for another video of the same title.
+            with dir_lock:
+                dir_filenames[job.target_dir].discard(job.title)
+        return RESULT_OK if ok else RESULT_FAILED
+
+    def report_error(job: download_job, e: Exception) -> None:
+        if verbose:
+            with print_lock:
+                print(f"An error occurred while downloading {job}:")
+                print(e)
+
+    def run_one(job: download_job) -> str:
+        if job.cancelled is not None and job.cancelled():
+            return RESULT_CANCELLED
+        if is_downloaded(job):
+            return RESULT_SKIPPED
+        info:dict = dict()
+        try:
+            ok = downloader_of(job).download_to(
+                job.target_dir, job.title, job.url, verbose, info
+            )
+        except Exception as e:
+            report_error(job, e)
+            ok = False
+
+        return record(job, ok, info)
+
+    def run_all() -> None:
+        q = queue.Queue(queue_size)
+
+        def work() -> None:
+            while (item := q.get()) is not None:
+                (i, job) = item
+                # A worker must never die, or the queue would never be emptied.
+                try:
+                    results[i] = run_one(job)
+                except Exception as e:
+                    report_error(job, e)
+                    results[i] = RESULT_FAILED
+                if on_result is not None:
+                    on_result(job, results[i])
+
+        workers = [threading.Thread(target=work) for _ in range(num_workers)]
+        for w in workers:
+            w.start()
+        try:
+            for job in jobs:
+                q.put(take(job))
+        finally:
+            for _ in workers:
+                q.put(None)
+            for w in workers:
+                w.join()
+
+    async def run_all_async(pool: concurrent.futures.ThreadPoolExecutor) -> None:
+        loop = asyncio.get_running_loop()
+        q = asyncio.Queue(queue_size)
+
+        def feed() -> None:
+            # On another thread, so that the event loop goes on meanwhile.
+            def put(item) -> None:
+                asyncio.run_coroutine_threadsafe(q.put(item), loop).result()
+            try:
+                for job in jobs:
+                    put(take(job))
+            finally:
+                for _ in range(num_workers):
+                    put(None)
+
+        async def run_one_async(session, job: download_job) -> str:
+            if job.cancelled is not None and job.cancelled():
+                return RESULT_CANCELLED
+            # The state commits to disk, which must not hold up
+            # the transfers on the loop meanwhile.
+            if await loop.run_in_executor(None, is_downloaded, job):
+                return RESULT_SKIPPED
+            info:dict = dict()
+            try:
+                if downloader_of(job) is downloader:
+                    ok = await downloader.download_to_async(
+                        session, job.target_dir, job.title, job.url, verbose, info
+                    )
+                else:
+                    # The session open here is the run's downloader's.
+                    # Another asynchronous one runs on a loop of its own.
+                    ok = await loop.run_in_executor(
+                        pool, downloader_of(job).download_to,
+                        job.target_dir, job.title, job.url, verbose, info
+                    )
+            except Exception as e:
+                report_error(job, e)
+                ok = False
+
+            return await loop.run_in_executor(None, record, job, ok, info)
+
+        # Bounds the number of transfers, not threads.
+        async def work(session) -> None:
+            while (item := await q.get()) is not None:
+                (i, job) = item
+                try:
+                    results[i] = await run_one_async(session, job)
+                except Exception as e:
+                    report_error(job, e)
+                    results[i] = RESULT_FAILED
+                if on_result is not None:
+                    on_result(job, results[i])
+
+        async with downloader.open_session() as session:
+            feeding = loop.run_in_executor(None, feed)
+            await asyncio.gather(*(work(session) for _ in range(num_workers)))
+            await feeding
+
+    if hasattr(downloader, "download_to_async"):
+        # Its threads are only started for jobs with a downloader of their own.
+        with concurrent.futures.ThreadPoolExecutor(num_workers) as pool:
+            asyncio.run(run_all_async(pool))
+    else:
+        run_all()
+
+    return [(taken[i], results[i]) for i in range(len(taken))]
+
+
+def preflight(
+    jobs,
+    downloader: video_downloader.video_downloader,
+    num_workers: int = 1,
+    order: str = ORDER_COURSE,
+    state: download_state.download_state|None = None
+) -> list:
+    """
+    Asks probe() of every job's downloader (or of downloader) for its size
+    and whether its server accepts ranges, at most max(num_workers, DEF_NUM_PROBES)
+    at the same time, and sets them in the job.
+    A job already done in its download_state (or state) is not asked,
+    as it will be skipped.
+
+    Parameters
+    ----------
+    jobs:
+        iterable of download_job. All are found before any is probed.
+    order: str
+        one of ORDERS.
+        ORDER_LARGEST and ORDER_SHORTEST sort the jobs by their sizes,
+        a job of unknown size being taken as one of the average size.
+        Jobs of the same size keep the order of the course.
+    Others: see run_jobs.
+
+    Returns
+    -------
+    The list of the jobs, in order.
+
+    Raises
+    ------
+    OSError
+        with errno.ENOSPC, if the sizes known of the jobs that go to a disk
+        are more than its free space.
+    """
+    if order not in ORDERS:
+        raise ValueError(f"Unknown order {order}. It is one of {', '.join(ORDERS)}.")
+    jobs = list(jobs)
+
+    def probe(job: download_job) -> None:
+        job_state = job.state if job.state is not None else state
+        if job_state is not None and job_state.is_done(job.target_dir, job.title):
+            job.size = 0
+            return
+        (job.size, job.accepts_ranges) = \
+            (job.downloader if job.downloader is not None else downloader).probe(job.url)
+
+    with concurrent.futures.ThreadPoolExecutor(max(num_workers, DEF_NUM_PROBES)) as pool:
+        # list() for the exceptions to be raised here.
+        list(pool.map(probe, jobs))
+
+    # { device : [a directory on it, the bytes the jobs need] }
+    disks:dict = dict()
+    for job in jobs:
+        disk = disks.setdefault(os.stat(job.target_dir).st_dev, [job.target_dir, 0])
+        disk[1] += job.size or 0
+    for (directory, needed) in disks.values():
+        free:int = int(shutil.disk_usage(directory).free * (1 - FREE_SPACE_MARGIN))
+        if needed > free:
+            raise OSError(
+                errno.ENOSPC,
+                f"The videos need {needed / 1024**2:.1f}MiB, " + \
+                f"but only {free / 1024**2:.1f}MiB are free for them", str(directory)
+            )
+
+    if order == ORDER_COURSE:
+        return jobs
+    known:list = [j.size for j in jobs if j.size is not None]
+    average:float = sum(known) / len(known) if len(known) != 0 else 0
+    # sorted() is stable, also in reverse.
+    return sorted(
+        jobs, key=lambda j: j.size if j.size is not None else average,
+        reverse=(order == ORDER_LARGEST)
+    )
+
+
+def summarize_sizes(jobs: list) -> str:
+    """
+    Parameters
+    ----------
+    jobs: list
+        returned by preflight.
+
+    Returns
+    -------
+    A human readable summary of their sizes.
+    """
+    known:list = [j.size for j in jobs if j.size is not None]
+    num_ranges:int = sum(1 for j in jobs if j.accepts_ranges)
+    return f"{len(jobs)} videos, about {sum(known) / 1024**2:.1f}MiB in total" + \
+        (f", {len(jobs) - len(known)} of unknown size" if len(known) != len(jobs) else "") + \
+        (f", {num_ranges} from servers that accept ranges" if num_ranges != 0 else "")
+
+
+def summarize(results: list) -> str:
+    """
+    Parameters
+    ----------
+    results: list
+        returned by run_jobs.
+
+    Returns
+    -------
+    A human readable summary of the results,
+    listing the failed jobs.
+    """
+    counts:dict = { r : 0 for r in RESULTS }
+    for (_, r) in results:
+        counts[r] = counts.get(r, 0) + 1
+
+    ret:str = ", ".join(f"{n} {r}" for (r, n) in counts.items())
+    for (j, r) in results:
+        if r == RESULT_FAILED:
+            ret += f"\nfailed: {j} ({j.url})"
+    return ret
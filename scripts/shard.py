@@ -0,0 +1,363 @@
+"""
+shard.py splits the downloading of a course between several nodes
+that share the videos root, e.g. over NFS.
+One node plans the course into a manifest, and any number of workers,
+on any node, take its videos one by one through lease files next to it,
+so that each video is downloaded once, into the same
+<videos_root>/<Type>s/<num>/ layout as a single run.
+
+write_manifest, read_manifest:
+    A manifest is a JSON file with the course, the downloader,
+    the videos root (relative to the manifest) and every video:
+    its type, its number, its title, its url and its directory.
+
+lease_board:
+    The leases of a manifest's videos, in the directory <manifest>.leases/:
+        <i>.lease   held by the node downloading video i.
+                    Created with O_EXCL, so only one node can create it.
+                    Its holder touches it every lease_seconds / 4;
+                    one untouched for lease_seconds is taken over,
+                    as its holder is taken as crashed.
+        <i>.done    video i is downloaded (or was already there).
+        <i>.failed  the number of times video i has failed.
+                    It is given up after max_attempts.
+        <i>.takeover    held by the node taking over the expired lease of video i,
+                    created with O_EXCL, so that one node takes over at a time.
+    A video is only ever marked while its lease is held.
+
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+import socket
+import threading
+import time
+import uuid
+
+MANIFEST_VERSION:int = 1
+# Long enough to outlast a slow NFS and the skew between the nodes' clocks,
+# as the age of a lease is its mtime (the server's clock) against this node's.
+DEF_LEASE_SECONDS:float = 300.0
+DEF_MAX_ATTEMPTS:int = 3
+# A worker with nothing to take looks again at most this often,
+# for the videos held by others to be done or their leases to expire.
+POLL_SECONDS:float = 5.0
+
+
+def default_node() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def write_manifest(
+    path: pathlib.Path,
+    course_id: str,
+    dl_id: str,
+    videos_root: pathlib.Path,
+    jobs: list
+) -> None:
+    """
+    Parameters
+    ----------
+    jobs: list
+        of scheduler.download_job, made by scheduler.iter_jobs under videos_root.
+    The manifest is replaced atomically, so a worker never reads half of it.
+    """
+    root = videos_root.absolute()
+    manifest:dict = {
+        "version": MANIFEST_VERSION,
+        "course_id": course_id,
+        "downloader": dl_id,
+        # Relative, as the nodes may mount the shared directory elsewhere.
+        "videos_root": os.path.relpath(root, path.absolute().parent),
+        "videos": [
+            {
+                "type": j.video_type, "num": j.vid_num, "title": j.title, "url": j.url,
+                "dir": j.target_dir.absolute().relative_to(root).as_posix(),
+            }
+            for j in jobs
+        ],
+    }
+    tmp_path = path.with_name(path.name + f".{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=1))
+    os.replace(tmp_path, path)
+
+
+def read_manifest(path: pathlib.Path) -> tuple:
+    """
+    Returns
+    -------
+    (the manifest as written by write_manifest,
+    the videos root on this node,
+    list of scheduler.download_job, in the order of the manifest).
+
+    Raises
+    ------
+    ValueError
+        if the manifest is not one.
+    OSError
+        if it can not be read.
+    """
+    import scheduler
+
+    try:
+        manifest:dict = json.loads(path.read_text())
+        if manifest.get("version") != MANIFEST_VERSION:
+            raise ValueError(f"Unknown version {manifest.get('version')}.")
+        root:pathlib.Path = path.absolute().parent / manifest["videos_root"]
+        jobs:list = [
+            scheduler.download_job(v["type"], v["num"], v["title"], v["url"], root / v["dir"])
+            for v in manifest["videos"]
+        ]
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Not a manifest. Missing {e}.") from e
+    return (manifest, root, jobs)
+
+
+class lease_board:
+    """
+    Thread-safe. One per worker, i.e. per node and process.
+    """
+
+    def __init__(
+        self,
+        manifest_path: pathlib.Path,
+        node: str|None = None,
+        lease_seconds: float = DEF_LEASE_SECONDS,
+        max_attempts: int = DEF_MAX_ATTEMPTS,
+        verbose: bool = False
+    ):
+        if lease_seconds <= 0 or max_attempts < 1:
+            raise ValueError("The lease must be positive and there must be at least 1 attempt.")
+        self.dir = manifest_path.with_name(manifest_path.name + ".leases")
+        self.dir.mkdir(exist_ok=True)
+        self.node:str = node if node is not None else default_node()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.verbose = verbose
+
+        self._lock = threading.Lock()
+        # Indices of the videos whose lease this worker holds.
+        self._held:set = set()
+        # { job : its index }, while it is held.
+        self._index_of:dict = dict()
+        self._stop = threading.Event()
+        self._renewer:threading.Thread|None = None
+
+    def __path(self, i: int, kind: str) -> pathlib.Path:
+        return self.dir / f"{i}.{kind}"
+
+    def __failures(self, i: int) -> int:
+        try:
+            return int(self.__path(i, "failed").read_text())
+        except (OSError, ValueError):
+            return 0
+
+    def is_finished(self, i: int) -> bool:
+        """
+        Returns
+        -------
+        True iff video i is done or has been given up.
+        """
+        return self.__path(i, "done").exists() or self.__failures(i) >= self.max_attempts
+
+    def __holder(self, i: int) -> str|None:
+        try:
+            return json.loads(self.__path(i, "lease").read_text())["node"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def __remove_expired(self, i: int) -> bool:
+        """
+        Removes the lease of video i if it has expired.
+        Only one worker at a time can do so, through the O_EXCL file <i>.takeover,
+        so that no worker removes the fresh lease of one that has just taken it over.
+
+        Returns
+        -------
+        True iff the lease has been removed.
+        """
+        path = self.__path(i, "lease")
+        lock = self.__path(i, "takeover")
+        try:
+            os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+        except FileExistsError:
+            try:
+                # Left by a worker that has crashed while taking over.
+                # Removed, and tried again on the next look.
+                if time.time() - lock.stat().st_mtime >= self.lease_seconds:
+                    os.remove(lock)
+            except FileNotFoundError:
+                pass
+            return False
+        try:
+            try:
+                seen = path.stat()
+            except FileNotFoundError:
+                # Released meanwhile. It is taken on the next look.
+                return False
+            if time.time() - seen.st_mtime < self.lease_seconds:
+                return False
+            stale = path.with_name(f"{path.name}.stale.{uuid.uuid4().hex}")
+            try:
+                os.rename(path, stale)
+            except FileNotFoundError:
+                return False
+            # Its holder may still have renewed it between the look and the move.
+            # It is told by the inode and the mtime, which may be fooled
+            # by an inode reused within the resolution of the mtime (e.g. 1s on some NFS),
+            # but no other worker can have replaced it, as they take over one at a time.
+            moved = os.stat(stale)
+            if (moved.st_ino, moved.st_mtime) == (seen.st_ino, seen.st_mtime):
+                os.remove(stale)
+                return True
+            # Put it back, unless a worker has made a new one meanwhile
+            # (link never replaces). Its holder would then have lost it,
+            # which it tells by __holder() in renew() and release().
+            try:
+                os.link(stale, path)
+            except FileExistsError:
+                pass
+            os.remove(stale)
+            return False
+        finally:
+            try:
+                os.remove(lock)
+            except FileNotFoundError:
+                pass
+
+    def claim(self, i: int) -> bool:
+        """
+        Takes the lease of video i, if it is free or has expired,
+        and the video is not finished.
+
+        Returns
+        -------
+        True iff this worker now holds it.
+        """
+        if self.is_finished(i):
+            return False
+        path = self.__path(i, "lease")
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            if not self.__remove_expired(i):
+                return False
+            if self.verbose:
+                print(f"Taking over video {i}, whose lease has expired.")
+            # Whoever creates the lease first, of this worker and any other, takes it.
+            return self.claim(i)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({ "node": self.node, "pid": os.getpid(), "time": time.time() }, f)
+        # Another node may have finished it between the look and the lease.
+        if self.is_finished(i):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return False
+        with self._lock:
+            self._held.add(i)
+        return True
+
+    def release(self, i: int, ok: bool) -> None:
+        """
+        Marks video i as done if ok, or as failed once more,
+        then gives up its lease.
+        """
+        with self._lock:
+            self._held.discard(i)
+        if self.__holder(i) != self.node:
+            # Taken over, while this worker was too slow to renew it.
+            # The new holder marks it.
+            if self.verbose:
+                print(f"Lost the lease of video {i} before it ended.")
+            return
+        if ok:
+            self.__path(i, "done").write_text(self.node)
+        else:
+            self.__path(i, "failed").write_text(str(self.__failures(i) + 1))
+        try:
+            os.remove(self.__path(i, "lease"))
+        except FileNotFoundError:
+            pass
+
+    def renew(self) -> None:
+        """
+        Touches the leases held, so that no node takes them over.
+        """
+        with self._lock:
+            held = list(self._held)
+        for i in held:
+            # Never keeps alive the lease of another worker,
+            # which has taken it over while this one was too slow to renew it.
+            if self.__holder(i) != self.node:
+                continue
+            try:
+                os.utime(self.__path(i, "lease"))
+            except FileNotFoundError:
+                pass
+
+    def jobs(self, jobs: list):
+        """
+        Parameters
+        ----------
+        jobs: list
+            of download_job, the i-th being video i of the manifest.
+
+        Yields
+        ------
+        The jobs whose lease this worker takes, one at a time,
+        until every video is finished, waiting for those held by others.
+        The lease of each is renewed until on_result is called for it.
+        """
+        while True:
+            num_left:int = 0
+            for (i, job) in enumerate(jobs):
+                if self.is_finished(i):
+                    continue
+                num_left += 1
+                if self.claim(i):
+                    with self._lock:
+                        self._index_of[job] = i
+                    # Made by the planner, unless the videos root has been emptied since.
+                    job.target_dir.mkdir(parents=True, exist_ok=True)
+                    yield job
+            if num_left == 0:
+                return
+            # All the others are held. Look again once some may have ended.
+            time.sleep(min(POLL_SECONDS, self.lease_seconds / 4))
+
+    def on_result(self, job, result: str) -> None:
+        """
+        To be given to scheduler.run_jobs.
+        """
+        import scheduler
+        with self._lock:
+            i = self._index_of.pop(job)
+        self.release(i, result in (scheduler.RESULT_OK, scheduler.RESULT_SKIPPED))
+
+    def __renew_forever(self) -> None:
+        while not self._stop.wait(self.lease_seconds / 4):
+            self.renew()
+
+    def __enter__(self):
+        self._renewer = threading.Thread(target=self.__renew_forever, daemon=True)
+        self._renewer.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._renewer.join()
+        # Whatever was not ended, e.g. on Ctrl+C, is free for the others at once.
+        with self._lock:
+            held = list(self._held)
+            self._held.clear()
+        for i in held:
+            if self.__holder(i) == self.node:
+                try:
+                    os.remove(self.__path(i, "lease"))
+                except FileNotFoundError:
+                    pass
@@ -1,48 +1,289 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import glob
 import os
 import os.path
+import queue
+import threading
+import time
 
 import pathlib
-import requests
 
 from courses import helpers
+import chunk_policy
+import format_policy
+import metrics
+import rate_limiter
+import retry_policy
+
+# aiohttp, requests (through http_pool) and yt_dlp are imported
+# where they are first used, as each takes long to import,
+# and a run only needs the one of its downloader.
 
 class video_downloader:
 
+    # The downloader_type of the courses whose urls this downloader takes.
+    # See course.course.
+    URL_TYPE:str = None
+
     def __init__(self, base_path: pathlib.Path|None):
         self._dir:pathlib.Path = None
         self._dir_filenames:set = None
+        # Decides when to retry a failed download.
+        # Each subclass sets its own default.
+        self.retry_policy:retry_policy.retry_policy = None
+        # The bandwidth shared by all the downloads of a run.
+        # None means unlimited.
+        self.rate_limiter:rate_limiter.rate_limiter = None
+        # Where every download records what it has done.
+        # None means not to measure.
+        self.metrics:metrics.metrics_recorder = None
+        # Whether to keep the downloads from printing their own progress,
+        # e.g. as a progress.progress_view shows it instead.
+        # verbose still prints everything.
+        self.quiet:bool = False
 
         if (base_path is None):
             return
         self.chdir(base_path)
 
+    def list_dir_filenames(dir_path: pathlib.Path) -> set:
+        """
+        Returns
+        -------
+        The set of the names (without extension) of all files in dir_path.
+        A title in this set is regarded as downloaded.
+        Partial files, which are left by interrupted downloads, are not included.
+        """
+        ret:set = set()
+        f: pathlib.Path
+        for f in dir_path.iterdir():
+            if f.suffix == helpers.PART_SUFFIX:
+                continue
+            if f.exists() and f.is_file():
+                # file name without extension
+                file_name_no_ext = os.path.splitext(f.name)[0]
+                ret.add(file_name_no_ext)
+        return ret
+
     def chdir(self, new_path: pathlib.Path) -> None:
         if(not new_path.exists() or not new_path.is_dir()):
             raise ValueError("The path you provided does not exist or is not to a directory.")
-        
+
         self._dir = new_path
         # Now build a directory filenames set
         # because I don't want to list the directory contents once per download.
-        self._dir_filenames = set()
-        f: pathlib.Path
-        for f in self._dir.iterdir():
-            if f.exists() and f.is_file():
-                # file name without extension
-                file_name_no_ext = os.path.splitext(f.name)[0]
-                self._dir_filenames.add(file_name_no_ext)
+        self._dir_filenames = video_downloader.list_dir_filenames(self._dir)
+
+    def download_to(
+        self, dir_path: pathlib.Path, title: str, url: str, verbose: bool = False,
+        info: dict|None = None
+    ) -> bool:
+        """
+        Downloads the video at url into dir_path as a file named by title.
+        Unlike download(), it neither reads nor changes the state set by chdir(),
+        so it can be called from many threads at once,
+        each with its own directory.
+
+        If info is given, then after a successful download it has
+        the "path" of the file, and the "etag" and "last_modified"
+        of the url if known.
 
-    def download(self, title: str, url: str, verbose: bool):
+        Returns
+        -------
+        True iff the downloading was successful.
+        """
         raise NotImplementedError("Abstract method.")
-    
+
+    def estimate_size(self, url: str) -> int|None:
+        """
+        Can be called from many threads at once.
+
+        Returns
+        -------
+        The number of bytes download_to would download for url,
+        or None if it is not known.
+        """
+        return None
+
+    def probe(self, url: str) -> tuple:
+        """
+        Can be called from many threads at once.
+
+        Returns
+        -------
+        (same as estimate_size,
+        whether the server of url accepts ranges, or None if it is not known
+        or does not matter to this downloader)
+        """
+        return (self.estimate_size(url), None)
+
+    def _recorded(self, url: str, title: str, download) -> bool:
+        """
+        Returns
+        -------
+        download(transfer), where transfer is the metrics.transfer_metrics
+        of url in self.metrics, which is finished once download returns,
+        or None if there are no metrics.
+        """
+        if self.metrics is None:
+            return download(None)
+        transfer = self.metrics.start(url, title)
+        ok:bool = False
+        try:
+            ok = download(transfer)
+            return ok
+        finally:
+            self.metrics.finish(transfer, ok)
+
+    async def _recorded_async(self, url: str, title: str, download) -> bool:
+        """
+        Same as _recorded, but awaits download(transfer).
+        """
+        if self.metrics is None:
+            return await download(None)
+        transfer = self.metrics.start(url, title)
+        ok:bool = False
+        try:
+            ok = await download(transfer)
+            return ok
+        finally:
+            self.metrics.finish(transfer, ok)
+
+    def report(self) -> str|None:
+        """
+        Returns
+        -------
+        A line about how the downloads of this downloader went
+        (e.g. how many connections have been reused),
+        or None if it has nothing to report.
+        """
+        return None
+
+    def close(self) -> None:
+        """
+        Releases what the downloader keeps between its downloads
+        (e.g. an event loop and its connections), if anything.
+        It can still download afterwards.
+        """
+        pass
+
+    def download(self, title: str, url: str, verbose: bool = False):
+        # Check if the file with the title already exists
+        if(title in self._dir_filenames):
+            if(verbose):
+                print(title + " has already been downloaded. Skipping...")
+            return
+
+        if self.download_to(self._dir, title, url, verbose):
+            # and don't forget to update the filenames set
+            self._dir_filenames.add(title)
+        # Otherwise, the error has been printed by download_to().
+
 class yt_dlp_downloader(video_downloader):
-        
-        def __init__(self, base_path: pathlib.Path|None = None):
-            super(video_downloader, base_path)
 
-        def __generate_command(self, url: str, title: str) -> str:
-            command:str = "yt-dlp -o "
+        URL_TYPE:str = "yt-dlp"
+        # yt-dlp retries the fragments of a video itself.
+        # These are the retries of the whole video.
+        NUM_TRIES:int = 3
+
+        def __init__(
+            self, base_path: pathlib.Path|None = None,
+            policy: retry_policy.retry_policy|None = None,
+            formats: format_policy.format_policy|None = None
+        ):
+            """
+            Parameters
+            ----------
+            policy: retry_policy
+                decides when to retry a failed video.
+                By default, NUM_TRIES tries with exponential backoff.
+            formats: format_policy
+                decides which format of each video is downloaded.
+                By default, yt-dlp's default.
+            """
+            super().__init__(base_path)
+            self.retry_policy = policy if policy is not None else \
+                retry_policy.retry_policy(yt_dlp_downloader.NUM_TRIES, base_delay=5.0)
+            self.set_format_policy(
+                formats if formats is not None else format_policy.format_policy()
+            )
+
+            self._lock = threading.Lock()
+            # Number of yt-dlp runs, and the seconds they took in total.
+            self._num_runs:int = 0
+            self._run_seconds:float = 0.0
+
+        def _count_run(self, seconds: float) -> None:
+            with self._lock:
+                self._num_runs += 1
+                self._run_seconds += seconds
 
-            output_path = self._dir / (title + ".%(ext)s")
+        def report(self) -> str|None:
+            with self._lock:
+                if self._num_runs == 0:
+                    return None
+                return f"{self._num_runs} yt-dlp runs, {self._run_seconds / self._num_runs:.2f}s each"
+
+        def set_format_policy(self, formats: format_policy.format_policy) -> None:
+            """
+            Must not be called while downloading.
+            """
+            self.format_policy = formats
+            # A YoutubeDL per thread to estimate the sizes with.
+            # Its format selection is fixed when it is created.
+            self._estimating = threading.local()
+
+        def estimate_size(self, url: str) -> int|None:
+            import yt_dlp
+            ydl = getattr(self._estimating, "ydl", None)
+            if ydl is None:
+                ydl = yt_dlp.YoutubeDL({
+                    "quiet": True, "no_warnings": True, **self.format_policy.params()
+                })
+                self._estimating.ydl = ydl
+            try:
+                video = ydl.extract_info(url, download=False)
+            except yt_dlp.utils.DownloadError:
+                return None
+
+            # The formats to merge, or the single one.
+            formats:list = video.get("requested_formats") or [video]
+            sizes:list = [f.get("filesize") or f.get("filesize_approx") for f in formats]
+            if None in sizes:
+                return None
+            return int(sum(sizes))
+
+        def find_output(dir_path: pathlib.Path, title: str) -> pathlib.Path|None:
+            """
+            Returns
+            -------
+            The file yt-dlp has downloaded for title into dir_path,
+            whose extension it has chosen, or None if there is none.
+            """
+            for f in dir_path.glob(glob.escape(title) + ".*"):
+                if f.suffix != helpers.PART_SUFFIX and os.path.splitext(f.name)[0] == title:
+                    return f
+            return None
+
+        def __generate_command(
+            self, dir_path: pathlib.Path, url: str, title: str, rate: float|None,
+            verbose: bool = False
+        ) -> str:
+            command:str = "yt-dlp "
+            # yt-dlp can not share our rate limiter,
+            # so it is given a fixed cap instead.
+            if rate is not None:
+                command += f"--limit-rate {int(rate)} "
+            if self.quiet and not verbose:
+                command += "--quiet --no-warnings --no-progress "
+            for a in self.format_policy.args():
+                command += ('\"' + a + '\" ')
+            command += "-o "
+
+            output_path = dir_path / (title + ".%(ext)s")
             # append the output path
             command += ('\"' + output_path.absolute().as_posix() + '\"')
             # append the youtube URL
@@ -50,61 +291,494 @@ class yt_dlp_downloader(video_downloader):
 
             return command
 
-        def download(self, title: str, url: str, verbose:bool = False) -> None:
-            # Check if the file with the title already exists
-            if(title in self._dir_filenames):
-                if(verbose):
-                    print(title + " has already been downloaded. Skipping...")
-                return
+        def download_to(
+            self, dir_path: pathlib.Path, title: str, url: str, verbose: bool = False,
+            info: dict|None = None
+        ) -> bool:
+            return self._recorded(
+                url, title,
+                lambda transfer: self.__run_command(dir_path, title, url, verbose, info, transfer)
+            )
 
-            # Now the file has not been downloaded before.
+        def __run_command(
+            self, dir_path: pathlib.Path, title: str, url: str, verbose: bool,
+            info: dict|None, transfer: metrics.transfer_metrics|None
+        ) -> bool:
             # Just execute the command
-            cmd:str = self.__generate_command(url, title)
-            if(verbose):
-                print("Executing command: " + cmd)
-            os.system(cmd)
+            num_failures:int = 0
+
+            while True:
+                time.sleep(self.retry_policy.wait_time(url))
+                # The share of one worker of the rate when it starts,
+                # which the other downloads leave to it.
+                with helpers.reservation_of(self.rate_limiter) as rate:
+                    cmd:str = self.__generate_command(dir_path, url, title, rate, verbose)
+                    if(verbose):
+                        print("Executing command: " + cmd)
+                    started = time.monotonic()
+                    status = os.system(cmd)
+                    self._count_run(time.monotonic() - started)
+                if status == 0:
+                    self.retry_policy.on_success(url)
+                    path = yt_dlp_downloader.find_output(dir_path, title)
+                    if info is not None:
+                        info["path"] = path
+                    # yt-dlp only tells how much it has downloaded when it is done.
+                    if transfer is not None and path is not None:
+                        size:int = path.stat().st_size
+                        transfer.on_progress(path.name, size, size)
+                    return True
+
+                # yt-dlp does not tell why. Take it as a network error.
+                num_failures += 1
+                error = RuntimeError(f"yt-dlp exited with status {status}")
+                delay = self.retry_policy.on_failure(url, error, num_failures)
+                if transfer is not None:
+                    transfer.on_failure(error, delay is not None)
+                if verbose:
+                    print(f"yt-dlp exited with status {status} for {url}")
+                    if delay is not None:
+                        print(f"Retry number {num_failures} in {delay:.1f}s.")
+                if delay is None:
+                    return False
+                time.sleep(delay)
 
-            # and don't forget to update the filenames set
-            self._dir_filenames.add(title)
+
+class yt_dlp_api_downloader(yt_dlp_downloader):
+    """
+    Drives yt-dlp through its Python API in this process,
+    instead of running a yt-dlp process per video,
+    which pays for a new interpreter and for importing the extractors every time.
+
+    Thread-safe. A YoutubeDL is not, so each download borrows one
+    from a pool, which grows up to the number of downloads at the same time.
+    The YoutubeDLs are reused across videos.
+    """
+
+    def __init__(
+        self, base_path: pathlib.Path|None = None,
+        policy: retry_policy.retry_policy|None = None,
+        formats: format_policy.format_policy|None = None
+    ):
+        super().__init__(base_path, policy, formats)
+        self._num_ydls:int = 0
+        # Seconds from the start of the runs until their first bytes,
+        # which is the overhead of a video, as opposed to its transfer.
+        self._first_byte_seconds:float = 0.0
+
+    def set_format_policy(self, formats: format_policy.format_policy) -> None:
+        super().set_format_policy(formats)
+        # YoutubeDLs not borrowed.
+        # Those made for the previous policy are dropped.
+        self._idle = queue.SimpleQueue()
+
+    def report(self) -> str|None:
+        with self._lock:
+            if self._num_runs == 0:
+                return None
+            return f"{self._num_runs} yt-dlp runs over {self._num_ydls} YoutubeDLs, " + \
+                f"{self._run_seconds / self._num_runs:.2f}s each, " + \
+                f"{self._first_byte_seconds / self._num_runs:.2f}s of which before the first byte"
+
+    def __new_ydl(self) -> tuple:
+        """
+        Returns
+        -------
+        (a YoutubeDL, the dict its hooks fill about the current run).
+        """
+        import yt_dlp
+        run:dict = dict()
+
+        def on_progress(d: dict) -> None:
+            limiter = run.get("limiter")
+            if limiter is not None and d["status"] == "downloading" and \
+                d.get("downloaded_bytes") is not None:
+                # The hook runs in the thread reading the video,
+                # so waiting here holds yt-dlp to what the bucket gives it.
+                downloaded:dict = run.setdefault("downloaded", dict())
+                name:str = d.get("filename", "")
+                delta:int = d["downloaded_bytes"] - downloaded.get(name, 0)
+                downloaded[name] = d["downloaded_bytes"]
+                if delta > 0:
+                    limiter.wait(delta)
+            transfer = run.get("transfer")
+            if transfer is not None and d["status"] in ("downloading", "finished") and \
+                d.get("downloaded_bytes") is not None:
+                transfer.on_progress(
+                    d.get("filename", ""), d["downloaded_bytes"],
+                    d.get("total_bytes") or d.get("total_bytes_estimate")
+                )
+            if d["status"] == "downloading":
+                run.setdefault("first_byte", time.monotonic())
+            elif d["status"] == "finished":
+                run.setdefault("first_byte", time.monotonic())
+                run["finished"] = d.get("filename")
+            elif d["status"] == "error":
+                run["error"] = True
+
+        def on_postprocess(d: dict) -> None:
+            # The file after merging the formats, if any.
+            if d["status"] == "finished":
+                run["path"] = d["info_dict"].get("filepath")
+
+        ydl = yt_dlp.YoutubeDL({
+            "progress_hooks": [on_progress],
+            "postprocessor_hooks": [on_postprocess],
+            **self.format_policy.params()
+        })
+        with self._lock:
+            self._num_ydls += 1
+        return (ydl, run)
+
+    def __output_template(self, dir_path: pathlib.Path, title: str) -> str:
+        # % starts a field of the template.
+        path:str = (dir_path / title).absolute().as_posix().replace('%', '%%')
+        return path + ".%(ext)s"
+
+    def download_to(
+        self, dir_path: pathlib.Path, title: str, url: str, verbose: bool = False,
+        info: dict|None = None
+    ) -> bool:
+        try:
+            (ydl, run) = self._idle.get_nowait()
+        except queue.Empty:
+            (ydl, run) = self.__new_ydl()
+
+        try:
+            ydl.params["outtmpl"] = { "default": self.__output_template(dir_path, title) }
+            ydl.params["quiet"] = not verbose
+            ydl.params["noprogress"] = not verbose
+            ydl.params["no_warnings"] = not verbose
+            return self._recorded(
+                url, title, lambda transfer: self.__download_with(
+                    ydl, run, dir_path, title, url, verbose, info, transfer
+                )
+            )
+        finally:
+            self._idle.put((ydl, run))
+
+    def __download_with(
+        self, ydl: yt_dlp.YoutubeDL, run: dict,
+        dir_path: pathlib.Path, title: str, url: str, verbose: bool, info: dict|None,
+        transfer: metrics.transfer_metrics|None
+    ) -> bool:
+        import yt_dlp
+        num_failures:int = 0
+
+        while True:
+            time.sleep(self.retry_policy.wait_time(url))
+            run.clear()
+            # For the hooks.
+            run["transfer"] = transfer
+            error:Exception|None = None
+            run["limiter"] = self.rate_limiter
+            with helpers.transfer_of(self.rate_limiter):
+                started = time.monotonic()
+                try:
+                    ydl.download([url])
+                except yt_dlp.utils.DownloadError as e:
+                    # The original error, e.g. an HTTPError, if yt-dlp has kept it.
+                    error = e.exc_info[1] if e.exc_info is not None and \
+                        e.exc_info[1] is not None else e
+            finished = time.monotonic()
+            with self._lock:
+                self._num_runs += 1
+                self._run_seconds += finished - started
+                self._first_byte_seconds += run.get("first_byte", finished) - started
+
+            if error is None and "error" not in run and "finished" in run:
+                self.retry_policy.on_success(url)
+                if info is not None:
+                    path = run.get("path") or run.get("finished")
+                    info["path"] = pathlib.Path(path) if path is not None and \
+                        os.path.exists(path) else yt_dlp_downloader.find_output(dir_path, title)
+                return True
+
+            if error is None:
+                error = RuntimeError("yt-dlp has not finished the download.")
+            num_failures += 1
+            delay = self.retry_policy.on_failure(url, error, num_failures)
+            if transfer is not None:
+                transfer.on_failure(error, delay is not None)
+            if verbose:
+                print(f"yt-dlp failed for {url}: {error}")
+                if delay is not None:
+                    print(f"Retry number {num_failures} in {delay:.1f}s.")
+            if delay is None:
+                return False
+            time.sleep(delay)
 
 
 class default_300k_downloader(video_downloader):
 
+    URL_TYPE:str = "300k"
+
     # The 300k (lowercase k for bits, not bytes) videos are mostly ~100MB (1 hour) or ~200MB (2 hours)
-    # A trunk size of 16k is suitable for downloading files of such sizes.
-    DEF_TRUNK_SIZE:int = 16*1024
+    # A trunk size of 16k is suitable for downloading files of such sizes,
+    # but not for every link nor for small files,
+    # so it is only the size of the first read; the next ones follow a chunk_policy.
+    DEF_TRUNK_SIZE:int = chunk_policy.DEF_START_SIZE
     # Number of retires.
     NUM_RETRIES = 8
+    # Archive.org throttles each connection,
+    # so a file is by default fetched in segments over several connections.
+    DEF_NUM_CONNECTIONS:int = 4
+    DEF_SEGMENT_SIZE:int = 8*1024*1024
+    # Most courses download from one or two hosts.
+    DEF_POOL_HOSTS:int = 10
+    DEF_MAX_CONNS_PER_HOST:int = 16
 
-    def __init__(self, base_path: pathlib.Path|None = None):
-        super(video_downloader, base_path)
+    def __init__(
+        self, base_path: pathlib.Path|None = None,
+        num_connections: int = DEF_NUM_CONNECTIONS,
+        segment_size: int = DEF_SEGMENT_SIZE,
+        max_conns_per_host: int = DEF_MAX_CONNS_PER_HOST,
+        keep_alive: bool = True,
+        policy: retry_policy.retry_policy|None = None,
+        chunk_size: int = DEF_TRUNK_SIZE
+    ):
+        """
+        Parameters
+        ----------
+        num_connections: int
+            number of connections used to download a single file.
+            1 means never to split a file into segments.
+        segment_size: int
+            size in bytes of a segment.
+        max_conns_per_host, keep_alive:
+            settings of the connection pool shared by all downloads.
+            See http_pool.http_pool.
+        policy: retry_policy
+            decides when to retry a failed request.
+            By default, NUM_RETRIES tries with exponential backoff.
+        chunk_size: int
+            size in bytes of the first read from a connection.
+            The next ones are sized by self.chunk_policy.
+        """
+        super().__init__(base_path)
+        if num_connections < 1 or segment_size < 1 or chunk_size < 1:
+            raise ValueError(
+                "The number of connections, the segment size and the chunk size must be positive."
+            )
+        self.num_connections = num_connections
+        self.segment_size = segment_size
+        self.chunk_size = chunk_size
+        # Sizes the reads of every download, within its bounds.
+        # A chunk_policy whose bounds are the same reads a fixed size.
+        self.chunk_policy = chunk_policy.chunk_policy(start_size=chunk_size)
+        self.set_pool(max_conns_per_host, keep_alive)
+        self.retry_policy = policy if policy is not None else \
+            retry_policy.retry_policy(default_300k_downloader.NUM_RETRIES)
 
-    def download(self, title: str, url: str, verbose: bool = False):
-        if(title in self._dir_filenames):
-            if(verbose):
-                print(title + " has already been downloaded. Skipping...")
-            return
+    def set_pool(self, max_conns_per_host: int, keep_alive: bool) -> None:
+        """
+        Replaces the connection pool by a new one with these settings.
+        """
+        import http_pool
+        self.http_pool = http_pool.http_pool(
+            default_300k_downloader.DEF_POOL_HOSTS, max_conns_per_host, keep_alive
+        )
 
+    def report(self) -> str|None:
+        return self.http_pool.report()
+
+    def stats(self) -> tuple:
+        """
+        Returns
+        -------
+        (number of connections opened, number of requests sent)
+        by all the downloads so far.
+        """
+        return self.http_pool.stats()
+
+    def estimate_size(self, url: str) -> int|None:
+        return self.probe(url)[0]
+
+    def probe(self, url: str) -> tuple:
+        import requests
+        # The same HEAD as download_file_segmented's.
+        try:
+            with self.http_pool.session.head(
+                url, headers=helpers.range_headers(0), allow_redirects=True,
+                timeout=helpers.TIMEOUT
+            ) as response:
+                response.raise_for_status()
+                return (
+                    helpers.expected_size(response.status_code, response.headers, 0),
+                    response.headers.get("Accept-Ranges", "").lower() == "bytes"
+                )
+        except requests.RequestException:
+            return (None, None)
+
+    def _file_path(self, dir_path: pathlib.Path, title: str, url: str) -> pathlib.Path:
         # calculate the file name.
         ext:str = url[url.rindex('.'):] # Extension is from the last '.' in the url to the end
         # rindex() will raise an Exception if it can not be found, so I don't have to.
         file_name:str = title+ext
-        file_path:pathlib.Path = self._dir / file_name
+        return dir_path / file_name
+
+    def download_to(
+        self, dir_path: pathlib.Path, title: str, url: str, verbose: bool = False,
+        info: dict|None = None
+    ) -> bool:
+        file_path:pathlib.Path = self._file_path(dir_path, title, url)
+        if info is not None:
+            info["path"] = file_path
 
         # download the file
-        success = helpers.download_file_over_http(
+        # the error will be printed by
+        # download_file_segmented
+        return self._recorded(url, title, lambda transfer: helpers.download_file_segmented(
             url,
             file_path,
-            default_300k_downloader.DEF_TRUNK_SIZE,
+            self.num_connections,
+            self.segment_size,
+            self.chunk_size,
             default_300k_downloader.NUM_RETRIES,
-            verbose
+            verbose,
+            self.http_pool.session,
+            self.retry_policy,
+            self.rate_limiter,
+            info,
+            transfer,
+            self.chunk_policy
+        ))
+
+
+class async_300k_downloader(default_300k_downloader):
+    """
+    Downloads the same files as default_300k_downloader,
+    but streams all of them on a single asyncio event loop
+    instead of using one thread per transfer.
+
+    The scheduler runs download_to_async() inside open_session(),
+    so that all the transfers share one connection pool.
+    download_to(), called from any thread (e.g. by the daemon),
+    runs it on an event loop of the downloader's own, on a thread of its own,
+    whose session is kept between the downloads until close().
+    Files are not split into segments here,
+    as many files are already downloaded at the same time.
+    """
+
+    # The same as those of the synchronous downloads.
+    SOCK_CONNECT_TIMEOUT:float = helpers.CONNECT_TIMEOUT
+    SOCK_READ_TIMEOUT:float = helpers.READ_TIMEOUT
+
+    def __init__(self, base_path: pathlib.Path|None = None):
+        super().__init__(base_path)
+        # Same meaning as http_pool.stats(), summed over all sessions.
+        self._num_connections:int = 0
+        self._num_requests:int = 0
+        # (event loop, its thread, the session open on it, what closes the session),
+        # for download_to(), from its first call until close().
+        self._lock = threading.Lock()
+        self._background:tuple|None = None
+
+    def report(self) -> str|None:
+        (num_connections, num_requests) = self.stats()
+        num_reused = max(num_requests - num_connections, 0)
+        return f"{num_requests} HTTP requests over {num_connections} connections " + \
+            f"({num_reused} reused)"
+
+    def stats(self) -> tuple:
+        return (self._num_connections, self._num_requests)
+
+    @contextlib.asynccontextmanager
+    async def open_session(self):
+        """
+        Yields the session shared by every download_to_async(),
+        open until the context exits.
+        It has the same limits as the http_pool of the synchronous downloads.
+        """
+        import aiohttp
+        connector = aiohttp.TCPConnector(
+            limit=0,
+            limit_per_host=self.http_pool.max_conns_per_host,
+            force_close=not self.http_pool.keep_alive
         )
 
-        if success:
-            # and don't forget to update the filenames set
-            self._dir_filenames.add(title)
-        else:
-            # the error will be printed by 
-            # download_file_over_http
-            # nothing to do here.
+        # Count the connections and requests.
+        trace = aiohttp.TraceConfig()
+        async def on_request_start(session, context, params):
+            self._num_requests += 1
+        async def on_connection_create_end(session, context, params):
+            self._num_connections += 1
+        trace.on_request_start.append(on_request_start)
+        trace.on_connection_create_end.append(on_connection_create_end)
+
+        async with aiohttp.ClientSession(
+            connector=connector, timeout=aiohttp.ClientTimeout(
+                total=None,
+                sock_connect=async_300k_downloader.SOCK_CONNECT_TIMEOUT,
+                sock_read=async_300k_downloader.SOCK_READ_TIMEOUT
+            ),
+            trace_configs=[trace]
+        ) as session:
+            yield session
+
+    async def download_to_async(
+        self, session: aiohttp.ClientSession,
+        dir_path: pathlib.Path, title: str, url: str, verbose: bool = False,
+        info: dict|None = None
+    ) -> bool:
+        """
+        The coroutine version of download_to(),
+        through a session yielded by open_session(), on the loop it is open on.
+        """
+        file_path:pathlib.Path = self._file_path(dir_path, title, url)
+        if info is not None:
+            info["path"] = file_path
+
+        return await self._recorded_async(
+            url, title, lambda transfer: helpers.download_file_over_http_async(
+                session,
+                url,
+                file_path,
+                self.chunk_size,
+                default_300k_downloader.NUM_RETRIES,
+                verbose,
+                self.retry_policy,
+                self.rate_limiter,
+                info,
+                transfer,
+                self.chunk_policy
+            )
+        )
+
+    def download_to(
+        self, dir_path: pathlib.Path, title: str, url: str, verbose: bool = False,
+        info: dict|None = None
+    ) -> bool:
+        (loop, _, session, _) = self.__open_background()
+        return asyncio.run_coroutine_threadsafe(
+            self.download_to_async(session, dir_path, title, url, verbose, info), loop
+        ).result()
+
+    def __open_background(self) -> tuple:
+        with self._lock:
+            if self._background is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, daemon=True)
+                thread.start()
+                closer = contextlib.AsyncExitStack()
+                session = asyncio.run_coroutine_threadsafe(
+                    closer.enter_async_context(self.open_session()), loop
+                ).result()
+                self._background = (loop, thread, session, closer)
+            return self._background
+
+    def close(self) -> None:
+        """
+        Closes the session and the loop of download_to(), if they are open.
+        Must not be called while downloading.
+        """
+        with self._lock:
+            background = self._background
+            self._background = None
+        if background is None:
             return
+        (loop, thread, _, closer) = background
+        asyncio.run_coroutine_threadsafe(closer.aclose(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()